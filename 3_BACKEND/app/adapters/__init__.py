@@ -1,8 +1,14 @@
 from aiohttp import ClientSession, TCPConnector, ClientTimeout, CookieJar
 import contextlib
-from . import amazon, flipkart, myntra, snapdeal, ajio, tatacliq
+from .registry import AdapterSpec, AdapterRegistry, adapter_registry
+
+
+def __getattr__(name):
+    # Adapters are imported lazily by the registry; ADAPTER_LIST loads them all
+    if name == 'ADAPTER_LIST':
+        return [spec.load() for spec in adapter_registry.all()]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-ADAPTER_LIST = [amazon, flipkart, myntra, snapdeal, ajio, tatacliq]
 
 @contextlib.asynccontextmanager
 async def get_client_session():
@@ -1,9 +1,14 @@
-import logging, re, os
-from bs4 import BeautifulSoup
-from .common import http_get_text, extract_rupee_candidates, pick_price_from_candidates
+import json, logging, re, os
+from .common import parse_html, extract_price_from_json, PriceKeyProfile, extract_structured_price, STRUCTURED_STOP_MARKERS, http_get_parsed, scheduled_get, read_capped, decode_body, extract_rupee_candidates, pick_price_from_candidates
 
 logger = logging.getLogger('valora.adapters.ajio')
 
+# Page reads stop once the price element has arrived
+STOP_MARKERS = STRUCTURED_STOP_MARKERS + [(b'class="prod-sp"', b'</'), (b'class="price-value"', b'</')]
+
+# Keys holding prices in Ajio API payloads
+PRICE_KEYS = PriceKeyProfile("price", "amount", "selling_price", "current_price", "saleprice")
+
 
 async def _fetch_via_rapidapi(session, product):
     host = os.getenv('AJIO_RAPIDAPI_HOST')
@@ -28,21 +33,20 @@ async def _fetch_via_rapidapi(session, product):
         'X-RapidAPI-Host': host,
     }
     try:
-        async with session.get(api_url, headers=headers) as resp:
+        async with scheduled_get(session, api_url, quota='ajio_rapidapi', headers=headers) as resp:
             if resp.status >= 400:
                 return None
+            body = await read_capped(resp)
             try:
-                data = await resp.json(content_type=None)
-            except Exception:
-                text = await resp.text()
+                data = json.loads(body)
+            except ValueError:
+                text = decode_body(resp, body)
                 m2 = re.search(r"\d[\d,]*\.?\d*", text)
                 if not m2:
                     return None
                 price = float(m2.group(0).replace(',', ''))
                 return {'adapter':'ajio','product_id':product['product_id'],'price': price,'shipping':0.0,'confidence':0.9}
-            # naive price extraction
-            from .flipkart import _extract_price_from_json
-            price = _extract_price_from_json(data)
+            price = extract_price_from_json(data, PRICE_KEYS)
             if price and price > 0:
                 return {'adapter':'ajio','product_id':product['product_id'],'price': float(price),'shipping':0.0,'confidence':0.92}
     except Exception as e:
@@ -50,6 +54,34 @@ async def _fetch_via_rapidapi(session, product):
     return None
 
 
+def _parse_page(text):
+    """Price and confidence from a product or search page"""
+    structured = extract_structured_price(text, 'ajio')
+    if structured is not None:
+        return structured
+    soup = parse_html(text, 'ajio')
+    
+    # Try multiple selectors for Ajio price tags
+    tag = (
+        soup.select_one('.prod-sp') or
+        soup.select_one('.price-value') or
+        soup.select_one('span.price')
+    )
+    
+    price = None
+    if tag:
+        m = re.search(r"\d[\d,]*\.?\d*", tag.get_text())
+        if m:
+            price = float(m.group(0).replace(',', ''))
+    if price is None:
+        # Fallback: fuzzy regex over whole page
+        cands = extract_rupee_candidates(text)
+        price = pick_price_from_candidates(cands)
+    if price is None:
+        return None
+    return {'price': price, 'confidence': 0.8 if tag else 0.65}
+
+
 async def fetch(session, product):
     """Fetch product price from Ajio"""
     # 1) Try RapidAPI if configured
@@ -59,43 +91,21 @@ async def fetch(session, product):
     try:
         url = product.get('urls', {}).get('ajio')
         if url:
-            text = await http_get_text(session, url)
+            parsed = await http_get_parsed(session, url, _parse_page, stop_markers=STOP_MARKERS)
         else:
             query = f"{product['name']} {product['brand']}"
             search_url = f"https://www.ajio.com/search/?text={query.replace(' ', '%20')}"
-            text = await http_get_text(session, search_url)
-        if not text:
-            logger.info('ajio: empty response')
-            return None
-        
-        soup = BeautifulSoup(text, 'lxml')
-        
-        # Try multiple selectors for Ajio price tags
-        tag = (
-            soup.select_one('.prod-sp') or
-            soup.select_one('.price-value') or
-            soup.select_one('span.price')
-        )
-        
-        price = None
-        if tag:
-            m = re.search(r"\d[\d,]*\.?\d*", tag.get_text())
-            if m:
-                price = float(m.group(0).replace(',', ''))
-        if price is None:
-            # Fallback: fuzzy regex over whole page
-            cands = extract_rupee_candidates(text)
-            price = pick_price_from_candidates(cands)
-        if price is None:
-            logger.info('ajio: price not found after fallbacks')
+            parsed = await http_get_parsed(session, search_url, _parse_page, stop_markers=STOP_MARKERS)
+        if parsed is None:
+            logger.info('ajio: price not found')
             return None
         
         return {
             'adapter': 'ajio',
             'product_id': product['product_id'],
-            'price': price,
+            'price': parsed['price'],
             'shipping': 0.0,
-            'confidence': 0.8 if tag else 0.65
+            'confidence': parsed['confidence']
         }
     except Exception as e:
         logger.exception('ajio adapter error: %s', e)
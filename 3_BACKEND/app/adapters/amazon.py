@@ -1,43 +1,20 @@
-import logging, re, os, math
-from typing import Optional
-from bs4 import BeautifulSoup
+import json, logging, re, os, math
+from .common import parse_html, extract_price_from_json, PriceKeyProfile, extract_structured_price, STRUCTURED_STOP_MARKERS, http_get_parsed, scheduled_get, read_capped, decode_body
 
 logger = logging.getLogger('valora.adapters.amazon')
 
 
-def _extract_price_from_json(data) -> Optional[float]:
-    """Best-effort extraction of a numeric price from arbitrary API JSON."""
-    candidates = []
-    try:
-        def walk(node):
-            if isinstance(node, dict):
-                for k, v in node.items():
-                    lk = str(k).lower()
-                    if any(p in lk for p in ["price", "amount", "current_price", "offerprice", "saleprice"]):
-                        try:
-                            if isinstance(v, (int, float)):
-                                candidates.append(float(v))
-                            elif isinstance(v, str):
-                                m = re.search(r"\d[\d,]*\.?\d*", v)
-                                if m:
-                                    candidates.append(float(m.group(0).replace(',', '')))
-                            elif isinstance(v, dict):
-                                inner = v.get('value') or v.get('amount')
-                                if isinstance(inner, (int, float)):
-                                    candidates.append(float(inner))
-                        except Exception:
-                            pass
-                    walk(v)
-            elif isinstance(node, list):
-                for it in node:
-                    walk(it)
-        walk(data)
-    except Exception:
-        return None
-    if not candidates:
-        return None
-    candidates.sort()
-    return candidates[len(candidates)//2]
+def _has_offscreen_price(block: bytes) -> bool:
+    # The first span closed inside an a-price is the price text (.a-price .a-offscreen);
+    # a-offscreen spans elsewhere on the page (ratings, labels) do not count
+    return b'a-offscreen' in block
+
+
+# Page reads stop once the price element has arrived
+STOP_MARKERS = STRUCTURED_STOP_MARKERS + [(b'class="a-price', b'</span>', _has_offscreen_price), (b'id="priceblock_ourprice"', b'</')]
+
+# Keys holding prices in Amazon API payloads
+PRICE_KEYS = PriceKeyProfile("price", "amount", "current_price", "offerprice", "saleprice")
 
 
 async def _fetch_via_rapidapi(session, product):
@@ -60,19 +37,20 @@ async def _fetch_via_rapidapi(session, product):
     ]
     for params in params_variants:
         try:
-            async with session.get(url, headers=headers, params=params) as resp:
+            async with scheduled_get(session, url, quota='amazon_rapidapi', headers=headers, params=params) as resp:
                 if resp.status >= 400:
                     continue
+                body = await read_capped(resp)
                 try:
-                    data = await resp.json(content_type=None)
-                except Exception:
-                    text = await resp.text()
+                    data = json.loads(body)
+                except ValueError:
+                    text = decode_body(resp, body)
                     m = re.search(r"\d[\d,]*\.?\d*", text)
                     if not m:
                         continue
                     price = float(m.group(0).replace(',', ''))
                     return {'adapter':'amazon','product_id':product['product_id'],'price': price,'shipping':0.0,'confidence':0.9}
-                price = _extract_price_from_json(data)
+                price = extract_price_from_json(data, PRICE_KEYS)
                 if price is not None and price > 0:
                     return {'adapter':'amazon','product_id':product['product_id'],'price': price,'shipping':0.0,'confidence':0.92}
         except Exception as e:
@@ -96,13 +74,14 @@ async def _fetch_via_webscrapingapi(session, product):
         'api_key': key,
     }
     try:
-        async with session.get(url, params=params) as resp:
+        async with scheduled_get(session, url, quota='webscrapingapi', params=params) as resp:
             if resp.status >= 400:
                 return None
+            body = await read_capped(resp)
             try:
-                data = await resp.json(content_type=None)
-            except Exception:
-                text = await resp.text()
+                data = json.loads(body)
+            except ValueError:
+                text = decode_body(resp, body)
                 m = re.search(r"\d[\d,]*\.?\d*", text)
                 if not m:
                     return None
@@ -112,14 +91,14 @@ async def _fetch_via_webscrapingapi(session, product):
             try:
                 results = data.get('results') or data.get('data') or []
                 if isinstance(results, list) and results:
-                    cand_price = _extract_price_from_json(results[0])
+                    cand_price = extract_price_from_json(results[0], PRICE_KEYS)
                     if not cand_price:
                         # try scan all
-                        cand_price = _extract_price_from_json({'results': results[:5]})
+                        cand_price = extract_price_from_json({'results': results[:5]}, PRICE_KEYS)
                 else:
-                    cand_price = _extract_price_from_json(data)
+                    cand_price = extract_price_from_json(data, PRICE_KEYS)
             except Exception:
-                cand_price = _extract_price_from_json(data)
+                cand_price = extract_price_from_json(data, PRICE_KEYS)
             if cand_price and cand_price > 0:
                 return {'adapter':'amazon','product_id':product['product_id'],'price': float(cand_price),'shipping':0.0,'confidence':0.94}
     except Exception as e:
@@ -127,6 +106,21 @@ async def _fetch_via_webscrapingapi(session, product):
     return None
 
 
+def _parse_page(text):
+    """Price and confidence from a product or search page"""
+    structured = extract_structured_price(text, 'amazon')
+    if structured is not None:
+        return structured
+    soup = parse_html(text, 'amazon')
+    tag = soup.select_one('.a-price .a-offscreen') or soup.select_one('#priceblock_ourprice')
+    if not tag:
+        return None
+    m = re.search(r"\d[\d,]*\.?\d*", tag.get_text())
+    if not m:
+        return None
+    return {'price': float(m.group(0).replace(',','')), 'confidence': 0.9}
+
+
 async def fetch(session, product):
     # 1) WebscrapingAPI e-commerce
     ws = await _fetch_via_webscrapingapi(session, product)
@@ -139,24 +133,14 @@ async def fetch(session, product):
     # 3) Fallback to HTML scraping
     try:
         url = product.get('urls', {}).get('amazon')
-        if url:
-            async with session.get(url, headers={'User-Agent':'VALORA-Bot'}) as resp:
-                text = await resp.text()
-        else:
+        if not url:
             query = f"{product['name']} {product['brand']} {product.get('model','') }"
-            search_url = f"https://www.amazon.in/s?k={query.replace(' ','+')}"
-            async with session.get(search_url, headers={'User-Agent':'VALORA-Bot'}) as resp:
-                text = await resp.text()
-        soup = BeautifulSoup(text, 'lxml')
-        tag = soup.select_one('.a-price .a-offscreen') or soup.select_one('#priceblock_ourprice')
-        if not tag:
+            url = f"https://www.amazon.in/s?k={query.replace(' ','+')}"
+        parsed = await http_get_parsed(session, url, _parse_page, headers={'User-Agent':'VALORA-Bot'}, stop_markers=STOP_MARKERS)
+        if parsed is None:
             logger.info('amazon: price tag not found')
             return None
-        m = re.search(r"\d[\d,]*\.?\d*", tag.get_text())
-        if not m:
-            return None
-        price = float(m.group(0).replace(',',''))
-        return {'adapter':'amazon','product_id':product['product_id'],'price': price,'shipping':0.0,'confidence':0.9}
+        return {'adapter':'amazon','product_id':product['product_id'],'price': parsed['price'],'shipping':0.0,'confidence': parsed['confidence']}
     except Exception as e:
         logger.exception('amazon adapter error: %s', e)
         return None
@@ -0,0 +1,194 @@
+"""
+Per-adapter circuit breakers with adaptive timeouts
+
+Each adapter gets a breaker fed with the outcome and latency of its recent
+fetches:
+
+- closed: calls go through with a timeout of ``p95(latency) * multiplier``,
+  clamped to [ADAPTER_TIMEOUT_MIN, ADAPTER_TIMEOUT_MAX]
+- open: the failure rate over the window (or a run of consecutive failures)
+  crossed the threshold; calls are skipped without touching the network
+- half-open: after the cooldown a single probe call is let through; success
+  closes the breaker, failure reopens it with a doubled cooldown
+
+Timeouts, exceptions and fetches whose requests were all refused (4xx/5xx,
+connection errors, throttling) count as failures. A fetch that was answered
+but found no price counts as a success: the retailer is up and simply does
+not list the product, and it may well list the next one.
+"""
+import os
+import time
+import logging
+import contextlib
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional, Tuple
+
+from app.middleware.monitoring import metrics_collector
+
+logger = logging.getLogger('valora.adapters.breaker')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+TIMEOUT_MIN = float(os.getenv('ADAPTER_TIMEOUT_MIN', '2.0'))
+TIMEOUT_MAX = float(os.getenv('ADAPTER_TIMEOUT_MAX', '15.0'))
+FAILURE_RATE_THRESHOLD = float(os.getenv('ADAPTER_BREAKER_FAILURE_RATE', '0.5'))
+COOLDOWN_SECONDS = float(os.getenv('ADAPTER_BREAKER_COOLDOWN', '30'))
+MAX_COOLDOWN_SECONDS = 300.0
+
+
+class CircuitBreaker:
+    """Health state machine for one adapter"""
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 50,
+        min_calls: int = 10,
+        failure_rate_threshold: float = FAILURE_RATE_THRESHOLD,
+        consecutive_failure_threshold: int = 5,
+        cooldown: float = COOLDOWN_SECONDS,
+        timeout_min: float = TIMEOUT_MIN,
+        timeout_max: float = TIMEOUT_MAX,
+        timeout_multiplier: float = 1.5
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.consecutive_failure_threshold = consecutive_failure_threshold
+        self.base_cooldown = cooldown
+        self.timeout_min = timeout_min
+        self.timeout_max = timeout_max
+        self.timeout_multiplier = timeout_multiplier
+
+        self.state = CLOSED
+        self.cooldown = cooldown
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        # (succeeded, latency seconds) of recent calls
+        self._outcomes: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        metrics_collector.set_adapter_breaker_state(name, self.state)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.info(f"Adapter {self.name} circuit {self.state} -> {state}")
+            self.state = state
+            metrics_collector.set_adapter_breaker_state(self.name, state)
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims the probe slot when half-open)"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self._set_state(HALF_OPEN)
+        # Half-open: a single probe at a time
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def timeout(self) -> float:
+        """Timeout for the next call, adapted from the p95 of successful calls"""
+        latencies = sorted(latency for ok, latency in self._outcomes if ok)
+        if len(latencies) < self.min_calls:
+            return self.timeout_max
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return min(self.timeout_max, max(self.timeout_min, p95 * self.timeout_multiplier))
+
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok, _ in self._outcomes if not ok) / len(self._outcomes)
+
+    def record(self, succeeded: bool, latency: float):
+        self._outcomes.append((succeeded, latency))
+
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+            if succeeded:
+                # Recovered: start over with a clean window
+                self._outcomes.clear()
+                self.consecutive_failures = 0
+                self.cooldown = self.base_cooldown
+                self._set_state(CLOSED)
+            else:
+                self.cooldown = min(self.cooldown * 2, MAX_COOLDOWN_SECONDS)
+                self._open()
+            return
+
+        if succeeded:
+            self.consecutive_failures = 0
+            return
+
+        self.consecutive_failures += 1
+        if self.state == CLOSED and (
+            self.consecutive_failures >= self.consecutive_failure_threshold
+            or (len(self._outcomes) >= self.min_calls and self.failure_rate() >= self.failure_rate_threshold)
+        ):
+            self._open()
+
+    def release_probe(self):
+        """Give back a half-open probe slot whose call never completed (e.g. cancelled)"""
+        self._probe_in_flight = False
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._set_state(OPEN)
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            'state': self.state,
+            'failure_rate': round(self.failure_rate(), 3),
+            'calls': len(self._outcomes),
+            'timeout_seconds': round(self.timeout(), 2),
+            'cooldown_seconds': self.cooldown,
+        }
+
+
+# Responses seen by the adapter fetch running in this context (see
+# track_request_outcomes); lets callers tell a retailer that answered but
+# does not list a product apart from one that is failing or blocking us.
+# Kept here rather than in common so the fetcher does not import bs4.
+_request_outcomes: ContextVar[Optional[Dict[str, int]]] = ContextVar('adapter_request_outcomes', default=None)
+
+
+@contextlib.contextmanager
+def track_request_outcomes():
+    """Count the scheduled requests made inside the block: ``{'ok': n, 'failed': n}``"""
+    outcomes = {'ok': 0, 'failed': 0}
+    token = _request_outcomes.set(outcomes)
+    try:
+        yield outcomes
+    finally:
+        _request_outcomes.reset(token)
+
+
+def note_request_outcome(succeeded: bool):
+    """Called by the request scheduler for every request it sends or refuses"""
+    outcomes = _request_outcomes.get()
+    if outcomes is not None:
+        outcomes['ok' if succeeded else 'failed'] += 1
+
+
+class BreakerRegistry:
+    """Circuit breakers by adapter name (per process)"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name)
+        return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        return {name: breaker.snapshot() for name, breaker in self._breakers.items()}
+
+
+adapter_breakers = BreakerRegistry()
@@ -1,7 +1,43 @@
+import os
+import json
 import random
 import re
-from typing import Optional, Tuple, List, Dict
+import time
+import asyncio
+import logging
+import contextlib
+import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional, Sequence, Tuple, List, Dict, Union
+from urllib.parse import urlsplit, urlencode
 from aiohttp import ClientTimeout
+from bs4 import BeautifulSoup
+from app.middleware.monitoring import metrics_collector
+from .circuit_breaker import note_request_outcome
+from .page_cache import page_cache, content_hash
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger('valora.adapters')
+
+# Outbound request scheduling (see RequestScheduler)
+SCRAPE_MAX_CONCURRENCY = int(os.getenv('SCRAPE_MAX_CONCURRENCY', '8'))
+SCRAPE_HOST_RATE = float(os.getenv('SCRAPE_HOST_RATE', '1.0'))
+SCRAPE_HOST_CONCURRENCY = int(os.getenv('SCRAPE_HOST_CONCURRENCY', '2'))
+# Per-host overrides as "host=rate/concurrency,...", e.g. "amazon.in=0.5/1,flipkart.com=2/2"
+SCRAPE_HOST_LIMITS = os.getenv('SCRAPE_HOST_LIMITS', '')
+SCRAPE_JITTER = float(os.getenv('SCRAPE_JITTER', '0.3'))
+SCRAPE_MAX_WAIT = float(os.getenv('SCRAPE_MAX_WAIT', '5.0'))
+# Back-off applied on 429/503 responses without a Retry-After header
+SCRAPE_DEFAULT_BACKOFF = float(os.getenv('SCRAPE_DEFAULT_BACKOFF', '30'))
+MAX_BACKOFF_SECONDS = 3600.0
+
+# Largest page body read from a retailer; the rest of the response is not downloaded
+ADAPTER_MAX_PAGE_BYTES = int(os.getenv('ADAPTER_MAX_PAGE_BYTES', str(2 * 1024 * 1024)))
+READ_CHUNK_BYTES = 64 * 1024
 
 # A small pool of realistic desktop user agents
 USER_AGENTS = [
@@ -11,61 +47,682 @@ USER_AGENTS = [
 ]
 
 
+class HostThrottled(RuntimeError):
+    """Raised when a host cannot be called within SCRAPE_MAX_WAIT (rate limit or Retry-After)"""
+
+
+class QuotaExhausted(RuntimeError):
+    """Raised when an API key has used its daily quota"""
+
+
+def _parse_host_limits(spec: str) -> Dict[str, Tuple[float, int]]:
+    limits = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        host, _, value = item.partition('=')
+        rate, _, concurrency = value.partition('/')
+        try:
+            limits[host.strip().lower()] = (float(rate), int(concurrency or SCRAPE_HOST_CONCURRENCY))
+        except ValueError:
+            logger.warning(f"Ignoring invalid SCRAPE_HOST_LIMITS entry: {item}")
+    return limits
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class _HostState:
+    def __init__(self, rate: float, concurrency: int):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.next_slot = 0.0
+        self.blocked_until = 0.0
+
+
+class RequestScheduler:
+    """
+    Host-aware scheduler for outbound adapter requests
+
+    - per host: requests are spaced at ``1/rate`` seconds plus random jitter
+      and at most ``concurrency`` run at once; overrides match the host or
+      any parent domain (``amazon.in`` covers ``www.amazon.in``)
+    - globally: at most ``max_concurrency`` requests are in flight
+    - 429/503 responses block the host for their Retry-After (or a default
+      back-off); while blocked, requests fail fast with HostThrottled
+      instead of piling more load on the host
+    - API keys: calls are counted per UTC day (in Redis when the cache uses
+      it, so all workers share the count) and refused with QuotaExhausted
+      once ``<NAME>_DAILY_QUOTA`` is reached
+
+    A request whose slot is more than ``max_wait`` seconds away is refused
+    rather than queued, so the fan-out is not held up by a busy host.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = SCRAPE_MAX_CONCURRENCY,
+        host_rate: float = SCRAPE_HOST_RATE,
+        host_concurrency: int = SCRAPE_HOST_CONCURRENCY,
+        host_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+        jitter: float = SCRAPE_JITTER,
+        max_wait: float = SCRAPE_MAX_WAIT,
+        default_backoff: float = SCRAPE_DEFAULT_BACKOFF
+    ):
+        self.host_rate = host_rate
+        self.host_concurrency = host_concurrency
+        self.host_limits = host_limits if host_limits is not None else _parse_host_limits(SCRAPE_HOST_LIMITS)
+        self.jitter = jitter
+        self.max_wait = max_wait
+        self.default_backoff = default_backoff
+        self._global = asyncio.Semaphore(max(1, max_concurrency))
+        self._hosts: Dict[str, _HostState] = {}
+        # api -> (UTC day, calls) when Redis is not available
+        self._quota_counts: Dict[str, Tuple[str, int]] = {}
+
+    def _limits_for(self, host: str) -> Tuple[float, int]:
+        parts = host.split('.')
+        for i in range(len(parts) - 1):
+            limits = self.host_limits.get('.'.join(parts[i:]))
+            if limits:
+                return limits
+        return self.host_rate, self.host_concurrency
+
+    def _host(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(*self._limits_for(host))
+        return state
+
+    def _reserve_slot(self, host: str, state: _HostState) -> float:
+        """Claim the next send time for a host; returns the delay until then"""
+        now = time.monotonic()
+        slot = max(now, state.next_slot, state.blocked_until)
+        delay = slot - now
+        if delay > self.max_wait:
+            reason = 'retry_after' if state.blocked_until > now else 'rate'
+            metrics_collector.record_scrape_throttled(host, reason)
+            raise HostThrottled(f"{host} is not available for {delay:.1f}s ({reason})")
+        state.next_slot = slot + state.interval * (1 + random.uniform(0, self.jitter))
+        return delay
+
+    def _note_response(self, host: str, state: _HostState, status: int, headers) -> None:
+        if status not in (429, 503):
+            return
+        backoff = _parse_retry_after(headers.get('Retry-After'))
+        if backoff is None:
+            backoff = self.default_backoff
+        backoff = min(backoff, MAX_BACKOFF_SECONDS)
+        state.blocked_until = max(state.blocked_until, time.monotonic() + backoff)
+        logger.warning(f"{host} answered {status}; backing off for {backoff:.0f}s")
+
+    @staticmethod
+    def _quota_limit(api: str) -> Optional[int]:
+        value = os.getenv(f"{api.upper()}_DAILY_QUOTA")
+        return int(value) if value else None
+
+    def _incr_quota_redis(self, redis_client, api: str, day: str) -> int:
+        key = f"valora:quota:{api}:{day}"
+        pipe = redis_client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, 2 * 86400)
+        return int(pipe.execute()[0])
+
+    async def consume_quota(self, api: str) -> int:
+        """Count one call against an API key quota; raises QuotaExhausted when used up"""
+        from app.utils import cache
+
+        day = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%d')
+        redis_client = cache.cache_manager.redis_client if cache.cache_manager else None
+        used = None
+        if redis_client is not None:
+            try:
+                used = await asyncio.to_thread(self._incr_quota_redis, redis_client, api, day)
+            except Exception as e:
+                logger.warning(f"Quota count for {api} fell back to this process: {e}")
+        if used is None:
+            counted_day, count = self._quota_counts.get(api, (day, 0))
+            used = (count if counted_day == day else 0) + 1
+            self._quota_counts[api] = (day, used)
+
+        metrics_collector.set_api_quota_used(api, used)
+        limit = self._quota_limit(api)
+        if limit is not None and used > limit:
+            metrics_collector.record_scrape_throttled(api, 'quota')
+            raise QuotaExhausted(f"{api} daily quota of {limit} calls is used up")
+        return used
+
+    @contextlib.asynccontextmanager
+    async def get(self, session, url: str, quota: Optional[str] = None, **kwargs):
+        """``session.get(url, **kwargs)`` scheduled for the URL's host (async context manager)"""
+        host = (urlsplit(url).hostname or '').lower()
+        state = self._host(host)
+        if state.blocked_until - time.monotonic() > self.max_wait:
+            metrics_collector.record_scrape_throttled(host, 'retry_after')
+            note_request_outcome(False)
+            raise HostThrottled(f"{host} asked us to back off")
+
+        start = time.monotonic()
+        try:
+            delay = self._reserve_slot(host, state)
+        except HostThrottled:
+            note_request_outcome(False)
+            raise
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Counted once the request can no longer be refused, so throttled
+        # calls do not use up the daily quota
+        if quota:
+            await self.consume_quota(quota)
+        async with state.semaphore:
+            async with self._global:
+                wait = time.monotonic() - start
+                responded = False
+                try:
+                    async with session.get(url, **kwargs) as resp:
+                        responded = True
+                        metrics_collector.record_scrape_request(host, f"{resp.status // 100}xx", wait)
+                        self._note_response(host, state, resp.status, resp.headers)
+                        # 304 Not Modified is a success for the conditional requests of the page cache
+                        note_request_outcome(resp.status < 400)
+                        yield resp
+                except Exception:
+                    if not responded:
+                        metrics_collector.record_scrape_request(host, 'error', wait)
+                        note_request_outcome(False)
+                    raise
+
+
+request_scheduler = RequestScheduler()
+
+
+def scheduled_get(session, url: str, quota: Optional[str] = None, **kwargs):
+    """Drop-in for ``session.get`` that goes through the shared host scheduler"""
+    return request_scheduler.get(session, url, quota=quota, **kwargs)
+
+
 def build_headers(extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
     headers = {
         'User-Agent': random.choice(USER_AGENTS),
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
         'Accept-Language': 'en-IN,en-US;q=0.9,en;q=0.8',
-        'Cache-Control': 'no-cache',
-        'Pragma': 'no-cache',
     }
     if extra:
         headers.update(extra)
     return headers
 
 
-async def http_get_text(session, url: str, params: Optional[Dict[str, str]] = None, headers: Optional[Dict[str, str]] = None, total_timeout: float = 12.0) -> Optional[str]:
+# (start, end) byte markers: reading stops at the first ``end`` after ``start``.
+# A marker may carry a third element, ``check(block) -> bool``, called with the
+# bytes from ``start`` through ``end``; reading then only stops when it returns
+# True, otherwise the scan moves on to the next ``start``.
+StopMarker = Union[Tuple[bytes, bytes], Tuple[bytes, bytes, Callable[[bytes], bool]]]
+StopMarkers = Sequence[StopMarker]
+
+
+class _StopScanner:
+    """Incrementally checks a growing body for completed stop markers"""
+
+    def __init__(self, markers: StopMarkers):
+        self.markers = [(m[0], m[1], m[2] if len(m) > 2 else None) for m in markers]
+        self.starts = [-1] * len(self.markers)
+        # Where to look for the next start after a block failed its check
+        self.resume = [0] * len(self.markers)
+        self.overlap = max(len(start) + len(end) for start, end, _ in self.markers)
+        self.scanned = 0
+
+    def feed(self, body: bytearray) -> bool:
+        # Re-scan a little of the previous data so markers split across chunks are found
+        begin = max(0, self.scanned - self.overlap)
+        self.scanned = len(body)
+        for i, (start, end, check) in enumerate(self.markers):
+            while True:
+                if self.starts[i] < 0:
+                    pos = body.find(start, max(begin, self.resume[i]))
+                    if pos < 0:
+                        break
+                    self.starts[i] = pos
+                stop = body.find(end, max(self.starts[i] + len(start), begin))
+                if stop < 0:
+                    break
+                stop += len(end)
+                if check is None or check(bytes(body[self.starts[i]:stop])):
+                    return True
+                self.starts[i] = -1
+                self.resume[i] = stop
+        return False
+
+
+async def read_capped(resp, max_bytes: int = ADAPTER_MAX_PAGE_BYTES, stop_markers: Optional[StopMarkers] = None) -> bytes:
+    """
+    Stream a response body, stopping at ``max_bytes`` or at a stop marker
+
+    Adapters pass markers for the element holding the price (e.g.
+    ``(b'class="payBlkBig"', b'</')``), so reading ends as soon as it has
+    arrived instead of downloading the rest of a multi-megabyte page.
+    """
+    scanner = _StopScanner(stop_markers) if stop_markers else None
+    body = bytearray()
+    result = 'complete'
+    async for chunk in resp.content.iter_chunked(READ_CHUNK_BYTES):
+        body += chunk
+        if len(body) >= max_bytes:
+            del body[max_bytes:]
+            result = 'capped'
+            break
+        if scanner is not None and scanner.feed(body):
+            result = 'early_stop'
+            break
+    metrics_collector.record_page_read(result, len(body))
+    return bytes(body)
+
+
+def decode_body(resp, body: bytes) -> str:
+    """Decode with the response charset (UTF-8 when absent, as on the retailer sites)"""
+    encoding = resp.charset or 'utf-8'
+    try:
+        return body.decode(encoding, errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+
+async def http_get_text(session, url: str, params: Optional[Dict[str, str]] = None, headers: Optional[Dict[str, str]] = None, total_timeout: float = 12.0, stop_markers: Optional[StopMarkers] = None) -> Optional[str]:
     # Try up to 2 attempts with varied UA
     for attempt in range(2):
         try:
             hdrs = build_headers(headers)
             timeout = ClientTimeout(total=total_timeout)
-            async with session.get(url, params=params, headers=hdrs, timeout=timeout) as resp:
+            async with scheduled_get(session, url, params=params, headers=hdrs, timeout=timeout) as resp:
+                if resp.status in (429, 503):
+                    # The scheduler now backs off this host; retrying would only be refused
+                    return None
+                if resp.status >= 400:
+                    continue
+                return decode_body(resp, await read_capped(resp, stop_markers=stop_markers))
+        except (HostThrottled, QuotaExhausted):
+            return None
+        except Exception:
+            if attempt == 1:
+                return None
+    return None
+
+
+# Parsed values cached by an earlier run are recomputed from the stored page,
+# so a change to an adapter's parser takes effect without refetching
+_PARSE_RUN = f"{os.getpid()}-{time.time()}"
+
+
+async def _reuse_parsed(cache_url: str, entry: Dict[str, Any], parse: Callable[[str], Any], changed: bool = False) -> Any:
+    """Parsed value of an unchanged page; the entry is stored again when ``changed`` or re-parsed"""
+    if entry.get('parse_run') != _PARSE_RUN:
+        body = await asyncio.to_thread(page_cache.get_body, cache_url)
+        if body is None:
+            # Without the page the validators are useless: fetch it in full next time
+            await asyncio.to_thread(page_cache.delete, cache_url)
+            return None
+        parsed = parse(body.decode(entry.get('encoding') or 'utf-8', errors='replace'))
+        entry = dict(entry, parsed=parsed, parse_run=_PARSE_RUN)
+        changed = True
+    if changed:
+        await asyncio.to_thread(page_cache.put, cache_url, entry)
+    return entry.get('parsed')
+
+
+async def http_get_parsed(session, url: str, parse: Callable[[str], Any], params: Optional[Dict[str, str]] = None, headers: Optional[Dict[str, str]] = None, total_timeout: float = 12.0, stop_markers: Optional[StopMarkers] = None) -> Any:
+    """
+    Fetch a page and return ``parse(text)``, skipping work when it has not changed
+
+    Requests are conditional on the ETag/Last-Modified stored for the URL. On
+    a 304, or a 200 whose body hashes the same as last time, the previously
+    parsed value is returned without parsing. ``parse`` must return a
+    JSON-serializable value (or None). Bodies are read with ``read_capped``.
+    """
+    if page_cache is None:
+        text = await http_get_text(session, url, params=params, headers=headers, total_timeout=total_timeout, stop_markers=stop_markers)
+        return parse(text) if text else None
+
+    cache_url = f"{url}?{urlencode(sorted(params.items()))}" if params else url
+    entry = await asyncio.to_thread(page_cache.get, cache_url)
+    conditional = {}
+    if entry:
+        if entry.get('etag'):
+            conditional['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            conditional['If-Modified-Since'] = entry['last_modified']
+
+    for attempt in range(2):
+        try:
+            hdrs = build_headers({**(headers or {}), **conditional})
+            timeout = ClientTimeout(total=total_timeout)
+            async with scheduled_get(session, url, params=params, headers=hdrs, timeout=timeout) as resp:
+                if resp.status == 304 and entry:
+                    metrics_collector.record_cache_operation('page', 'not_modified')
+                    return await _reuse_parsed(cache_url, entry, parse)
+                if resp.status in (429, 503):
+                    return None
                 if resp.status >= 400:
                     continue
-                return await resp.text()
+                body = await read_capped(resp, stop_markers=stop_markers)
+                text = decode_body(resp, body)
+                fields = {
+                    'etag': resp.headers.get('ETag'),
+                    'last_modified': resp.headers.get('Last-Modified'),
+                    'encoding': resp.charset or 'utf-8',
+                    'content_hash': content_hash(body),
+                }
+        except (HostThrottled, QuotaExhausted):
+            return None
         except Exception:
             if attempt == 1:
                 return None
+            continue
+
+        if entry and entry.get('content_hash') == fields['content_hash']:
+            metrics_collector.record_cache_operation('page', 'unchanged')
+            # Same body, possibly new validators: keep the ones sent next time current
+            changed = any(entry.get(name) != value for name, value in fields.items())
+            return await _reuse_parsed(cache_url, dict(entry, **fields), parse, changed)
+
+        metrics_collector.record_cache_operation('page', 'changed' if entry else 'miss')
+        parsed = parse(text)
+        await asyncio.to_thread(page_cache.put, cache_url, dict(fields, parsed=parsed, parse_run=_PARSE_RUN), body)
+        return parsed
+    return None
+
+
+# Plausible INR price range, shared by the structured and regex extractors
+MIN_PLAUSIBLE_PRICE = 50
+MAX_PLAUSIBLE_PRICE = 2000000
+
+# Confidence of a price taken from a JSON-LD Offer (schema-defined) or from an
+# embedded state blob (key heuristics, on par with a CSS selector match).
+# Like the selector results they stay at or below fetcher.CONFIDENCE_THRESHOLD:
+# scraped pages never count towards the high-confidence quorum, only APIs do
+JSON_LD_CONFIDENCE = 0.9
+EMBEDDED_STATE_CONFIDENCE = 0.88
+
+_STATE_MARKERS = ('__INITIAL_STATE__', '__PRELOADED_STATE__', '__NEXT_DATA__')
+# Price keys in embedded state, most specific first
+_STATE_PRICE_KEYS = ('sellingprice', 'finalprice', 'offerprice', 'saleprice', 'discountedprice', 'price')
+_MAX_STATE_NODES = 200000
+
+_json_decoder = json.JSONDecoder()
+
+
+def _loads(data: str):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _to_price(value) -> Optional[float]:
+    if isinstance(value, dict):
+        value = value.get('value', value.get('amount'))
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        value = value.replace(',', '').strip()
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if MIN_PLAUSIBLE_PRICE <= price <= MAX_PLAUSIBLE_PRICE else None
+
+
+def _types(node: dict) -> set:
+    value = node.get('@type')
+    return set(value) if isinstance(value, list) else {value}
+
+
+def _json_ld_price(text: str) -> Optional[float]:
+    """Lowest INR Offer price in the page's JSON-LD Product/Offer blocks"""
+    prices = []
+    pos = text.find('application/ld+json')
+    while pos >= 0:
+        start = text.find('>', pos)
+        end = text.find('</script>', start)
+        if start < 0 or end < 0:
+            break
+        pos = text.find('application/ld+json', end)
+        try:
+            data = _loads(text[start + 1:end])
+        except ValueError:
+            continue
+
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(node)
+                continue
+            if not isinstance(node, dict):
+                continue
+            types = _types(node)
+            # Search pages list many products; their first offer is not "the" price
+            if types & {'ItemList', 'SearchResultsPage', 'BreadcrumbList'}:
+                continue
+            if types & {'Offer', 'AggregateOffer'}:
+                currency = node.get('priceCurrency')
+                if currency in (None, '', 'INR'):
+                    price = _to_price(node.get('price') if node.get('price') is not None else node.get('lowPrice'))
+                    if price is not None:
+                        prices.append(price)
+            for key in ('@graph', 'offers', 'mainEntity'):
+                if key in node:
+                    stack.append(node[key])
+    return min(prices) if prices else None
+
+
+def _has_json_ld_price(block: bytes) -> bool:
+    return _json_ld_price(block.decode('utf-8', errors='replace')) is not None
+
+
+# Stop reading a page once a JSON-LD block with a usable price has been
+# received; blocks without one (search-page ItemLists, price-less or non-INR
+# offers) do not stop the read, so the DOM selectors still see the page
+STRUCTURED_STOP_MARKERS = [(b'application/ld+json', b'</script>', _has_json_ld_price)]
+
+
+def _embedded_state(text: str):
+    """Decode the first embedded state blob (``window.__INITIAL_STATE__ = {...}`` etc.)"""
+    for marker in _STATE_MARKERS:
+        pos = text.find(marker)
+        if pos < 0:
+            continue
+        start = text.find('{', pos)
+        if start < 0 or start - pos > 200:
+            continue
+        try:
+            return _json_decoder.raw_decode(text, start)[0]
+        except ValueError:
+            # Not strict JSON (e.g. contains `undefined`)
+            continue
+    return None
+
+
+def _state_price(state) -> Optional[float]:
+    """Value of the most specific price key found in an embedded state blob"""
+    best_rank = len(_STATE_PRICE_KEYS)
+    best = None
+    stack = [state]
+    visited = 0
+    while stack and visited < _MAX_STATE_NODES:
+        node = stack.pop()
+        visited += 1
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if isinstance(value, (dict, list)):
+                    stack.append(value)
+                lowered = key.lower() if isinstance(key, str) else ''
+                if lowered in _STATE_PRICE_KEYS:
+                    rank = _STATE_PRICE_KEYS.index(lowered)
+                    if rank < best_rank:
+                        price = _to_price(value)
+                        if price is not None:
+                            best_rank, best = rank, price
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return best
+
+
+_NUMBER_RE = re.compile(r"\d[\d,]*\.?\d*")
+
+
+class PriceKeyProfile:
+    """
+    Keys an adapter's API payloads use for prices
+
+    A key matches when it contains any of the terms, case-insensitively.
+    Match results are memoized per key, since payloads repeat the same
+    few dozen keys across thousands of objects.
+    """
+
+    MAX_MEMO = 10000
+
+    def __init__(self, *terms: str):
+        self.terms = tuple(t.lower() for t in terms)
+        self._pattern = re.compile('|'.join(re.escape(t) for t in self.terms), re.IGNORECASE)
+        self._memo: Dict[Any, bool] = {}
+
+    def matches(self, key) -> bool:
+        hit = self._memo.get(key)
+        if hit is None:
+            hit = self._pattern.search(str(key)) is not None
+            if len(self._memo) < self.MAX_MEMO:
+                self._memo[key] = hit
+        return hit
+
+
+def _json_price_value(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        m = _NUMBER_RE.search(value)
+        return float(m.group(0).replace(',', '')) if m else None
+    if isinstance(value, dict):
+        inner = value.get('value') or value.get('amount')
+        if isinstance(inner, (int, float)) and not isinstance(inner, bool):
+            return float(inner)
     return None
 
 
-def extract_rupee_candidates(text: str) -> List[float]:
+def extract_price_from_json(data, profile: PriceKeyProfile, max_depth: int = 64, max_nodes: int = 200000) -> Optional[float]:
+    """
+    Best-effort extraction of a numeric price from arbitrary API JSON
+
+    Collects every value under a key matching ``profile`` and returns their
+    (upper) median. The walk is iterative and visits each container once,
+    ignoring anything deeper than ``max_depth`` or past ``max_nodes``
+    containers, so large payloads cost linear time and cannot hit the
+    recursion limit.
+    """
+    candidates: List[float] = []
+    stack = [(data, 0)]
+    visited = 0
+    while stack:
+        node, depth = stack.pop()
+        visited += 1
+        if visited > max_nodes:
+            logger.info(f"JSON price walk stopped after {max_nodes} nodes")
+            break
+        child_depth = depth + 1
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if profile.matches(key):
+                    price = _json_price_value(value)
+                    if price is not None:
+                        candidates.append(price)
+                if child_depth <= max_depth and isinstance(value, (dict, list)):
+                    stack.append((value, child_depth))
+        elif child_depth <= max_depth:
+            for item in node:
+                if isinstance(item, (dict, list)):
+                    stack.append((item, child_depth))
+    if not candidates:
+        return None
+    candidates.sort()
+    return candidates[len(candidates) // 2]
+
+
+def extract_structured_price(text: str, adapter: str) -> Optional[Dict[str, Any]]:
+    """
+    Price from a page's JSON-LD Offer or embedded state, without building a DOM
+
+    Uses plain string scans to locate the blocks and parses only those, so
+    it costs a fraction of a BeautifulSoup parse. Returns ``{'price',
+    'confidence', 'source'}`` or None when neither is present, in which
+    case the adapter falls back to its CSS selectors.
+    """
+    start = time.perf_counter()
+    try:
+        price = _json_ld_price(text)
+        if price is not None:
+            return {'price': price, 'confidence': JSON_LD_CONFIDENCE, 'source': 'json_ld'}
+        state = _embedded_state(text)
+        if state is not None:
+            price = _state_price(state)
+            if price is not None:
+                return {'price': price, 'confidence': EMBEDDED_STATE_CONFIDENCE, 'source': 'state'}
+        return None
+    finally:
+        metrics_collector.record_html_parse(adapter, time.perf_counter() - start, method='structured')
+
+
+def parse_html(text: str, adapter: str) -> BeautifulSoup:
+    """Parse a fetched page with lxml, recording parse time for the adapter"""
+    start = time.perf_counter()
+    try:
+        return BeautifulSoup(text, 'lxml')
+    finally:
+        metrics_collector.record_html_parse(adapter, time.perf_counter() - start)
+
+
+# One pass for every rupee notation: "₹ 1,999", "Rs. 1,999", "Rs 1999.50" and the
+# HTML entities for ₹ (raw pages are scanned before entity decoding)
+_RUPEE_PATTERN = r"(?:₹|&#8377;|&#x20[bB]9;|Rs\.?)\s*([0-9][0-9,]*(?:\.[0-9]{1,2})?)"
+_RUPEE_RE = re.compile(_RUPEE_PATTERN)
+# Same pattern over UTF-8 bytes, for scanning a body without decoding it
+_RUPEE_RE_BYTES = re.compile(_RUPEE_PATTERN.encode('utf-8'))
+
+
+def extract_rupee_candidates(text: Union[str, bytes], max_candidates: Optional[int] = None) -> List[float]:
+    """
+    Plausible INR amounts in a page (str or UTF-8 bytes), unique, in document order
+
+    Uncapped by default: pick_price_from_candidates and the adapters' minimum
+    depend on every candidate, so stopping after max_candidates changes the
+    picked price on pages that list more of them.
+    """
     if not text:
         return []
-    # Common patterns: ₹ 1,999 ; Rs. 1,999 ; 1999
-    patterns = [
-        r"[₹Rs\.]\s*([0-9]{1,3}(?:[, ]?[0-9]{2,3})+(?:\.[0-9]{1,2})?)",
-        r"₹\s*([0-9][0-9,]*\.?[0-9]*)",
-        r"Rs\.?\s*([0-9][0-9,]*\.?[0-9]*)",
-    ]
-    vals: List[float] = []
-    for pat in patterns:
-        for m in re.finditer(pat, text):
-            try:
-                vals.append(float(m.group(1).replace(',', '').replace(' ', '')))
-            except Exception:
-                continue
-    # Deduplicate
-    uniq = []
-    seen = set()
-    for v in vals:
-        if v not in seen:
-            seen.add(v)
-            uniq.append(v)
-    # Filter to plausible INR ranges
-    uniq = [v for v in uniq if 50 <= v <= 2000000]
-    return uniq
+    if isinstance(text, (bytes, bytearray)):
+        pattern, comma, empty = _RUPEE_RE_BYTES, b',', b''
+    else:
+        pattern, comma, empty = _RUPEE_RE, ',', ''
+    seen: Dict[float, None] = {}
+    for m in pattern.finditer(text):
+        try:
+            value = float(m.group(1).replace(comma, empty))
+        except ValueError:
+            continue
+        if MIN_PLAUSIBLE_PRICE <= value <= MAX_PLAUSIBLE_PRICE and value not in seen:
+            seen[value] = None
+            if max_candidates is not None and len(seen) >= max_candidates:
+                break
+    return list(seen)
 
 
 def pick_price_from_candidates(cands: List[float]) -> Optional[float]:
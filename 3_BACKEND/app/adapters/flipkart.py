@@ -1,42 +1,12 @@
-import logging, re, os, math
-from typing import Optional
-from bs4 import BeautifulSoup
-from .common import http_get_text
+import json, logging, re, os, math
+from .common import parse_html, extract_price_from_json, PriceKeyProfile, extract_structured_price, STRUCTURED_STOP_MARKERS, http_get_parsed, scheduled_get, read_capped, decode_body, extract_rupee_candidates
 logger = logging.getLogger('valora.adapters.flipkart')
 
+# Page reads stop once the price element has arrived
+STOP_MARKERS = STRUCTURED_STOP_MARKERS + [(b'class="_30jeq3', b'</'), (b'_16Jk6d"', b'</')]
 
-def _extract_price_from_json(data) -> Optional[float]:
-    candidates = []
-    try:
-        def walk(node):
-            if isinstance(node, dict):
-                for k, v in node.items():
-                    lk = str(k).lower()
-                    if any(p in lk for p in ["price", "amount", "selling_price", "current_price", "saleprice"]):
-                        try:
-                            if isinstance(v, (int, float)):
-                                candidates.append(float(v))
-                            elif isinstance(v, str):
-                                m = re.search(r"\d[\d,]*\.?\d*", v)
-                                if m:
-                                    candidates.append(float(m.group(0).replace(',', '')))
-                            elif isinstance(v, dict):
-                                inner = v.get('value') or v.get('amount')
-                                if isinstance(inner, (int, float)):
-                                    candidates.append(float(inner))
-                        except Exception:
-                            pass
-                    walk(v)
-            elif isinstance(node, list):
-                for it in node:
-                    walk(it)
-        walk(data)
-    except Exception:
-        return None
-    if not candidates:
-        return None
-    candidates.sort()
-    return candidates[len(candidates)//2]
+# Keys holding prices in Flipkart API payloads
+PRICE_KEYS = PriceKeyProfile("price", "amount", "selling_price", "current_price", "saleprice")
 
 
 async def _fetch_via_rapidapi(session, product):
@@ -52,20 +22,21 @@ async def _fetch_via_rapidapi(session, product):
     }
     params = { 'q': query, 'page': '1', 'sort_by': 'popularity' }
     try:
-        async with session.get(url, headers=headers, params=params) as resp:
+        async with scheduled_get(session, url, quota='flipkart_rapidapi', headers=headers, params=params) as resp:
             if resp.status >= 400:
                 logger.info('flipkart rapidapi failed: %s', resp.status)
                 return None
+            body = await read_capped(resp)
             try:
-                data = await resp.json(content_type=None)
-            except Exception:
-                text = await resp.text()
+                data = json.loads(body)
+            except ValueError:
+                text = decode_body(resp, body)
                 m = re.search(r"\d[\d,]*\.?\d*", text)
                 if not m:
                     return None
                 price = float(m.group(0).replace(',', ''))
                 return {'adapter':'flipkart','product_id':product['product_id'],'price': price,'shipping':0.0,'confidence':0.93}
-            price = _extract_price_from_json(data)
+            price = extract_price_from_json(data, PRICE_KEYS)
             if price and price > 0:
                 return {'adapter':'flipkart','product_id':product['product_id'],'price': float(price),'shipping':0.0,'confidence':0.95}
     except Exception as e:
@@ -73,6 +44,25 @@ async def _fetch_via_rapidapi(session, product):
     return None
 
 
+def _parse_page(text):
+    """Price and confidence from a product or search page"""
+    structured = extract_structured_price(text, 'flipkart')
+    if structured is not None:
+        return structured
+    soup = parse_html(text, 'flipkart')
+    tag = soup.select_one('._30jeq3') or soup.select_one('div._1vC4OE') or soup.select_one('._16Jk6d')
+    if not tag:
+        # try regex fallback: lowest rupee amount on the page
+        cands = extract_rupee_candidates(text)
+        if not cands:
+            return None
+        return {'price': min(cands), 'confidence': 0.7}
+    m = re.search(r"\d[\d,]*\.?\d*", tag.get_text())
+    if not m:
+        return None
+    return {'price': float(m.group(0).replace(',','')), 'confidence': 0.88}
+
+
 async def fetch(session, product):
     # 1) Try RapidAPI first
     rapid = await _fetch_via_rapidapi(session, product)
@@ -83,32 +73,15 @@ async def fetch(session, product):
     try:
         url = product.get('urls', {}).get('flipkart')
         if url:
-            text = await http_get_text(session, url)
+            parsed = await http_get_parsed(session, url, _parse_page, stop_markers=STOP_MARKERS)
         else:
             query = f"{product['name']} {product['brand']} {product.get('model','')}"
             search_url = f"https://www.flipkart.com/search?q={query.replace(' ','+')}"
-            text = await http_get_text(session, search_url)
-        if not text:
-            logger.info('flipkart: empty response')
-            return None
-        soup = BeautifulSoup(text, 'lxml')
-        tag = soup.select_one('._30jeq3') or soup.select_one('div._1vC4OE') or soup.select_one('._16Jk6d')
-        if not tag:
-            # try regex fallback
-            m_all = re.findall(r"₹\s*([0-9][0-9,]*\.?[0-9]*)", text)
-            if not m_all:
-                logger.info('flipkart: price tag not found')
-                return None
-            try:
-                price = float(str(min([float(x.replace(',','')) for x in m_all])))
-            except Exception:
-                return None
-            return {'adapter':'flipkart','product_id':product['product_id'],'price': price,'shipping':0.0,'confidence':0.7}
-        m = re.search(r"\d[\d,]*\.?\d*", tag.get_text())
-        if not m:
+            parsed = await http_get_parsed(session, search_url, _parse_page, stop_markers=STOP_MARKERS)
+        if parsed is None:
+            logger.info('flipkart: price not found')
             return None
-        price = float(m.group(0).replace(',',''))
-        return {'adapter':'flipkart','product_id':product['product_id'],'price': price,'shipping':0.0,'confidence':0.88}
+        return {'adapter':'flipkart','product_id':product['product_id'],'price': parsed['price'],'shipping':0.0,'confidence': parsed['confidence']}
     except Exception:
         logger.exception('flipkart adapter error')
         return None
@@ -1,44 +1,13 @@
-import logging, re, os
-from typing import Optional
-from bs4 import BeautifulSoup
-from .common import http_get_text, extract_rupee_candidates, pick_price_from_candidates
+import json, logging, re, os
+from .common import parse_html, extract_price_from_json, PriceKeyProfile, extract_structured_price, STRUCTURED_STOP_MARKERS, http_get_parsed, scheduled_get, read_capped, decode_body, extract_rupee_candidates, pick_price_from_candidates
 
 logger = logging.getLogger('valora.adapters.myntra')
 
+# Page reads stop once the price element has arrived
+STOP_MARKERS = STRUCTURED_STOP_MARKERS + [(b'class="pdp-price"', b'</')]
 
-def _extract_price_from_json(data) -> Optional[float]:
-    """Best-effort extraction of a numeric price from arbitrary API JSON."""
-    candidates = []
-    try:
-        def walk(node):
-            if isinstance(node, dict):
-                for k, v in node.items():
-                    lk = str(k).lower()
-                    if any(p in lk for p in ["price", "amount", "current_price", "selling_price", "mrp", "discounted_price"]):
-                        try:
-                            if isinstance(v, (int, float)):
-                                candidates.append(float(v))
-                            elif isinstance(v, str):
-                                m = re.search(r"\d[\d,]*\.?\d*", v)
-                                if m:
-                                    candidates.append(float(m.group(0).replace(',', '')))
-                            elif isinstance(v, dict):
-                                inner = v.get('value') or v.get('amount')
-                                if isinstance(inner, (int, float)):
-                                    candidates.append(float(inner))
-                        except Exception:
-                            pass
-                    walk(v)
-            elif isinstance(node, list):
-                for it in node:
-                    walk(it)
-        walk(data)
-    except Exception:
-        return None
-    if not candidates:
-        return None
-    candidates.sort()
-    return candidates[len(candidates)//2]
+# Keys holding prices in Myntra API payloads
+PRICE_KEYS = PriceKeyProfile("price", "amount", "current_price", "selling_price", "mrp", "discounted_price")
 
 
 async def _fetch_via_rapidapi(session, product):
@@ -61,19 +30,20 @@ async def _fetch_via_rapidapi(session, product):
     ]
     for params in params_variants:
         try:
-            async with session.get(url, headers=headers, params=params) as resp:
+            async with scheduled_get(session, url, quota='myntra_rapidapi', headers=headers, params=params) as resp:
                 if resp.status >= 400:
                     continue
+                body = await read_capped(resp)
                 try:
-                    data = await resp.json(content_type=None)
-                except Exception:
-                    text = await resp.text()
+                    data = json.loads(body)
+                except ValueError:
+                    text = decode_body(resp, body)
                     m = re.search(r"\d[\d,]*\.?\d*", text)
                     if not m:
                         continue
                     price = float(m.group(0).replace(',', ''))
                     return {'adapter':'myntra','product_id':product['product_id'],'price': price,'shipping':0.0,'confidence':0.9}
-                price = _extract_price_from_json(data)
+                price = extract_price_from_json(data, PRICE_KEYS)
                 if price is not None and price > 0:
                     return {'adapter':'myntra','product_id':product['product_id'],'price': price,'shipping':0.0,'confidence':0.92}
         except Exception as e:
@@ -82,6 +52,26 @@ async def _fetch_via_rapidapi(session, product):
     return None
 
 
+def _parse_page(text):
+    """Price and confidence from a product or search page"""
+    structured = extract_structured_price(text, 'myntra')
+    if structured is not None:
+        return structured
+    soup = parse_html(text, 'myntra')
+    tag = soup.select_one('.pdp-price') or soup.select_one('.pdp-price span')
+    price = None
+    if tag:
+        m = re.search(r"\d[\d,]*\.?\d*", tag.get_text())
+        if m:
+            price = float(m.group(0).replace(',', ''))
+    if price is None:
+        cands = extract_rupee_candidates(text)
+        price = pick_price_from_candidates(cands)
+    if price is None:
+        return None
+    return {'price': price, 'confidence': 0.84 if tag else 0.68}
+
+
 async def fetch(session, product):
     # 1) Try RapidAPI first
     rapid = await _fetch_via_rapidapi(session, product)
@@ -92,35 +82,21 @@ async def fetch(session, product):
     try:
         url = product.get('urls', {}).get('myntra')
         if url:
-            text = await http_get_text(session, url, total_timeout=10.0)
+            parsed = await http_get_parsed(session, url, _parse_page, total_timeout=10.0, stop_markers=STOP_MARKERS)
         else:
             query = f"{product['name']} {product['brand']}"
             search_url = f"https://www.myntra.com/{query.replace(' ', '-')}"
-            text = await http_get_text(session, search_url, total_timeout=10.0)
-        if not text:
-            logger.info('myntra: empty response')
-            return None
-
-        soup = BeautifulSoup(text, 'lxml')
-        tag = soup.select_one('.pdp-price') or soup.select_one('.pdp-price span')
-        price = None
-        if tag:
-            m = re.search(r"\d[\d,]*\.?\d*", tag.get_text())
-            if m:
-                price = float(m.group(0).replace(',', ''))
-        if price is None:
-            cands = extract_rupee_candidates(text)
-            price = pick_price_from_candidates(cands)
-        if price is None:
-            logger.info('myntra: price not found after fallbacks')
+            parsed = await http_get_parsed(session, search_url, _parse_page, total_timeout=10.0, stop_markers=STOP_MARKERS)
+        if parsed is None:
+            logger.info('myntra: price not found')
             return None
 
         return {
             'adapter': 'myntra',
             'product_id': product['product_id'],
-            'price': price,
+            'price': parsed['price'],
             'shipping': 0.0,
-            'confidence': 0.84 if tag else 0.68,
+            'confidence': parsed['confidence'],
         }
     except Exception:
         logger.exception('myntra adapter error')
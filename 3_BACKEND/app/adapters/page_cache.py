@@ -0,0 +1,154 @@
+"""
+Disk-backed cache of fetched adapter pages
+
+For each URL the cache keeps the validators the server sent (ETag,
+Last-Modified), a hash of the body, the compressed body itself and the value
+the adapter parsed from it. ``http_get_parsed`` in ``common`` uses them to
+send conditional requests and to skip parsing when a page has not changed.
+
+Entries are two files named after a hash of the URL: ``<key>.json`` (metadata
+and parsed value) and ``<key>.body`` (zlib-compressed page). The directory is
+kept under ``max_bytes`` by evicting the least recently used entries.
+"""
+import os
+import json
+import time
+import zlib
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from app.middleware.monitoring import metrics_collector
+
+logger = logging.getLogger('valora.adapters.page_cache')
+
+PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'true').lower() == 'true'
+# A relative PAGE_CACHE_DIR is resolved against the backend root, not the working directory
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+PAGE_CACHE_DIR = os.path.join(BACKEND_ROOT, os.getenv('PAGE_CACHE_DIR', 'cache/pages'))
+PAGE_CACHE_MAX_MB = float(os.getenv('PAGE_CACHE_MAX_MB', '200'))
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class PageCache:
+    """Size-bounded page store; methods do file I/O, so call them off the event loop"""
+
+    def __init__(self, directory: str = PAGE_CACHE_DIR, max_bytes: int = int(PAGE_CACHE_MAX_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.body'
+
+    def _scan_size(self) -> int:
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    total += entry.stat().st_size
+        return total
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for a URL (metadata and parsed value, not the body)"""
+        meta_path, _ = self._paths(self.key(url))
+        try:
+            with open(meta_path, 'rb') as f:
+                entry = json.loads(f.read())
+            # Touch for LRU eviction
+            os.utime(meta_path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable page cache entry for {url}: {e}")
+            self.delete(url)
+            return None
+
+    def get_body(self, url: str) -> Optional[bytes]:
+        _, body_path = self._paths(self.key(url))
+        try:
+            with open(body_path, 'rb') as f:
+                return zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None
+
+    def put(self, url: str, entry: Dict[str, Any], body: Optional[bytes] = None):
+        """Store an entry; ``body`` is only rewritten when given (it is unchanged on a 304)"""
+        meta_path, body_path = self._paths(self.key(url))
+        entry = dict(entry, url=url, stored_at=time.time())
+        meta = json.dumps(entry, default=str).encode('utf-8')
+        compressed = zlib.compress(body, 6) if body is not None else None
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if self._size is None:
+                self._size = self._scan_size()
+            self._size += self._write(meta_path, meta)
+            if compressed is not None:
+                self._size += self._write(body_path, compressed)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> int:
+        """Atomically replace a file; returns the change in size"""
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return len(data) - previous
+
+    def delete(self, url: str):
+        with self._lock:
+            for path in self._paths(self.key(url)):
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    if self._size is not None:
+                        self._size -= size
+                except OSError:
+                    pass
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is at 90% of its limit"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    entries.append((entry.stat().st_mtime, entry.name[:-5]))
+        entries.sort()
+
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for _, key in entries:
+            if self._size <= target:
+                break
+            for path in self._paths(key):
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    self._size -= size
+                except OSError:
+                    pass
+            evicted += 1
+        if evicted:
+            metrics_collector.record_cache_operation('page_evict', 'lru', evicted)
+            logger.info(f"Page cache evicted {evicted} entries")
+
+
+page_cache = PageCache() if PAGE_CACHE_ENABLED else None
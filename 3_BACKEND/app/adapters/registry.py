@@ -0,0 +1,244 @@
+"""
+Adapter registry: discovery, lazy loading and per-product routing
+
+Each adapter is described by an AdapterSpec. The spec holds the module
+path and the adapter's capabilities, so routing decisions never import
+anything. An adapter module (and bs4/lxml with it) is imported the first
+time a product is routed to it.
+
+Built-in adapters are registered below. Extra adapters are discovered from
+the ``valora.adapters`` entry point group; an entry point may name an
+AdapterSpec (preferred: its module stays lazy) or an adapter module with a
+``fetch(session, product)`` coroutine.
+
+Routing (``AdapterRegistry.route``) skips adapters that:
+- are listed in ADAPTERS_DISABLED
+- do not carry the product's category (or carry it but exclude it, as the
+  fashion retailers do for "Smart Watch")
+- need a product URL (or an API key) that is missing
+- would only run a site search while the product has URLs for other
+  retailers (unless ADAPTER_SEARCH_WITHOUT_URL is set): searching by name
+  rarely yields a match above the aggregation confidence threshold
+"""
+import os
+import re
+import logging
+import importlib
+from importlib.metadata import entry_points
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.middleware.monitoring import metrics_collector
+
+logger = logging.getLogger('valora.adapters.registry')
+
+ENTRY_POINT_GROUP = 'valora.adapters'
+
+ADAPTERS_DISABLED = {name.strip().lower() for name in os.getenv('ADAPTERS_DISABLED', '').split(',') if name.strip()}
+ADAPTER_SEARCH_WITHOUT_URL = os.getenv('ADAPTER_SEARCH_WITHOUT_URL', 'false').lower() == 'true'
+
+# Category keywords for fashion-only retailers. A product category matches
+# when one of its words, singular, is a keyword ("Women Tops" matches "top";
+# "Laptops" and "Smartwatch" do not), or starts with a keyword ending in "*"
+FASHION_CATEGORIES = frozenset({
+    'apparel', 'clothing', 'fashion', 'outerwear', 'jacket', 'coat', 'blazer',
+    'shirt', 'tshirt', 'top', 'topwear', 'tee', 'knitwear', 'sweater', 'sweatshirt',
+    'hoodie', 'dress', 'skirt', 'bottom', 'bottomwear', 'jean', 'trouser', 'pant',
+    'short', 'kurta', 'kurti', 'saree', 'ethnic', 'innerwear', 'activewear',
+    'footwear', 'shoe', 'sneaker', 'sandal', 'bag', 'handbag', 'sunglass',
+    'accessor*', 'watch', 'jewel*',
+})
+
+# Words marking an electronics category that shares a word with fashion
+# ("Smart Watch", "Fitness Band", "GPS Watch"); fashion retailers skip these
+FASHION_EXCLUDED_CATEGORIES = frozenset({
+    'smart', 'smartwatch', 'fitness', 'tracker', 'gps', 'wearable*', 'electronic*', 'gadget*',
+})
+
+_WORD_RE = re.compile(r'[a-z]+')
+
+
+def category_words(category: str) -> Set[str]:
+    """Lowercase words of a category and their singulars ("Watches" -> "watches", "watche", "watch")"""
+    words = set()
+    for word in _WORD_RE.findall(category.lower()):
+        words.add(word)
+        if len(word) > 3 and word.endswith('s'):
+            words.add(word[:-1])
+            if word.endswith('es'):
+                words.add(word[:-2])
+    return words
+
+
+def _keyword_sets(keywords: Iterable[str]) -> Tuple[FrozenSet[str], Tuple[str, ...]]:
+    """Split lowercase category keywords into whole words and prefixes (keywords ending in "*")"""
+    keywords = [k.lower() for k in keywords]
+    return frozenset(k for k in keywords if not k.endswith('*')), tuple(k[:-1] for k in keywords if k.endswith('*'))
+
+
+def _matches_keywords(words: Set[str], exact: FrozenSet[str], prefixes: Tuple[str, ...]) -> bool:
+    if words & exact:
+        return True
+    return any(word.startswith(prefix) for word in words for prefix in prefixes)
+
+
+class AdapterSpec:
+    """An adapter and what it can do"""
+
+    def __init__(
+        self,
+        name: str,
+        module: str,
+        categories: Optional[Iterable[str]] = None,
+        excluded_categories: Iterable[str] = (),
+        requires_url: bool = False,
+        api_keys: Sequence[Tuple[str, ...]] = (),
+        requires_api_key: bool = False
+    ):
+        self.name = name
+        self.module = module
+        # None: every category; otherwise lowercase keywords matched against the
+        # words of the product category ("jewel*" matches words starting with "jewel")
+        exact, self._category_prefixes = _keyword_sets(categories or ())
+        self.categories: Optional[FrozenSet[str]] = exact if categories else None
+        # Keywords that reject a category even when it matches one of the above
+        self.excluded_categories, self._excluded_prefixes = _keyword_sets(excluded_categories)
+        # Cannot search by name; only works with a product URL for this retailer
+        self.requires_url = requires_url
+        # Env var groups enabling an API path; the API is available when every var of a group is set
+        self.api_keys = tuple(tuple(group) for group in api_keys)
+        # Has no scraping fallback; useless without an API key
+        self.requires_api_key = requires_api_key
+        self._adapter = None
+
+    def api_available(self) -> bool:
+        return any(all(os.getenv(var) for var in group) for group in self.api_keys)
+
+    def supports_category(self, category: Optional[str]) -> bool:
+        if self.categories is None or not category:
+            return True
+        words = category_words(category)
+        if not _matches_keywords(words, self.categories, self._category_prefixes):
+            return False
+        return not _matches_keywords(words, self.excluded_categories, self._excluded_prefixes)
+
+    def load(self):
+        """Import the adapter module (once)"""
+        if self._adapter is None:
+            self._adapter = importlib.import_module(self.module)
+            logger.debug(f"Loaded adapter {self.name} from {self.module}")
+        return self._adapter
+
+    @property
+    def loaded(self) -> bool:
+        return self._adapter is not None
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            'module': self.module,
+            'categories': sorted(self.categories | {f'{p}*' for p in self._category_prefixes}) if self.categories is not None else None,
+            'excluded_categories': sorted(self.excluded_categories | {f'{p}*' for p in self._excluded_prefixes}),
+            'requires_url': self.requires_url,
+            'requires_api_key': self.requires_api_key,
+            'api_available': self.api_available(),
+            'loaded': self.loaded,
+        }
+
+
+BUILTIN_ADAPTERS = [
+    AdapterSpec('amazon', 'app.adapters.amazon', api_keys=[
+        ('WEBSCRAPINGAPI_ECOM_API_KEY',),
+        ('AMAZON_RAPIDAPI_KEY', 'AMAZON_RAPIDAPI_HOST'),
+    ]),
+    AdapterSpec('flipkart', 'app.adapters.flipkart', api_keys=[
+        ('FLIPKART_RAPIDAPI_HOST', 'FLIPKART_RAPIDAPI_KEY'),
+        ('FLIPKART_RAPIDAPI_HOST', 'FLIPKART_API_KEY'),
+    ]),
+    AdapterSpec('myntra', 'app.adapters.myntra', categories=FASHION_CATEGORIES, excluded_categories=FASHION_EXCLUDED_CATEGORIES, api_keys=[
+        ('MYNTRA_RAPIDAPI_KEY', 'MYNTRA_RAPIDAPI_HOST'),
+    ]),
+    AdapterSpec('snapdeal', 'app.adapters.snapdeal'),
+    AdapterSpec('ajio', 'app.adapters.ajio', categories=FASHION_CATEGORIES, excluded_categories=FASHION_EXCLUDED_CATEGORIES, api_keys=[
+        ('AJIO_RAPIDAPI_HOST', 'AJIO_RAPIDAPI_KEY'),
+    ]),
+    AdapterSpec('tatacliq', 'app.adapters.tatacliq'),
+]
+
+
+class AdapterRegistry:
+    """Registered adapters by name, in registration order"""
+
+    def __init__(self, specs: Iterable[AdapterSpec] = ()):
+        self._specs: Dict[str, AdapterSpec] = {}
+        self._discovered = False
+        for spec in specs:
+            self.register(spec)
+
+    def register(self, spec: AdapterSpec):
+        if spec.name in self._specs:
+            logger.warning(f"Adapter {spec.name} registered twice; keeping {spec.module}")
+        self._specs[spec.name] = spec
+
+    def discover(self):
+        """Register adapters published under the ``valora.adapters`` entry point group"""
+        if self._discovered:
+            return
+        self._discovered = True
+        for ep in entry_points(group=ENTRY_POINT_GROUP):
+            try:
+                target = ep.load()
+            except Exception as e:
+                logger.error(f"Failed to load adapter entry point {ep.name}: {e}")
+                continue
+            if isinstance(target, AdapterSpec):
+                spec = target
+            elif hasattr(target, 'fetch'):
+                spec = AdapterSpec(ep.name, target.__name__)
+                spec._adapter = target
+            else:
+                logger.error(f"Adapter entry point {ep.name} is neither an AdapterSpec nor a module with fetch()")
+                continue
+            self.register(spec)
+            logger.info(f"Registered adapter {spec.name} from entry point")
+
+    def all(self) -> List[AdapterSpec]:
+        self.discover()
+        return list(self._specs.values())
+
+    def get(self, name: str) -> Optional[AdapterSpec]:
+        self.discover()
+        return self._specs.get(name)
+
+    def _skip_reason(self, spec: AdapterSpec, product: dict, urls: dict) -> Optional[str]:
+        if spec.name in ADAPTERS_DISABLED:
+            return 'disabled'
+        if not spec.supports_category(product.get('category')):
+            return 'category'
+        if urls.get(spec.name):
+            return None
+        if spec.requires_url:
+            return 'no_url'
+        api = spec.api_available()
+        if spec.requires_api_key and not api:
+            return 'no_api_key'
+        if urls and not api and not ADAPTER_SEARCH_WITHOUT_URL:
+            return 'search_only'
+        return None
+
+    def route(self, product: dict) -> List[AdapterSpec]:
+        """Adapters worth calling for a product"""
+        urls = {name: url for name, url in (product.get('urls') or {}).items() if url}
+        routed = []
+        for spec in self.all():
+            reason = self._skip_reason(spec, product, urls)
+            metrics_collector.record_adapter_route(spec.name, reason or 'routed')
+            if reason is None:
+                routed.append(spec)
+            else:
+                logger.debug(f"Adapter {spec.name} skipped for {product.get('product_id')}: {reason}")
+        return routed
+
+    def describe(self) -> Dict[str, Dict[str, object]]:
+        return {spec.name: spec.describe() for spec in self.all()}
+
+
+adapter_registry = AdapterRegistry(BUILTIN_ADAPTERS)
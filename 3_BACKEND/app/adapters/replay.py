@@ -0,0 +1,290 @@
+"""
+Record/replay of adapter HTTP traffic (cassettes)
+
+A cassette holds the responses an adapter received while fetching one
+product: retailer pages and API payloads, keyed by method and URL.
+``RecordingSession`` wraps the shared aiohttp session and stores what comes
+back; ``ReplaySession`` serves a cassette through the same ``session.get``
+interface, so an adapter's ``fetch(session, product)`` runs unchanged and
+offline (``scripts/bench_adapters.py`` uses it to benchmark the parsers).
+
+Cassettes are JSON files::
+
+    {
+      "name": "flipkart-product-jsonld",
+      "adapter": "flipkart",
+      "product": {...},             # passed to fetch()
+      "expected_price": 1499.0,     # null when the adapter should find nothing
+      "env": {...},                 # adapter settings to replay with
+      "interactions": [
+        {"method": "GET", "url": "...", "status": 200, "headers": {...}, "body": "..."}
+      ]
+    }
+
+Secrets stay out of cassettes: query parameters listed in REDACTED_PARAMS
+are dropped from recorded URLs, request headers are not stored and the
+values of ``*_KEY`` env vars are replaced.
+"""
+import os
+import re
+import json
+import base64
+import contextlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from aiohttp import ClientConnectionError
+from multidict import CIMultiDict, CIMultiDictProxy
+
+from . import common
+from .registry import adapter_registry
+
+# Query parameters holding credentials (e.g. WebScrapingAPI's api_key)
+REDACTED_PARAMS = frozenset({'api_key', 'apikey', 'key', 'token', 'access_token'})
+REDACTED_VALUE = 'replay'
+# Response headers the adapters or the scheduler look at
+RECORDED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Retry-After')
+
+_CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+class CassetteMiss(ClientConnectionError):
+    """Raised on replay for a request the cassette has no response for"""
+
+
+def request_key(method: str, url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """``METHOD url`` with params merged into the query, sorted, and secrets removed"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend((str(k), str(v)) for k, v in params.items())
+    query = sorted((k, v) for k, v in query if k.lower() not in REDACTED_PARAMS)
+    return f"{method.upper()} {urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))}"
+
+
+def redacted_env(names: Iterable[str]) -> Dict[str, str]:
+    """Current values of the given env vars, with API keys replaced"""
+    env = {}
+    for name in names:
+        value = os.getenv(name)
+        if value:
+            env[name] = REDACTED_VALUE if 'KEY' in name.upper() else value
+    return env
+
+
+class Cassette:
+    """Recorded responses for one product fetch"""
+
+    def __init__(
+        self,
+        name: str,
+        adapter: str,
+        product: Dict[str, Any],
+        expected_price: Optional[float] = None,
+        env: Optional[Dict[str, str]] = None,
+        interactions: Optional[List[Dict[str, Any]]] = None
+    ):
+        self.name = name
+        self.adapter = adapter
+        self.product = product
+        self.expected_price = expected_price
+        self.env = dict(env or {})
+        self.interactions = list(interactions or [])
+
+    @classmethod
+    def load(cls, path: str) -> 'Cassette':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(
+            data.get('name') or os.path.splitext(os.path.basename(path))[0],
+            data['adapter'],
+            data['product'],
+            data.get('expected_price'),
+            data.get('env'),
+            data.get('interactions'),
+        )
+
+    @classmethod
+    def load_dir(cls, directory: str) -> List['Cassette']:
+        """Every ``*.json`` cassette in a directory, by file name"""
+        return [
+            cls.load(os.path.join(directory, name))
+            for name in sorted(os.listdir(directory))
+            if name.endswith('.json')
+        ]
+
+    def save(self, path: str):
+        data = {
+            'name': self.name,
+            'adapter': self.adapter,
+            'product': self.product,
+            'expected_price': self.expected_price,
+            'env': self.env,
+            'interactions': self.interactions,
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+
+    def add(self, method: str, url: str, params: Optional[Dict[str, Any]], status: int, headers, body: bytes) -> Dict[str, Any]:
+        interaction = {
+            'method': method.upper(),
+            'url': request_key(method, url, params).split(' ', 1)[1],
+            'status': status,
+            'headers': {name: headers[name] for name in RECORDED_HEADERS if name in headers},
+        }
+        try:
+            interaction['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            interaction['body_base64'] = base64.b64encode(body).decode('ascii')
+        self.interactions.append(interaction)
+        return interaction
+
+    def responses(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Interactions by request key, in recorded order"""
+        by_key: Dict[str, List[Dict[str, Any]]] = {}
+        for interaction in self.interactions:
+            key = request_key(interaction['method'], interaction['url'])
+            by_key.setdefault(key, []).append(interaction)
+        return by_key
+
+
+class _ReplayContent:
+    """The parts of ``aiohttp.StreamReader`` the adapters use"""
+
+    def __init__(self, body: bytes):
+        self._body = body
+
+    async def iter_chunked(self, n: int):
+        for start in range(0, len(self._body), n):
+            yield self._body[start:start + n]
+
+    async def read(self) -> bytes:
+        return self._body
+
+
+class ReplayResponse:
+    """A recorded response with the ``aiohttp.ClientResponse`` interface the adapters use"""
+
+    def __init__(self, interaction: Dict[str, Any]):
+        self.method = interaction['method']
+        self.url = interaction['url']
+        self.status = interaction['status']
+        self.headers = CIMultiDictProxy(CIMultiDict(interaction.get('headers') or {}))
+        if 'body_base64' in interaction:
+            self._body = base64.b64decode(interaction['body_base64'])
+        else:
+            self._body = (interaction.get('body') or '').encode('utf-8')
+        self.content = _ReplayContent(self._body)
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get('Content-Type', 'application/octet-stream').split(';')[0].strip().lower()
+
+    @property
+    def charset(self) -> Optional[str]:
+        m = _CHARSET_RE.search(self.headers.get('Content-Type', ''))
+        return m.group(1).lower() if m else None
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: Optional[str] = None, errors: str = 'strict') -> str:
+        return self._body.decode(encoding or self.charset or 'utf-8', errors=errors)
+
+    async def json(self, *, encoding: Optional[str] = None, loads=json.loads, content_type: Optional[str] = 'application/json'):
+        if content_type and content_type not in self.content_type:
+            raise ValueError(f"Attempt to decode JSON with unexpected mimetype: {self.content_type}")
+        return loads(self._body.decode(encoding or self.charset or 'utf-8'))
+
+
+class ReplaySession:
+    """Serves a cassette in place of an aiohttp session (``get`` only, like the adapters)"""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self._responses = cassette.responses()
+        self._served: Dict[str, int] = {}
+        # Request keys the cassette had no response for
+        self.misses: List[str] = []
+
+    @contextlib.asynccontextmanager
+    async def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs):
+        key = request_key('GET', url, params)
+        recorded = self._responses.get(key)
+        if not recorded:
+            self.misses.append(key)
+            raise CassetteMiss(f"No recorded response for {key}")
+        # Repeated requests get the recorded responses in order, then the last one again
+        served = self._served.get(key, 0)
+        self._served[key] = served + 1
+        yield ReplayResponse(recorded[min(served, len(recorded) - 1)])
+
+
+class RecordingSession:
+    """Wraps a live aiohttp session and records every response into a cassette"""
+
+    def __init__(self, session, cassette: Cassette):
+        self.session = session
+        self.cassette = cassette
+
+    @contextlib.asynccontextmanager
+    async def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs):
+        async with self.session.get(url, params=params, **kwargs) as resp:
+            # The whole body is recorded so the replay still exercises read_capped
+            body = await resp.read()
+            interaction = self.cassette.add('GET', url, params, resp.status, resp.headers, body)
+        yield ReplayResponse(interaction)
+
+
+class _ReplayScheduler(common.RequestScheduler):
+    """No host limits, and replayed API calls do not count against the daily quotas"""
+
+    def __init__(self):
+        super().__init__(max_concurrency=64, host_rate=0, host_concurrency=64, host_limits={}, jitter=0)
+
+    async def consume_quota(self, api: str) -> int:
+        return 0
+
+
+def api_env_names() -> List[str]:
+    """Env vars that switch adapters to their API paths"""
+    return sorted({var for spec in adapter_registry.all() for group in spec.api_keys for var in group})
+
+
+@contextlib.contextmanager
+def recording_environment():
+    """Bypass the page cache so full pages (not 304s) are recorded"""
+    previous = common.page_cache
+    common.page_cache = None
+    try:
+        yield
+    finally:
+        common.page_cache = previous
+
+
+@contextlib.contextmanager
+def replay_environment(env: Optional[Dict[str, str]] = None):
+    """
+    Run adapters against a cassette: no page cache, no host rate limits or
+    quota counting, and only the API settings the cassette was recorded with
+    """
+    env = env or {}
+    names = set(api_env_names()) | set(env)
+    saved: Dict[str, Optional[str]] = {name: os.environ.get(name) for name in names}
+    previous: Tuple[Any, Any] = (common.page_cache, common.request_scheduler)
+    for name in names:
+        os.environ.pop(name, None)
+    os.environ.update(env)
+    common.page_cache = None
+    common.request_scheduler = _ReplayScheduler()
+    try:
+        yield
+    finally:
+        common.page_cache, common.request_scheduler = previous
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
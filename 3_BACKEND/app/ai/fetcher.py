@@ -1,32 +1,215 @@
-import asyncio, logging
-from app.adapters import ADAPTER_LIST, get_client_session
+import asyncio, contextlib, logging, os, time
+from typing import List, Optional, Set, Tuple
+from app.adapters import adapter_registry, get_client_session
+from app.adapters.circuit_breaker import adapter_breakers, track_request_outcomes
 from app.ai.normalizer import normalize_results
 from app.ai.aggregator import aggregate_prices
+from app.database import SessionLocal
+from app.models import PriceHistory
+from app.middleware.monitoring import metrics_collector
 
 logger = logging.getLogger('valora.ai.fetcher')
 
 CONFIDENCE_THRESHOLD = 0.9
 
-async def fetch_product_prices(product: dict):
-    tasks = []
-    async with get_client_session() as session:
-        for adapter in ADAPTER_LIST:
-            tasks.append(adapter.fetch(session, product))
-        raw = await asyncio.gather(*tasks, return_exceptions=True)
-    results = []
-    for r in raw:
-        if r is None:
-            continue
-        if isinstance(r, Exception):
-            logger.warning('adapter exception: %s', r)
-            continue
-        results.append(r)
+# Return once this many high-confidence results are in (0 waits for every adapter)
+FETCH_QUORUM = int(os.getenv('FETCH_QUORUM', '3'))
+# After this many seconds, return as soon as at least one high-confidence result is in
+FETCH_SOFT_DEADLINE = float(os.getenv('FETCH_SOFT_DEADLINE', '6.0'))
+# What happens to adapters still running at that point: 'history' lets them finish
+# and saves their results to price_history, 'cancel' stops them
+FETCH_LATE_RESULTS = os.getenv('FETCH_LATE_RESULTS', 'history')
+
+# Straggler tasks left running after a fan-out returned (kept referenced until done)
+_late_tasks: Set[asyncio.Task] = set()
+
+
+async def _timed_fetch(name: str, adapter, session, product: dict):
+    """
+    Run one adapter fetch through its circuit breaker
+
+    Skipped immediately while the breaker is open; otherwise bounded by the
+    breaker's adaptive timeout. Duration and outcome are recorded either way.
+
+    Timeouts, exceptions and fetches whose requests all failed (4xx/5xx,
+    connection errors, throttled) count against the breaker. A fetch that
+    got answers but no price ('empty') counts as healthy: the retailer is
+    up, it just does not list this product.
+    """
+    breaker = adapter_breakers.get(name)
+    if not breaker.allow():
+        metrics_collector.record_adapter_skipped(name)
+        return None
+
+    start = time.perf_counter()
+    outcome = 'error'
+    with track_request_outcomes() as requests:
+        try:
+            result = await asyncio.wait_for(adapter.fetch(session, product), breaker.timeout())
+            if result is not None:
+                outcome = 'ok'
+            elif requests['failed'] and not requests['ok']:
+                outcome = 'blocked'
+            else:
+                outcome = 'empty'
+            return result
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            logger.info('adapter %s timed out after %.1fs', name, breaker.timeout())
+            return None
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            if outcome == 'cancelled':
+                breaker.release_probe()
+            else:
+                breaker.record(outcome in ('ok', 'empty'), duration)
+            metrics_collector.record_adapter_fetch(name, outcome, duration)
+
+
+def _is_high_confidence(result: dict) -> bool:
+    normalized = normalize_results([result])
+    return bool(normalized) and float(normalized[0].get('confidence') or 0.0) > CONFIDENCE_THRESHOLD
+
+
+def _task_result(task: asyncio.Task) -> Optional[dict]:
+    if task.cancelled():
+        return None
+    exc = task.exception()
+    if exc is not None:
+        logger.warning('adapter exception: %s', exc)
+        return None
+    return task.result()
+
+
+async def _collect(pending: Set[asyncio.Task], quorum: int, soft_deadline: float) -> Tuple[List[dict], Set[asyncio.Task]]:
+    """
+    Gather adapter results as they complete until the quorum is met
+
+    Returns the results so far and the tasks still running. Past the soft
+    deadline any high-confidence result is enough; without one, keep waiting
+    (adapters are still bounded by their breaker timeouts).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + soft_deadline if quorum > 0 else None
+    results: List[dict] = []
+    high_conf = 0
+    while pending:
+        if quorum > 0 and high_conf >= quorum:
+            break
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                if high_conf:
+                    break
+                timeout = None
+        done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            result = _task_result(task)
+            if result is None:
+                continue
+            results.append(result)
+            if _is_high_confidence(result):
+                high_conf += 1
+    return results, pending
+
+
+def _save_price_history(product_id: str, results: List[dict]):
+    db = SessionLocal()
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        for n in normalize_results(results):
+            db.add(PriceHistory(
+                product_id=product_id,
+                adapter_name=n['adapter'],
+                price_paise=n['paise'],
+                confidence=n['confidence'],
+                raw_data=n['raw'],
+            ))
+        db.commit()
+        outcome = 'success'
+    except Exception:
+        db.rollback()
+        logger.exception('failed to save late adapter results for %s', product_id)
+    finally:
+        db.close()
+        metrics_collector.record_database_operation('insert', 'price_history', outcome, time.perf_counter() - start)
+
+
+async def _finish_late(pending: Set[asyncio.Task], stack: contextlib.AsyncExitStack, product_id: str):
+    """Let stragglers finish on the shared session, then save what they found as history"""
+    try:
+        await asyncio.wait(pending)
+    finally:
+        await stack.aclose()
+    late = [r for r in (_task_result(t) for t in pending) if r is not None]
+    if late:
+        logger.info('%d late adapter result(s) for %s saved to history: %s',
+                    len(late), product_id, ', '.join(r.get('adapter') or '?' for r in late))
+        await asyncio.to_thread(_save_price_history, product_id, late)
+
+
+async def _release_stragglers(pending: Set[asyncio.Task], names: dict, stack: contextlib.AsyncExitStack, product_id: str):
+    handling = 'history' if FETCH_LATE_RESULTS == 'history' else 'cancelled'
+    for task in pending:
+        metrics_collector.record_adapter_late(names[task], handling)
+    if handling == 'history':
+        late_task = asyncio.create_task(_finish_late(pending, stack, product_id))
+        _late_tasks.add(late_task)
+        late_task.add_done_callback(_late_tasks.discard)
+        return
+    for task in pending:
+        task.cancel()
+    try:
+        await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        await stack.aclose()
+
+
+async def fetch_product_prices(product: dict, quorum: int = FETCH_QUORUM, soft_deadline: float = FETCH_SOFT_DEADLINE):
+    """
+    Fan out to the adapters routed for the product and aggregate the high-confidence matches
+
+    Returns once ``quorum`` high-confidence results are in, or after
+    ``soft_deadline`` seconds if at least one is, so latency follows the
+    quorum rather than the slowest retailer. ``quorum=0`` waits for all.
+    """
+    specs = adapter_registry.route(product)
+    if not specs:
+        raise RuntimeError('no adapters apply to this product')
+
+    stack = contextlib.AsyncExitStack()
+    pending: Set[asyncio.Task] = set()
+    names = {}
+    with metrics_collector.time_stage('fetch'):
+        try:
+            session = await stack.enter_async_context(get_client_session())
+            for spec in specs:
+                task = asyncio.create_task(_timed_fetch(spec.name, spec.load(), session, product))
+                names[task] = spec.name
+                pending.add(task)
+            results, pending = await _collect(pending, quorum, soft_deadline)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await stack.aclose()
+            raise
+        if pending:
+            await _release_stragglers(pending, names, stack, product['product_id'])
+        else:
+            await stack.aclose()
     if not results:
         raise RuntimeError('no adapter results')
-    normalized = normalize_results(results)
+    with metrics_collector.time_stage('normalize'):
+        normalized = normalize_results(results)
     # Only consider a result as a valid product match if confidence > 0.9
     high_conf = [n for n in normalized if float(n.get('confidence') or 0.0) > CONFIDENCE_THRESHOLD]
     if not high_conf:
         raise RuntimeError('no high-confidence matches (>0.9)')
-    aggregated = aggregate_prices(high_conf)
+    with metrics_collector.time_stage('aggregate'):
+        aggregated = aggregate_prices(high_conf)
     return aggregated
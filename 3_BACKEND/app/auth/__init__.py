@@ -1,5 +1,10 @@
-from .jwt_handler import create_access_token, verify_token, get_current_user, get_current_active_user
-from .password import hash_password, verify_password
+from .jwt_handler import (
+    create_access_token, verify_token, get_current_user, get_current_active_user,
+    principal_claims, invalidate_principal
+)
+from .password import (
+    hash_password, verify_password, hash_password_async, verify_and_update_password, PasswordHasherBusy
+)
 from .dependencies import require_role
 
 __all__ = [
@@ -7,7 +12,12 @@ __all__ = [
     'verify_token',
     'get_current_user',
     'get_current_active_user',
+    'principal_claims',
+    'invalidate_principal',
     'hash_password',
     'verify_password',
+    'hash_password_async',
+    'verify_and_update_password',
+    'PasswordHasherBusy',
     'require_role'
 ]
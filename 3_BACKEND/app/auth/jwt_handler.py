@@ -1,18 +1,31 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
 import os
+import time
 
-from app.database import get_db
-from app.models.user import User
+from app.database import SessionLocal
+from app.models.user import User, UserRole
+from app.middleware.monitoring import metrics_collector
 
 SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('JWT_EXPIRE_MINUTES', '60'))
 
+# Verified users are cached by subject for this many seconds (0 disables the cache)
+PRINCIPAL_CACHE_TTL = float(os.getenv('PRINCIPAL_CACHE_TTL', '30'))
+PRINCIPAL_CACHE_MAX_ENTRIES = 10000
+# Build the user from role/active claims in the token without any DB lookup.
+# Role changes and deactivation then only take effect when the token expires.
+JWT_TRUST_CLAIMS = os.getenv('JWT_TRUST_CLAIMS', 'false').lower() in ('1', 'true', 'yes')
+
+# Columns copied into cached principals
+PRINCIPAL_FIELDS = ('id', 'username', 'email', 'role', 'is_active', 'created_at', 'updated_at')
+
 security = HTTPBearer()
 
 
@@ -42,11 +55,99 @@ def verify_token(token: str) -> dict:
         )
 
 
+def principal_claims(user: User) -> Dict[str, Any]:
+    """Claims to embed in access tokens so JWT_TRUST_CLAIMS can skip the DB"""
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "email": user.email,
+        "role": user.role.value if isinstance(user.role, UserRole) else user.role,
+        "active": bool(user.is_active),
+        "created": user.created_at.isoformat() if user.created_at else None,
+    }
+
+
+# subject -> (expires_at, principal fields)
+_principal_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+def invalidate_principal(username: Optional[str] = None):
+    """Drop a cached user (or every cached user when no username is given)"""
+    if username is None:
+        _principal_cache.clear()
+    else:
+        _principal_cache.pop(username, None)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_on_user_change(mapper, connection, target):
+    # Role changes, deactivation, renames and deletes must not be served from
+    # cache. Other worker processes pick the change up within PRINCIPAL_CACHE_TTL.
+    history = inspect(target).attrs.username.history
+    if history.added and not history.deleted:
+        # Renamed without the old name loaded, so its entry cannot be singled out
+        invalidate_principal()
+        return
+    for username in (target.username, *history.deleted):
+        invalidate_principal(username)
+
+
+def _load_principal(username: str) -> Optional[Dict[str, Any]]:
+    now = time.monotonic()
+    cached = _principal_cache.get(username)
+    if cached is not None:
+        if cached[0] > now:
+            metrics_collector.record_cache_operation('principal', 'hit')
+            return cached[1]
+        del _principal_cache[username]
+    metrics_collector.record_cache_operation('principal', 'miss')
+    
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            return None
+        principal = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+    finally:
+        db.close()
+    
+    if PRINCIPAL_CACHE_TTL > 0:
+        _principal_cache[username] = (now + PRINCIPAL_CACHE_TTL, principal)
+        if len(_principal_cache) > PRINCIPAL_CACHE_MAX_ENTRIES:
+            _principal_cache.popitem(last=False)
+    return principal
+
+
+def _principal_from_claims(payload: dict) -> Optional[Dict[str, Any]]:
+    if not all(claim in payload for claim in ("uid", "role", "active", "created")):
+        # Token issued before claims were embedded
+        return None
+    try:
+        role = UserRole(payload["role"])
+        created_at = datetime.fromisoformat(payload["created"]) if payload.get("created") else None
+    except (TypeError, ValueError):
+        return None
+    return {
+        'id': payload["uid"],
+        'username': payload["sub"],
+        'email': payload.get("email"),
+        'role': role,
+        'is_active': bool(payload["active"]),
+        'created_at': created_at,
+    }
+
+
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> User:
-    """Get current authenticated user"""
+    """
+    Get current authenticated user
+
+    The returned User is a detached copy built from the token claims
+    (JWT_TRUST_CLAIMS) or the principal cache; load it in a session before
+    modifying it.
+    """
     token = credentials.credentials
     payload = verify_token(token)
     
@@ -58,15 +159,17 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+    principal = _principal_from_claims(payload) if JWT_TRUST_CLAIMS else None
+    if principal is None:
+        principal = _load_principal(username)
+    if principal is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    return user
+    return User(**principal)
 
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
@@ -1,6 +1,30 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.middleware.monitoring import metrics_collector
+
+# Changing BCRYPT_ROUNDS marks existing hashes for update; they are rehashed on next login
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so a small dedicated pool runs hashes in parallel
+# without touching the event loop or the default executor used elsewhere
+HASH_WORKERS = int(os.getenv('AUTH_HASH_WORKERS', '2'))
+# Operations allowed to wait for a worker before new ones are rejected
+HASH_MAX_PENDING = int(os.getenv('AUTH_HASH_MAX_PENDING', '64'))
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='bcrypt')
+_pending = 0
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when too many hash operations are already queued"""
 
 
 def hash_password(password: str) -> str:
@@ -11,3 +35,42 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
+
+
+def _timed(operation: str, func, *args):
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        metrics_collector.record_password_hash(operation, time.perf_counter() - start)
+
+
+async def _run_in_pool(operation: str, func, *args):
+    global _pending
+    if _pending >= HASH_MAX_PENDING:
+        metrics_collector.record_password_hash_rejected(operation)
+        raise PasswordHasherBusy('password hashing queue is full')
+
+    _pending += 1
+    metrics_collector.set_password_hash_pending(_pending)
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, _timed, operation, func, *args)
+    finally:
+        _pending -= 1
+        metrics_collector.set_password_hash_pending(_pending)
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the bcrypt worker pool"""
+    return await _run_in_pool('hash', pwd_context.hash, password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the bcrypt worker pool
+
+    Returns ``(valid, new_hash)``. ``new_hash`` is set when the stored hash
+    uses outdated settings (e.g. a different BCRYPT_ROUNDS) and should be saved.
+    """
+    return await _run_in_pool('verify', pwd_context.verify_and_update, plain_password, hashed_password)
@@ -1,7 +1,22 @@
+import atexit
 import logging
 import logging.config
+import logging.handlers
 import json
-from datetime import datetime
+import queue
+from datetime import datetime, timezone
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Extra attributes (passed via ``extra=``) copied into JSON log lines
+EXTRA_FIELDS = (
+    'correlation_id', 'method', 'path', 'query_params', 'status_code',
+    'duration_ms', 'client_host', 'threshold_ms', 'error', 'stack',
+)
 
 
 class JSONFormatter(logging.Formatter):
@@ -9,7 +24,7 @@ class JSONFormatter(logging.Formatter):
     
     def format(self, record):
         log_data = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).replace(tzinfo=None).isoformat(),
             'level': record.levelname,
             'logger': record.name,
             'message': record.getMessage(),
@@ -19,24 +34,41 @@ class JSONFormatter(logging.Formatter):
         }
         
         # Add extra fields if available
-        if hasattr(record, 'correlation_id'):
-            log_data['correlation_id'] = record.correlation_id
-        if hasattr(record, 'duration_ms'):
-            log_data['duration_ms'] = record.duration_ms
-        if hasattr(record, 'status_code'):
-            log_data['status_code'] = record.status_code
-        if hasattr(record, 'method'):
-            log_data['method'] = record.method
-        if hasattr(record, 'path'):
-            log_data['path'] = record.path
-        if hasattr(record, 'client_host'):
-            log_data['client_host'] = record.client_host
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                log_data[field] = value
         
-        # Add exception info if present
+        # Add exception info if present (already rendered if the record came through the queue)
         if record.exc_info:
             log_data['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_data['exception'] = record.exc_text
         
-        return json.dumps(log_data)
+        if orjson is not None:
+            return orjson.dumps(log_data, default=str).decode()
+        return json.dumps(log_data, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps records structured
+
+    The stock handler formats the whole record into ``msg`` before enqueueing,
+    which would fold tracebacks into the message. Here only the message is
+    merged and the traceback is rendered into ``exc_text``, so the listener's
+    JSON and console formatters still see both.
+    """
+    
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
 
 LOGGING_CONFIG = {
@@ -92,6 +124,42 @@ LOGGING_CONFIG = {
 }
 
 
+# Listener that owns the real handlers when queue-based logging is enabled
+_queue_listener = None
+
+
+def _enable_queue_logging(logger_names):
+    """
+    Move the handlers of the given loggers behind a single QueueListener
+
+    Request handlers then only enqueue records; formatting and file I/O run
+    on the listener's background thread.
+    """
+    global _queue_listener
+    
+    log_queue = queue.SimpleQueue()
+    handlers = []
+    for name in logger_names:
+        logger = logging.getLogger(name)
+        for handler in logger.handlers:
+            if handler not in handlers:
+                handlers.append(handler)
+        logger.handlers = [StructuredQueueHandler(log_queue)]
+    
+    _queue_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _queue_listener.start()
+    # Flush what is still queued on interpreter exit
+    atexit.register(stop_queue_logging)
+
+
+def stop_queue_logging():
+    """Drain the log queue and stop the background writer"""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
 def setup_logging():
     """Configure logging for the application"""
     import os
@@ -102,5 +170,9 @@ def setup_logging():
     # Apply logging configuration
     logging.config.dictConfig(LOGGING_CONFIG)
     
+    # Write application logs from a background thread (LOG_ASYNC=false to disable)
+    if os.getenv('LOG_ASYNC', 'true').lower() in ('1', 'true', 'yes') and _queue_listener is None:
+        _enable_queue_logging(['valora'])
+    
     logger = logging.getLogger('valora')
     logger.info('Logging configured successfully')
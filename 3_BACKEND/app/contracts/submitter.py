@@ -4,6 +4,7 @@ from algosdk.v2client import algod
 from algosdk import transaction, account, mnemonic
 from algosdk.error import AlgodHTTPError
 from typing import Optional, Dict
+from app.middleware.monitoring import metrics_collector
 
 # Load environment variables
 load_dotenv()
@@ -56,6 +57,31 @@ def wait_for_confirmation(client: algod.AlgodClient, txid: str, timeout: int = 1
     raise Exception(f"Transaction not confirmed after {timeout} rounds")
 
 
+def _timed_send(client: algod.AlgodClient, signed_txn) -> str:
+    """Send a signed transaction, recording the submit metric"""
+    start = time.perf_counter()
+    try:
+        tx_id = client.send_transaction(signed_txn)
+    except Exception:
+        metrics_collector.record_blockchain_operation('submit', 'error', time.perf_counter() - start)
+        raise
+    metrics_collector.record_blockchain_operation('submit', 'success', time.perf_counter() - start)
+    return tx_id
+
+
+def _timed_confirm(client: algod.AlgodClient, tx_id: str) -> Optional[Dict]:
+    """Wait for confirmation, recording the confirm metric"""
+    start = time.perf_counter()
+    try:
+        confirmed_txn = wait_for_confirmation(client, tx_id)
+    except Exception:
+        metrics_collector.record_blockchain_operation('confirm', 'error', time.perf_counter() - start)
+        raise
+    result = 'confirmed' if confirmed_txn else 'failed'
+    metrics_collector.record_blockchain_operation('confirm', result, time.perf_counter() - start)
+    return confirmed_txn
+
+
 def submit_simple_payment(product_id: str, final_paise: int, retry_count: int = 0) -> Dict:
     """
     Submit price update as a simple payment transaction with note
@@ -95,11 +121,11 @@ def submit_simple_payment(product_id: str, final_paise: int, retry_count: int =
         signed_txn = txn.sign(private_key)
         
         # Submit transaction
-        tx_id = client.send_transaction(signed_txn)
+        tx_id = _timed_send(client, signed_txn)
         logger.info(f"Submitted blockchain note transaction: {tx_id}")
         
         # Wait for confirmation
-        confirmed_txn = wait_for_confirmation(client, tx_id)
+        confirmed_txn = _timed_confirm(client, tx_id)
         
         if confirmed_txn:
             logger.info(f"Blockchain transaction confirmed in round: {confirmed_txn.get('confirmed-round')}")
@@ -168,6 +194,7 @@ def submit_update(product_id: str, final_paise: int, retry_count: int = 0) -> Di
     if not is_configured:
         logger.info('Blockchain not configured (%s), skipping: product=%s price=%s', 
                    config_message, product_id, final_paise)
+        metrics_collector.record_blockchain_operation('submit', 'skipped')
         return {
             'status': 'skipped',
             'reason': f'Blockchain not configured: {config_message}',
@@ -237,11 +264,11 @@ def submit_smart_contract_call(product_id: str, final_paise: int, retry_count: i
         signed_txn = txn.sign(private_key)
         
         # Submit transaction
-        tx_id = client.send_transaction(signed_txn)
+        tx_id = _timed_send(client, signed_txn)
         logger.info(f"Submitted smart contract transaction: {tx_id}")
         
         # Wait for confirmation
-        confirmed_txn = wait_for_confirmation(client, tx_id)
+        confirmed_txn = _timed_confirm(client, tx_id)
         
         if confirmed_txn:
             logger.info(f"Smart contract transaction confirmed in round: {confirmed_txn.get('confirmed-round')}")
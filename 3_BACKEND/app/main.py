@@ -1,8 +1,9 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import SQLAlchemyError
 import os
+import asyncio
 import logging
 from dotenv import load_dotenv
 
@@ -14,17 +15,9 @@ from app.routes import product_routes
 from app.routes import blockchain_routes
 from app.database import init_db
 from app.config.logging_config import setup_logging
-from app.middleware.logging_middleware import LoggingMiddleware, PerformanceMonitoringMiddleware
-from app.middleware.redis_rate_limit import RedisRateLimitMiddleware
-from app.middleware.caching import ResponseCachingMiddleware
-from app.middleware.security import (
-    SecurityHeadersMiddleware, 
-    RequestSizeLimitMiddleware, 
-    IPSecurityMiddleware,
-    CORSConfig,
-    security_manager
-)
-from app.middleware.monitoring import MetricsMiddleware, health_checker, get_metrics_response
+from app.middleware.stack import middleware_stack
+from app.middleware.security import security_manager
+from app.middleware.monitoring import health_checker, get_metrics_response
 from app.middleware.exception_handler import (
     valora_exception_handler,
     validation_exception_handler,
@@ -32,6 +25,9 @@ from app.middleware.exception_handler import (
     generic_exception_handler
 )
 from app.exceptions import ValoraException
+from app.auth.dependencies import require_role
+from app.models.user import UserRole
+from app.utils.profiler import sampling_profiler, slow_request_captures, ProfilerBusy, LoopLagMonitor
 from app.utils.cache import init_cache
 from app.seeds_frontend import seed_frontend_products
 
@@ -52,11 +48,21 @@ app = FastAPI(
     openapi_url='/openapi.json' if ENVIRONMENT == 'development' else None
 )
 
+# Event loop lag monitor (LOOP_BLOCK_DEBUG also logs the stack of blocking code)
+loop_monitor = LoopLagMonitor(
+    interval=float(os.getenv('LOOP_LAG_INTERVAL', '0.5')),
+    block_threshold=(
+        float(os.getenv('LOOP_BLOCK_THRESHOLD_MS', '100')) / 1000
+        if os.getenv('LOOP_BLOCK_DEBUG', 'false').lower() in ('1', 'true', 'yes') else None
+    )
+)
+
 # Initialize database
 @app.on_event('startup')
 async def startup_event():
     """Initialize application on startup"""
     logger.info('Starting VALORA Backend...')
+    loop_monitor.start()
     
     # Initialize database
     try:
@@ -70,9 +76,17 @@ async def startup_event():
     
     # Initialize cache
     redis_url = os.getenv('REDIS_URL')
-    init_cache(redis_url=redis_url, default_ttl=300)
+    init_cache(
+        redis_url=redis_url,
+        default_ttl=300,
+        max_entries=int(os.getenv('CACHE_MAX_ENTRIES', '10000')),
+        max_bytes=int(os.getenv('CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    )
     logger.info('Cache initialized')
 
+    # Probe dependencies in the background; /api/health/detailed serves the latest results
+    health_checker.start()
+
     # Start background price scheduler (auto-refresh DISPLAY price)
     try:
         from app.scheduler import scheduler
@@ -95,6 +109,8 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info('Shutting down VALORA Backend...')
+    await health_checker.stop()
+    loop_monitor.stop()
 
 # Add exception handlers
 app.add_exception_handler(ValoraException, valora_exception_handler)
@@ -102,53 +118,9 @@ app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(SQLAlchemyError, sqlalchemy_exception_handler)
 app.add_exception_handler(Exception, generic_exception_handler)
 
-# Add middleware (order matters - last added is executed first)
-# Security headers (applied last, so they're added to all responses)
-app.add_middleware(SecurityHeadersMiddleware, environment=ENVIRONMENT)
-
-# CORS - environment-specific configuration
-cors_config = CORSConfig.get_development_config() if ENVIRONMENT == 'development' else CORSConfig.get_production_config()
-app.add_middleware(CORSMiddleware, **cors_config)
-
-# Response caching (before rate limiting to cache efficiently)
-redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-app.add_middleware(
-    ResponseCachingMiddleware,
-    redis_url=redis_url,
-    default_ttl=int(os.getenv('CACHE_DEFAULT_TTL', '300'))
-)
-
-# Rate limiting (Redis-based)
-app.add_middleware(
-    RedisRateLimitMiddleware,
-    redis_url=os.getenv('REDIS_RATE_LIMIT_URL', 'redis://localhost:6379/1'),
-    requests_per_minute=int(os.getenv('RATE_LIMIT_PER_MINUTE', '60')),
-    requests_per_hour=int(os.getenv('RATE_LIMIT_PER_HOUR', '1000')),
-    requests_per_day=int(os.getenv('RATE_LIMIT_PER_DAY', '10000'))
-)
-
-# Request size limiting
-app.add_middleware(
-    RequestSizeLimitMiddleware,
-    max_size_bytes=int(os.getenv('MAX_REQUEST_SIZE', str(1024 * 1024)))  # 1MB default
-)
-
-# IP security (if enabled)
-if os.getenv('ENABLE_IP_SECURITY', 'false').lower() == 'true':
-    app.add_middleware(
-        IPSecurityMiddleware,
-        blocked_ips=security_manager.blocked_ips,
-        allowed_ips=security_manager.allowed_ips
-    )
-
-# Metrics collection
-app.add_middleware(MetricsMiddleware)
-
-# Performance monitoring
-app.add_middleware(PerformanceMonitoringMiddleware)
-
-# Request/response logging (should be last, so it captures everything)
-app.add_middleware(LoggingMiddleware)
+# Add middleware (order matters - last added is executed first; see app.middleware.stack)
+for middleware, options in middleware_stack(ENVIRONMENT):
+    app.add_middleware(middleware, **options)
 
 # Include routers
 app.include_router(health_route.router)
@@ -216,3 +188,43 @@ async def clear_cache(pattern: str = "*"):
     cache_manager = CacheManager()
     cleared = cache_manager.clear_cache_pattern(pattern)
     return {'message': f'Cleared {cleared} cache entries matching pattern: {pattern}'}
+
+
+# Profiling (opt-in with PROFILING_ENABLED, admin only; profiles the worker serving the request)
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def require_profiling_enabled():
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail='Profiling is disabled')
+
+
+@app.get(
+    '/api/admin/profiler/profile',
+    tags=["Admin","Monitoring"],
+    dependencies=[Depends(require_profiling_enabled), Depends(require_role([UserRole.ADMIN]))]
+)
+async def profile_process(
+    duration: float = Query(10.0, gt=0, le=60),
+    interval: float = Query(0.01, ge=0.001, le=1.0),
+    format: str = Query('collapsed', pattern='^(collapsed|speedscope)$')
+):
+    """Sample the stacks of this process for `duration` seconds"""
+    try:
+        result = await asyncio.to_thread(sampling_profiler.profile, duration, interval)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if format == 'speedscope':
+        return sampling_profiler.to_speedscope(result)
+    return PlainTextResponse(sampling_profiler.to_collapsed(result))
+
+
+@app.get(
+    '/api/admin/profiler/slow-requests',
+    tags=["Admin","Monitoring"],
+    dependencies=[Depends(require_profiling_enabled), Depends(require_role([UserRole.ADMIN]))]
+)
+async def slow_requests():
+    """Stacks captured for requests that exceeded SLOW_REQUEST_THRESHOLD (newest first)"""
+    return list(reversed(slow_request_captures))
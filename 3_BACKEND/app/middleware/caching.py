@@ -3,15 +3,20 @@ import json
 import hashlib
 import logging
 from typing import Optional, Dict, Any
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Request
+from starlette.datastructures import MutableHeaders
 from starlette.responses import Response as StarletteResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import gzip
 
 logger = logging.getLogger('valora.cache')
 
+# Response headers that depend on the client (origin, session) and must not be
+# replayed to other callers; CORS headers are added again on every response
+_PER_CLIENT_HEADER_PREFIXES = (b'access-control-', b'vary', b'set-cookie', b'x-cache', b'content-length')
 
-class ResponseCachingMiddleware(BaseHTTPMiddleware):
+
+class ResponseCachingMiddleware:
     """
     Redis-based response caching middleware
     Caches GET requests with configurable TTL and cache keys
@@ -19,7 +24,7 @@ class ResponseCachingMiddleware(BaseHTTPMiddleware):
     
     def __init__(
         self,
-        app,
+        app: ASGIApp,
         redis_url: str = "redis://localhost:6379/0",
         default_ttl: int = 300,  # 5 minutes
         cache_prefix: str = "valora:cache",
@@ -27,7 +32,7 @@ class ResponseCachingMiddleware(BaseHTTPMiddleware):
         max_response_size: int = 1024 * 1024,  # 1MB
         cacheable_status_codes: set = None
     ):
-        super().__init__(app)
+        self.app = app
         self.default_ttl = default_ttl
         self.cache_prefix = cache_prefix
         self.enable_compression = enable_compression
@@ -89,19 +94,22 @@ class ResponseCachingMiddleware(BaseHTTPMiddleware):
         
         return True
     
-    def _is_cacheable_response(self, response: Response) -> bool:
+    def _is_cacheable_response(self, status_code: int, headers: MutableHeaders) -> bool:
         """Determine if response should be cached"""
-        if response.status_code not in self.cacheable_status_codes:
+        if status_code not in self.cacheable_status_codes:
             return False
         
         # Check response size
-        if hasattr(response, 'body'):
-            body_size = len(response.body) if response.body else 0
-            if body_size > self.max_response_size:
-                return False
+        content_length = headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_response_size:
+            return False
+        
+        # Responses that set cookies belong to one client
+        if "set-cookie" in headers:
+            return False
         
         # Check cache-control headers
-        cache_control = response.headers.get("Cache-Control", "")
+        cache_control = headers.get("Cache-Control", "")
         if "no-cache" in cache_control or "no-store" in cache_control:
             return False
         
@@ -185,10 +193,17 @@ class ResponseCachingMiddleware(BaseHTTPMiddleware):
         
         return self.default_ttl
     
-    async def dispatch(self, request: Request, call_next) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request = Request(scope)
+        
         # Check if request should be cached
         if not self._is_cacheable_request(request):
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
         
         cache_key = self._generate_cache_key(request)
         
@@ -205,49 +220,70 @@ class ResponseCachingMiddleware(BaseHTTPMiddleware):
             # Add cache headers
             response.headers['X-Cache'] = 'HIT'
             response.headers['X-Cache-Key'] = cache_key[:12] + "..."
-            return response
+            await response(scope, receive, send)
+            return
         
-        # Process request
-        response = await call_next(request)
+        # Process request, buffering the body as it streams through so it
+        # can be stored once the final chunk has been sent
+        ttl = self._get_ttl_for_path(request.url.path)
+        start_message: Dict[str, Any] = {}
+        body_chunks = []
+        body_size = 0
+        cacheable = False
         
-        # Check if response should be cached
-        if self._is_cacheable_response(response):
-            # Safely extract body for caching; skip streaming responses
-            body_bytes = None
-            try:
-                if hasattr(response, 'body'):
-                    body_bytes = response.body or b''
-            except Exception:
-                body_bytes = None
-
-            if body_bytes is None:
-                # Cannot cache streaming response safely
-                response.headers['X-Cache'] = 'SKIP'
-                response.headers['X-Cache-Key'] = cache_key[:12] + "..."
-                return response
-
-            # Prepare response data for caching
-            response_data = {
-                'body': body_bytes.decode(),
-                'status_code': response.status_code,
-                'headers': dict(response.headers),
-                'media_type': response.media_type
-            }
-            
-            # Get TTL for this path
-            ttl = self._get_ttl_for_path(request.url.path)
-            
-            # Store in cache
-            await self._store_cached_response(cache_key, response_data, ttl)
-            
-            # Add cache headers
-            response.headers['X-Cache'] = 'MISS'
-            response.headers['X-Cache-TTL'] = str(ttl)
-        else:
-            response.headers['X-Cache'] = 'SKIP'
+        async def send_and_capture(message: Message) -> None:
+            nonlocal body_size, cacheable
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                cacheable = self._is_cacheable_response(message["status"], headers)
+                
+                # Add cache headers
+                if cacheable:
+                    headers['X-Cache'] = 'MISS'
+                    headers['X-Cache-TTL'] = str(ttl)
+                else:
+                    headers['X-Cache'] = 'SKIP'
+                headers['X-Cache-Key'] = cache_key[:12] + "..."
+                start_message.update(message)
+            elif message["type"] == "http.response.body" and cacheable:
+                chunk = message.get("body", b"")
+                body_size += len(chunk)
+                if body_size > self.max_response_size:
+                    # Too large to cache; stop buffering
+                    cacheable = False
+                    body_chunks.clear()
+                else:
+                    body_chunks.append(chunk)
+                    if not message.get("more_body", False):
+                        await self._store_response(cache_key, start_message, b"".join(body_chunks), ttl)
+            await send(message)
+        
+        await self.app(scope, receive, send_and_capture)
+    
+    async def _store_response(self, cache_key: str, start_message: Message, body: bytes, ttl: int):
+        """Prepare a captured response for caching"""
+        try:
+            body_text = body.decode()
+        except UnicodeDecodeError:
+            # Binary bodies are not representable in the JSON cache format
+            return
+        
+        headers = {
+            key.decode('latin-1'): value.decode('latin-1')
+            for key, value in start_message.get("headers", [])
+            if not key.lower().startswith(_PER_CLIENT_HEADER_PREFIXES)
+        }
+        
+        # Prepare response data for caching
+        response_data = {
+            'body': body_text,
+            'status_code': start_message["status"],
+            'headers': headers,
+            'media_type': headers.get('content-type')
+        }
         
-        response.headers['X-Cache-Key'] = cache_key[:12] + "..."
-        return response
+        # Store in cache
+        await self._store_cached_response(cache_key, response_data, ttl)
 
 
 class CacheManager:
@@ -1,60 +1,77 @@
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Request
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import asyncio
 import logging
+import random
 import time
 import uuid
-from typing import Callable
+from app.utils.profiler import capture_task_stack, slow_request_captures
 
 logger = logging.getLogger('valora.requests')
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware for logging requests and responses with correlation IDs"""
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+class LoggingMiddleware:
+    """
+    Middleware for logging requests and responses with correlation IDs
+
+    Writes one access line per request when the response starts. Successful
+    requests are sampled at ``sample_rate``; errors (status >= 400) and
+    requests slower than ``slow_request_ms`` are always logged.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = 1.0, slow_request_ms: float = 1000.0):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_request_ms = slow_request_ms
+
+    def _should_log(self, status_code: int, duration_ms: float) -> bool:
+        if status_code >= 400 or duration_ms >= self.slow_request_ms:
+            return True
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+
         # Generate correlation ID
         correlation_id = str(uuid.uuid4())
         request.state.correlation_id = correlation_id
-        
+
         # Start timer
         start_time = time.time()
-        
-        # Log request
-        logger.info(
-            f"Request started",
-            extra={
-                'correlation_id': correlation_id,
-                'method': request.method,
-                'path': request.url.path,
-                'query_params': dict(request.query_params),
-                'client_host': request.client.host if request.client else None,
-            }
-        )
-        
+
+        async def send_with_correlation_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Calculate duration
+                duration_ms = round((time.time() - start_time) * 1000, 2)
+                status_code = message["status"]
+
+                # Log request and response as a single access line
+                if self._should_log(status_code, duration_ms):
+                    logger.info(
+                        f"Request completed",
+                        extra={
+                            'correlation_id': correlation_id,
+                            'method': request.method,
+                            'path': request.url.path,
+                            'query_params': dict(request.query_params) or None,
+                            'client_host': request.client.host if request.client else None,
+                            'status_code': status_code,
+                            'duration_ms': duration_ms,
+                        }
+                    )
+
+                # Add correlation ID to response headers
+                MutableHeaders(scope=message)['X-Correlation-ID'] = correlation_id
+            await send(message)
+
         # Process request
         try:
-            response = await call_next(request)
-            
-            # Calculate duration
-            duration = time.time() - start_time
-            
-            # Log response
-            logger.info(
-                f"Request completed",
-                extra={
-                    'correlation_id': correlation_id,
-                    'method': request.method,
-                    'path': request.url.path,
-                    'status_code': response.status_code,
-                    'duration_ms': round(duration * 1000, 2),
-                }
-            )
-            
-            # Add correlation ID to response headers
-            response.headers['X-Correlation-ID'] = correlation_id
-            
-            return response
-            
+            await self.app(scope, receive, send_with_correlation_id)
         except Exception as e:
             duration = time.time() - start_time
             logger.error(
@@ -63,6 +80,8 @@ class LoggingMiddleware(BaseHTTPMiddleware):
                     'correlation_id': correlation_id,
                     'method': request.method,
                     'path': request.url.path,
+                    'query_params': dict(request.query_params) or None,
+                    'client_host': request.client.host if request.client else None,
                     'duration_ms': round(duration * 1000, 2),
                     'error': str(e),
                 },
@@ -71,31 +90,81 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             raise
 
 
-class PerformanceMonitoringMiddleware(BaseHTTPMiddleware):
-    """Middleware for monitoring slow requests"""
-    
+class PerformanceMonitoringMiddleware:
+    """
+    Middleware for monitoring slow requests
+
+    When a request is still running after ``slow_request_threshold`` seconds,
+    the await chain of its task is captured (where it is waiting, e.g. an
+    adapter fetch or a chain confirmation), logged and kept in
+    ``app.utils.profiler.slow_request_captures``.
+    """
+
     SLOW_REQUEST_THRESHOLD = 5.0  # seconds
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+
+    def __init__(self, app: ASGIApp, slow_request_threshold: float = SLOW_REQUEST_THRESHOLD, capture_stacks: bool = True):
+        self.app = app
+        self.slow_request_threshold = slow_request_threshold
+        self.capture_stacks = capture_stacks
+
+    def _capture_slow_request(self, scope: Scope, task: asyncio.Task, start_time: float) -> None:
+        stack = capture_task_stack(task)
+        capture = {
+            'timestamp': time.time(),
+            'method': scope["method"],
+            'path': scope["path"],
+            'elapsed_ms': round((time.time() - start_time) * 1000, 2),
+            'stack': stack,
+        }
+        slow_request_captures.append(capture)
+        logger.warning(
+            f"Slow request in progress",
+            extra={
+                'method': capture['method'],
+                'path': capture['path'],
+                'duration_ms': capture['elapsed_ms'],
+                'threshold_ms': self.slow_request_threshold * 1000,
+                'stack': stack,
+            }
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         start_time = time.time()
-        
-        response = await call_next(request)
-        
-        duration = time.time() - start_time
-        
-        # Log slow requests
-        if duration > self.SLOW_REQUEST_THRESHOLD:
-            logger.warning(
-                f"Slow request detected",
-                extra={
-                    'method': request.method,
-                    'path': request.url.path,
-                    'duration_ms': round(duration * 1000, 2),
-                    'threshold_ms': self.SLOW_REQUEST_THRESHOLD * 1000,
-                }
+
+        # Capture where the request is waiting if it is still running at the threshold
+        capture_handle = None
+        if self.capture_stacks:
+            capture_handle = asyncio.get_running_loop().call_later(
+                self.slow_request_threshold,
+                self._capture_slow_request, scope, asyncio.current_task(), start_time
             )
-        
-        # Add performance header
-        response.headers['X-Response-Time'] = f"{round(duration * 1000, 2)}ms"
-        
-        return response
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                duration = time.time() - start_time
+
+                # Log slow requests
+                if duration > self.slow_request_threshold:
+                    logger.warning(
+                        f"Slow request detected",
+                        extra={
+                            'method': scope["method"],
+                            'path': scope["path"],
+                            'duration_ms': round(duration * 1000, 2),
+                            'threshold_ms': self.slow_request_threshold * 1000,
+                        }
+                    )
+
+                # Add performance header
+                MutableHeaders(scope=message)['X-Response-Time'] = f"{round(duration * 1000, 2)}ms"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if capture_handle is not None:
+                capture_handle.cancel()
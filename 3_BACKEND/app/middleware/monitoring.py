@@ -1,17 +1,35 @@
+import asyncio
+import os
 import time
 import logging
 import psutil
+from collections import deque
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional
 from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from prometheus_client import Counter, Histogram, Gauge, Info, generate_latest, CONTENT_TYPE_LATEST
-import redis
-import sqlite3
-from contextlib import asynccontextmanager
+from starlette.routing import Match, Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from prometheus_client import (
+    Counter, Histogram, Gauge, Info, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+)
+from contextlib import asynccontextmanager, contextmanager
 
 logger = logging.getLogger('valora.monitoring')
 
+# When set (before prometheus_client is imported), every worker writes its
+# metric values to mmap files in this directory and /metrics aggregates them.
+# The gunicorn hooks in gunicorn.conf.py wipe it on start and clean up after
+# dead workers. Gauges declare how their per-worker values are combined.
+MULTIPROCESS_MODE = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+
+# Label values shared by requests that matched no route / used a non-standard method
+UNMATCHED_ENDPOINT = 'unmatched'
+HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+
+BREAKER_STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
 
 # Prometheus metrics
 REQUEST_COUNT = Counter(
@@ -29,13 +47,14 @@ REQUEST_DURATION = Histogram(
 
 ACTIVE_CONNECTIONS = Gauge(
     'active_connections_total',
-    'Number of active connections'
+    'Number of active connections',
+    multiprocess_mode='livesum'
 )
 
 CACHE_OPERATIONS = Counter(
     'cache_operations_total',
     'Cache operations',
-    ['operation', 'result']  # operation: get/set, result: hit/miss/error
+    ['operation', 'result']  # operation: get/set/evict/principal, result: hit/miss/error/lru/expired
 )
 
 DATABASE_OPERATIONS = Counter(
@@ -58,48 +77,218 @@ SYSTEM_INFO = Info(
 MEMORY_USAGE = Gauge(
     'system_memory_usage_bytes',
     'System memory usage in bytes',
-    ['type']  # total, available, used, percentage
+    ['type'],  # total, available, used, percentage
+    multiprocess_mode='livemostrecent'
 )
 
 CPU_USAGE = Gauge(
     'system_cpu_usage_percent',
-    'System CPU usage percentage'
+    'System CPU usage percentage',
+    multiprocess_mode='livemostrecent'
 )
 
 UPTIME_SECONDS = Gauge(
     'valora_uptime_seconds',
-    'Application uptime in seconds'
+    'Application uptime in seconds',
+    multiprocess_mode='livemax'
 )
 
 ERROR_RATE = Gauge(
     'error_rate_per_minute',
-    'Error rate per minute'
+    'Error rate per minute',
+    multiprocess_mode='livesum'
+)
+
+PASSWORD_HASH_DURATION = Histogram(
+    'password_hash_duration_seconds',
+    'bcrypt hash/verify duration on the auth worker pool',
+    ['operation'],  # hash, verify
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
 )
 
+PASSWORD_HASH_PENDING = Gauge(
+    'password_hash_pending',
+    'bcrypt operations running or waiting for a worker',
+    multiprocess_mode='livesum'
+)
 
-class MetricsMiddleware(BaseHTTPMiddleware):
+PASSWORD_HASH_REJECTED = Counter(
+    'password_hash_rejected_total',
+    'bcrypt operations rejected because the queue was full',
+    ['operation']
+)
+
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'Delay between when a loop callback was due and when it ran',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+EVENT_LOOP_BLOCKS = Counter(
+    'event_loop_blocked_total',
+    'Times the event loop was blocked longer than the debug threshold'
+)
+
+# Price pipeline stages (fetch_product_prices -> compute -> submitter)
+PIPELINE_STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+ADAPTER_FETCH_DURATION = Histogram(
+    'adapter_fetch_duration_seconds',
+    'Time spent in each adapter fetch',
+    ['adapter', 'outcome'],  # outcome: ok/empty/error/timeout/cancelled
+    buckets=PIPELINE_STAGE_BUCKETS
+)
+
+ADAPTER_BREAKER_STATE = Gauge(
+    'adapter_circuit_state',
+    'Adapter circuit breaker state (0 closed, 1 half-open, 2 open)',
+    ['adapter'],
+    multiprocess_mode='livemax'
+)
+
+ADAPTER_SKIPPED = Counter(
+    'adapter_fetch_skipped_total',
+    'Adapter fetches skipped because the circuit was open',
+    ['adapter']
+)
+
+ADAPTER_ROUTING = Counter(
+    'adapter_routing_total',
+    'Adapter routing decisions per product computation',
+    ['adapter', 'decision']  # decision: routed/disabled/category/no_url/no_api_key/search_only
+)
+
+ADAPTER_LATE = Counter(
+    'adapter_fetch_late_total',
+    'Adapter fetches still running when the fan-out reached its quorum or deadline',
+    ['adapter', 'handling']  # handling: cancelled/history
+)
+
+SCRAPE_REQUESTS = Counter(
+    'scrape_requests_total',
+    'Outbound adapter requests sent through the host scheduler',
+    ['host', 'status']  # status: HTTP status class (2xx/3xx/4xx/5xx) or error
+)
+
+SCRAPE_SCHEDULE_WAIT = Histogram(
+    'scrape_schedule_wait_seconds',
+    'Time an outbound request waited for its host slot',
+    ['host'],
+    buckets=PIPELINE_STAGE_BUCKETS
+)
+
+SCRAPE_THROTTLED = Counter(
+    'scrape_throttled_total',
+    'Outbound requests refused by the host scheduler',
+    ['host', 'reason']  # reason: retry_after/rate/quota
+)
+
+PAGE_READ_BYTES = Histogram(
+    'adapter_page_read_bytes',
+    'Bytes read per fetched page',
+    ['result'],  # result: complete/capped/early_stop
+    buckets=(16384, 65536, 262144, 524288, 1048576, 2097152, 4194304, 8388608)
+)
+
+API_QUOTA_USED = Gauge(
+    'scrape_api_quota_used',
+    'Calls made today against each API key quota',
+    ['api'],
+    multiprocess_mode='livemax'
+)
+
+HTML_PARSE_DURATION = Histogram(
+    'adapter_html_parse_duration_seconds',
+    'Time spent parsing fetched HTML',
+    ['adapter', 'method'],  # method: structured (JSON-LD / embedded state scan) or dom
+    buckets=PIPELINE_STAGE_BUCKETS
+)
+
+PIPELINE_STAGE_DURATION = Histogram(
+    'price_pipeline_stage_duration_seconds',
+    'Time spent in each price computation stage',
+    ['stage'],  # fetch, normalize, aggregate, db_load, db_persist, ws_broadcast
+    buckets=PIPELINE_STAGE_BUCKETS
+)
+
+DATABASE_OPERATION_DURATION = Histogram(
+    'database_operation_duration_seconds',
+    'Database operation duration in seconds',
+    ['operation', 'table'],
+    buckets=PIPELINE_STAGE_BUCKETS
+)
+
+BLOCKCHAIN_OPERATION_DURATION = Histogram(
+    'blockchain_operation_duration_seconds',
+    'Blockchain operation duration in seconds',
+    ['operation'],  # submit, confirm
+    buckets=PIPELINE_STAGE_BUCKETS
+)
+
+
+class MetricsMiddleware:
     """
     Middleware to collect Prometheus metrics for all requests
     """
     
-    def __init__(self, app):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp):
+        self.app = app
         self.start_time = time.time()
-        self.error_timestamps: List[float] = []
+        self.error_timestamps: deque = deque()
+        self._endpoint_names: Dict[Any, str] = {}
     
-    def _get_endpoint_name(self, request: Request) -> str:
-        """Extract endpoint name for metrics"""
-        path = request.url.path
+    def _get_endpoint_name(self, scope: Scope) -> str:
+        """
+        Extract endpoint name for metrics
+
+        Uses the template of the route the router matched (e.g.
+        ``/api/price/{product_id}``) so label cardinality is bounded by the
+        number of routes, not by the ids in request paths. Requests that no
+        route matched (404s, slash redirects) share the ``unmatched`` label.
+        Must be called after the downstream app has run.
+        """
+        route = scope.get("route")
+        if route is not None:
+            # FastAPI routes record themselves in the scope
+            return route.path_format
         
-        # Normalize paths with IDs
-        if '/api/products/' in path and path.count('/') > 3:
-            return '/api/products/{id}'
-        if '/api/prices/' in path and path.count('/') > 3:
-            return '/api/prices/{id}'
-        if '/api/users/' in path and path.count('/') > 3:
-            return '/api/users/{id}'
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            # Answered before the router ran (e.g. a response cache HIT)
+            return self._match_route(scope)
         
-        return path
+        # Plain Starlette routes (docs, openapi) and mounts only record the endpoint
+        name = self._endpoint_names.get(endpoint)
+        if name is None:
+            name = UNMATCHED_ENDPOINT
+            router = scope.get("router")
+            for candidate in getattr(router, "routes", ()):
+                if getattr(candidate, "endpoint", None) is endpoint or getattr(candidate, "app", None) is endpoint:
+                    if isinstance(candidate, Mount):
+                        name = candidate.path + "/{path}"
+                    else:
+                        name = candidate.path_format
+                    break
+            self._endpoint_names[endpoint] = name
+        return name
+    
+    @staticmethod
+    def _match_route(scope: Scope) -> str:
+        """Template of the app route that fully matches the request, or ``unmatched``"""
+        router = getattr(scope.get("app"), "router", None)
+        for candidate in getattr(router, "routes", ()):
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                if isinstance(candidate, Mount):
+                    return candidate.path + "/{path}"
+                return candidate.path_format
+        return UNMATCHED_ENDPOINT
+    
+    @staticmethod
+    def _get_method(scope: Scope) -> str:
+        """Bound the method label to standard HTTP methods"""
+        method = scope["method"]
+        return method if method in HTTP_METHODS else "OTHER"
     
     def _get_client_type(self, request: Request) -> str:
         """Determine client type from User-Agent"""
@@ -121,126 +310,156 @@ class MetricsMiddleware(BaseHTTPMiddleware):
     def _update_error_rate(self):
         """Update error rate metric"""
         current_time = time.time()
-        # Keep errors from last minute
-        self.error_timestamps = [
-            timestamp for timestamp in self.error_timestamps
-            if current_time - timestamp < 60
-        ]
+        # Keep errors from last minute (timestamps are appended in order)
+        while self.error_timestamps and current_time - self.error_timestamps[0] >= 60:
+            self.error_timestamps.popleft()
         ERROR_RATE.set(len(self.error_timestamps))
     
-    async def dispatch(self, request: Request, call_next) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         # Update active connections
         ACTIVE_CONNECTIONS.inc()
         
+        request = Request(scope)
         start_time = time.time()
-        endpoint = self._get_endpoint_name(request)
         client_type = self._get_client_type(request)
+        status_code = "500"
+        
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = str(message["status"])
+                # Track errors
+                if message["status"] >= 400:
+                    self.error_timestamps.append(time.time())
+            await send(message)
         
         try:
-            response = await call_next(request)
-            status_code = str(response.status_code)
-            
-            # Track errors
-            if response.status_code >= 400:
-                self.error_timestamps.append(time.time())
-                self._update_error_rate()
-            
+            await self.app(scope, receive, send_with_status)
         except Exception as e:
             # Handle middleware exceptions
             logger.error(f"Request failed with exception: {e}")
             status_code = "500"
             self.error_timestamps.append(time.time())
-            self._update_error_rate()
             raise
         finally:
             # Update metrics
             duration = time.time() - start_time
+            endpoint = self._get_endpoint_name(scope)
+            method = self._get_method(scope)
             
             REQUEST_COUNT.labels(
-                method=request.method,
+                method=method,
                 endpoint=endpoint,
                 status_code=status_code,
                 client_type=client_type
             ).inc()
             
             REQUEST_DURATION.labels(
-                method=request.method,
+                method=method,
                 endpoint=endpoint,
                 status_code=status_code
             ).observe(duration)
             
             ACTIVE_CONNECTIONS.dec()
             
+            # Refreshed on every request so errors age out of the window even
+            # when no new ones arrive (each worker reports its own window)
+            self._update_error_rate()
+            
             # Update uptime
             UPTIME_SECONDS.set(time.time() - self.start_time)
-        
-        return response
 
 
 class HealthChecker:
     """
     Comprehensive health checking system
+
+    Probes run in a background task every ``probe_interval`` seconds and the
+    latest results are served from memory, so health endpoints never wait on
+    the database, Redis or algod. Blocking client calls run in worker threads.
     """
     
-    def __init__(self):
+    def __init__(self, probe_interval: float = 15.0, probe_timeout: float = 5.0):
         self.start_time = datetime.now(timezone.utc)
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self._results: Optional[Dict[str, Any]] = None
+        self._checked_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock = asyncio.Lock()
+        # Prime the CPU counter; later non-blocking calls report usage since the previous call
+        psutil.cpu_percent(interval=None)
+    
+    def _ping_database(self) -> Dict[str, Any]:
+        from sqlalchemy import text
+        from app.database import engine
+        
+        start_time = time.time()
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1")).fetchone()
+        response_time = time.time() - start_time
+        
+        return {
+            'status': 'healthy',
+            'response_time_ms': round(response_time * 1000, 2),
+            'type': engine.dialect.name
+        }
     
     async def check_database_health(self) -> Dict[str, Any]:
         """Check database connectivity and performance"""
         try:
-            # For SQLite
-            start_time = time.time()
-            conn = sqlite3.connect('valora.db', timeout=5)
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
-            conn.close()
-            
-            response_time = time.time() - start_time
-            
-            return {
-                'status': 'healthy',
-                'response_time_ms': round(response_time * 1000, 2),
-                'type': 'sqlite'
-            }
+            return await asyncio.wait_for(asyncio.to_thread(self._ping_database), self.probe_timeout)
         except Exception as e:
             return {
                 'status': 'unhealthy',
-                'error': str(e),
-                'type': 'sqlite'
+                'error': str(e) or type(e).__name__
             }
     
+    def _ping_redis(self, redis_client) -> Dict[str, Any]:
+        start_time = time.time()
+        redis_client.ping()
+        response_time = time.time() - start_time
+        
+        # Get Redis info
+        info = redis_client.info()
+        
+        return {
+            'status': 'healthy',
+            'response_time_ms': round(response_time * 1000, 2),
+            'memory_usage_mb': round(info.get('used_memory', 0) / 1024 / 1024, 2),
+            'connected_clients': info.get('connected_clients', 0),
+            'uptime_seconds': info.get('uptime_in_seconds', 0)
+        }
+    
     async def check_redis_health(self) -> Dict[str, Any]:
         """Check Redis connectivity and performance"""
-        try:
-            redis_url = "redis://localhost:6379/0"
-            redis_client = redis.from_url(redis_url, socket_timeout=5)
-            
-            start_time = time.time()
-            redis_client.ping()
-            response_time = time.time() - start_time
-            
-            # Get Redis info
-            info = redis_client.info()
-            
+        from app.utils import cache
+        
+        redis_client = cache.cache_manager.redis_client if cache.cache_manager else None
+        if redis_client is None:
+            # REDIS_URL unset or unreachable at startup; the cache runs in memory
             return {
-                'status': 'healthy',
-                'response_time_ms': round(response_time * 1000, 2),
-                'memory_usage_mb': round(info.get('used_memory', 0) / 1024 / 1024, 2),
-                'connected_clients': info.get('connected_clients', 0),
-                'uptime_seconds': info.get('uptime_in_seconds', 0)
+                'status': 'disabled',
+                'backend': 'memory'
             }
+        
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(self._ping_redis, redis_client), self.probe_timeout)
         except Exception as e:
             return {
                 'status': 'unhealthy',
-                'error': str(e)
+                'error': str(e) or type(e).__name__
             }
     
     async def check_blockchain_health(self) -> Dict[str, Any]:
         """Check blockchain connectivity"""
         try:
             from app.contracts.submitter import get_blockchain_status
-            status = get_blockchain_status()
+            status = await asyncio.wait_for(asyncio.to_thread(get_blockchain_status), self.probe_timeout)
             
             if status['configured']:
                 return {
@@ -258,7 +477,7 @@ class HealthChecker:
         except Exception as e:
             return {
                 'status': 'unhealthy',
-                'error': str(e)
+                'error': str(e) or type(e).__name__
             }
     
     def get_system_metrics(self) -> Dict[str, Any]:
@@ -271,10 +490,12 @@ class HealthChecker:
             MEMORY_USAGE.labels(type='used').set(memory.used)
             MEMORY_USAGE.labels(type='percentage').set(memory.percent)
             
-            # CPU info
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # CPU info (average since the previous probe, does not sleep)
+            cpu_percent = psutil.cpu_percent(interval=None)
             CPU_USAGE.set(cpu_percent)
             
+            disk = psutil.disk_usage('/')
+            
             return {
                 'memory': {
                     'total_gb': round(memory.total / 1024 / 1024 / 1024, 2),
@@ -288,54 +509,100 @@ class HealthChecker:
                     'count_logical': psutil.cpu_count(logical=True)
                 },
                 'disk': {
-                    'usage_percent': psutil.disk_usage('/').percent,
-                    'free_gb': round(psutil.disk_usage('/').free / 1024 / 1024 / 1024, 2)
+                    'usage_percent': disk.percent,
+                    'free_gb': round(disk.free / 1024 / 1024 / 1024, 2)
                 }
             }
         except Exception as e:
             logger.error(f"Failed to get system metrics: {e}")
             return {'error': str(e)}
     
+    async def refresh(self) -> Dict[str, Any]:
+        """Run all probes concurrently and store the results"""
+        async with self._refresh_lock:
+            database_health, redis_health, blockchain_health = await asyncio.gather(
+                self.check_database_health(),
+                self.check_redis_health(),
+                self.check_blockchain_health()
+            )
+            self._results = {
+                'database': database_health,
+                'redis': redis_health,
+                'blockchain': blockchain_health,
+                'system': self.get_system_metrics()
+            }
+            self._checked_at = datetime.now(timezone.utc)
+            return self._results
+    
+    async def _probe_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Health probe failed: {e}")
+            await asyncio.sleep(self.probe_interval)
+    
+    def start(self):
+        """Start the background probe task (call from the running event loop)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._probe_loop())
+            logger.info(f"Health probes started (interval {self.probe_interval}s)")
+    
+    async def stop(self):
+        """Cancel the background probe task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
     async def get_comprehensive_health(self) -> Dict[str, Any]:
-        """Get comprehensive health status"""
+        """Get comprehensive health status from the latest probe results"""
         uptime = datetime.now(timezone.utc) - self.start_time
         
-        # Check all services
-        database_health = await self.check_database_health()
-        redis_health = await self.check_redis_health()
-        blockchain_health = await self.check_blockchain_health()
-        system_metrics = self.get_system_metrics()
+        # Probe inline only until the background task has produced results
+        results = self._results or await self.refresh()
+        services = {
+            'database': results['database'],
+            'redis': results['redis'],
+            'blockchain': results['blockchain']
+        }
+        
+        from app.adapters.circuit_breaker import adapter_breakers
         
-        # Determine overall status
-        all_healthy = all([
-            database_health['status'] == 'healthy',
-            redis_health['status'] == 'healthy',
-            blockchain_health['status'] == 'healthy'
-        ])
+        # Determine overall status (a disabled Redis falls back to the in-memory cache)
+        all_healthy = all(
+            service['status'] in ('healthy', 'disabled') for service in services.values()
+        )
         
         return {
             'status': 'healthy' if all_healthy else 'degraded',
             'timestamp': datetime.now(timezone.utc).isoformat(),
+            'checked_at': self._checked_at.isoformat(),
             'uptime': {
                 'seconds': int(uptime.total_seconds()),
                 'human': str(uptime).split('.')[0]
             },
             'version': '2.0',
-            'services': {
-                'database': database_health,
-                'redis': redis_health,
-                'blockchain': blockchain_health
-            },
-            'system': system_metrics,
+            'services': services,
+            'adapters': adapter_breakers.snapshot(),
+            'system': results['system'],
             'metrics_summary': {
-                'total_requests': REQUEST_COUNT._value.sum(),
-                'active_connections': ACTIVE_CONNECTIONS._value._value,
-                'error_rate_per_minute': ERROR_RATE._value._value
+                'total_requests': sum(
+                    sample.value
+                    for metric in REQUEST_COUNT.collect()
+                    for sample in metric.samples
+                    if sample.name.endswith('_total')
+                ),
+                'active_connections': ACTIVE_CONNECTIONS._value.get(),
+                'error_rate_per_minute': ERROR_RATE._value.get()
             }
         }
 
 
-# Initialize system info metric
+# Initialize system info metric (Info metrics are not exported in multiprocess mode)
 SYSTEM_INFO.info({
     'version': '2.0',
     'python_version': f"{psutil.Process().memory_info()}",
@@ -349,30 +616,124 @@ class MetricsCollector:
     """
     
     @staticmethod
-    def record_cache_operation(operation: str, result: str):
+    def record_cache_operation(operation: str, result: str, amount: int = 1):
         """Record cache operation metric"""
-        CACHE_OPERATIONS.labels(operation=operation, result=result).inc()
+        CACHE_OPERATIONS.labels(operation=operation, result=result).inc(amount)
     
     @staticmethod
-    def record_database_operation(operation: str, table: str, result: str):
+    def record_database_operation(operation: str, table: str, result: str, duration: Optional[float] = None):
         """Record database operation metric"""
         DATABASE_OPERATIONS.labels(operation=operation, table=table, result=result).inc()
+        if duration is not None:
+            DATABASE_OPERATION_DURATION.labels(operation=operation, table=table).observe(duration)
     
     @staticmethod
-    def record_blockchain_operation(operation: str, result: str):
+    def record_blockchain_operation(operation: str, result: str, duration: Optional[float] = None):
         """Record blockchain operation metric"""
         BLOCKCHAIN_OPERATIONS.labels(operation=operation, result=result).inc()
+        if duration is not None:
+            BLOCKCHAIN_OPERATION_DURATION.labels(operation=operation).observe(duration)
+    
+    @staticmethod
+    def record_adapter_fetch(adapter: str, outcome: str, duration: float):
+        """Record a single adapter fetch"""
+        ADAPTER_FETCH_DURATION.labels(adapter=adapter, outcome=outcome).observe(duration)
+    
+    @staticmethod
+    def set_adapter_breaker_state(adapter: str, state: str):
+        """Record an adapter circuit breaker state change"""
+        ADAPTER_BREAKER_STATE.labels(adapter=adapter).set(BREAKER_STATE_VALUES.get(state, 0))
+    
+    @staticmethod
+    def record_adapter_skipped(adapter: str):
+        """Record a fetch skipped by an open circuit"""
+        ADAPTER_SKIPPED.labels(adapter=adapter).inc()
+    
+    @staticmethod
+    def record_adapter_route(adapter: str, decision: str):
+        """Record whether a product was routed to an adapter (or why not)"""
+        ADAPTER_ROUTING.labels(adapter=adapter, decision=decision).inc()
+    
+    @staticmethod
+    def record_adapter_late(adapter: str, handling: str):
+        """Record a fetch left running (or cancelled) after the fan-out returned"""
+        ADAPTER_LATE.labels(adapter=adapter, handling=handling).inc()
+    
+    @staticmethod
+    def record_scrape_request(host: str, status: str, wait: float):
+        """Record an outbound request and how long it waited for its host slot"""
+        SCRAPE_REQUESTS.labels(host=host, status=status).inc()
+        SCRAPE_SCHEDULE_WAIT.labels(host=host).observe(wait)
+    
+    @staticmethod
+    def record_scrape_throttled(host: str, reason: str):
+        """Record an outbound request refused by the host scheduler"""
+        SCRAPE_THROTTLED.labels(host=host, reason=reason).inc()
+    
+    @staticmethod
+    def record_page_read(result: str, size: int):
+        """Record how much of a page was read and why reading stopped"""
+        PAGE_READ_BYTES.labels(result=result).observe(size)
+    
+    @staticmethod
+    def set_api_quota_used(api: str, used: int):
+        """Record today's call count against an API key quota"""
+        API_QUOTA_USED.labels(api=api).set(used)
+    
+    @staticmethod
+    def record_html_parse(adapter: str, duration: float, method: str = 'dom'):
+        """Record HTML parse time for an adapter"""
+        HTML_PARSE_DURATION.labels(adapter=adapter, method=method).observe(duration)
+    
+    @staticmethod
+    def record_password_hash(operation: str, duration: float):
+        """Record a bcrypt hash/verify run"""
+        PASSWORD_HASH_DURATION.labels(operation=operation).observe(duration)
+    
+    @staticmethod
+    def record_password_hash_rejected(operation: str):
+        """Record a bcrypt operation rejected by the queue limit"""
+        PASSWORD_HASH_REJECTED.labels(operation=operation).inc()
+    
+    @staticmethod
+    def set_password_hash_pending(pending: int):
+        """Set the number of queued/running bcrypt operations"""
+        PASSWORD_HASH_PENDING.set(pending)
+    
+    @staticmethod
+    def record_stage(stage: str, duration: float):
+        """Record the duration of a price pipeline stage"""
+        PIPELINE_STAGE_DURATION.labels(stage=stage).observe(duration)
+    
+    @staticmethod
+    @contextmanager
+    def time_stage(stage: str):
+        """Time a price pipeline stage (recorded even if the stage raises)"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            PIPELINE_STAGE_DURATION.labels(stage=stage).observe(time.perf_counter() - start_time)
 
 
 # Global health checker instance
-health_checker = HealthChecker()
+health_checker = HealthChecker(
+    probe_interval=float(os.getenv('HEALTH_PROBE_INTERVAL', '15')),
+    probe_timeout=float(os.getenv('HEALTH_PROBE_TIMEOUT', '5'))
+)
 metrics_collector = MetricsCollector()
 
 
 def get_metrics_response() -> Response:
     """Generate Prometheus metrics response"""
     try:
-        metrics_data = generate_latest()
+        if MULTIPROCESS_MODE:
+            # Aggregate the values written by every live worker
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            metrics_data = generate_latest(registry)
+        else:
+            metrics_data = generate_latest()
         return Response(content=metrics_data, media_type=CONTENT_TYPE_LATEST)
     except Exception as e:
         logger.error(f"Failed to generate metrics: {e}")
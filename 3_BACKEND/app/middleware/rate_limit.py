@@ -1,7 +1,9 @@
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
 from starlette.responses import JSONResponse
-from typing import Callable, Dict
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import math
 import time
 import logging
 
@@ -10,87 +12,124 @@ from app.exceptions import RateLimitException
 logger = logging.getLogger('valora.rate_limit')
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
+class InMemoryRateLimiter:
+    """
+    Memory-bounded, multi-window rate limiter for a single process.
+
+    Each window is tracked with a sliding-window counter (the current and
+    previous fixed-window counts, weighted by how far the current window has
+    progressed), so a check costs O(1) regardless of request volume. Tracked
+    clients are kept in LRU order and capped at max_clients; clients idle for
+    longer than the largest window are swept periodically.
+    """
+
+    def __init__(
+        self,
+        windows: List[Tuple[str, int, int]],
+        max_clients: int = 100000,
+        sweep_interval: float = 60.0
+    ):
+        # (name, window_seconds, limit)
+        self.windows = windows
+        self.max_clients = max_clients
+        self.sweep_interval = sweep_interval
+        self._idle_after = max(seconds for _, seconds, _ in windows)
+
+        # client_key -> [last_seen, (bucket, current, previous) per window...]
+        self._clients: "OrderedDict[str, list]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def _sweep(self, now: float) -> None:
+        """Drop clients idle for longer than the largest window (oldest first)"""
+        self._last_sweep = now
+        cutoff = now - self._idle_after
+        while self._clients:
+            client_key, state = next(iter(self._clients.items()))
+            if state[0] > cutoff:
+                break
+            self._clients.popitem(last=False)
+
+    def hit(self, client_key: str) -> Tuple[bool, str, int, Dict[str, int]]:
+        """
+        Check all windows and record the request if allowed.
+        Returns: (is_allowed, limit_type, retry_after_seconds, counts before this request)
+        """
+        now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._sweep(now)
+
+        state = self._clients.get(client_key)
+        if state is None:
+            state = [now] + [[0, 0, 0] for _ in self.windows]
+            self._clients[client_key] = state
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client_key)
+        state[0] = now
+
+        counts: Dict[str, int] = {}
+        rejected = None
+        for i, (name, window_seconds, limit) in enumerate(self.windows):
+            counter = state[i + 1]
+            bucket = int(now // window_seconds)
+            # Roll the fixed windows forward
+            if bucket != counter[0]:
+                counter[2] = counter[1] if bucket == counter[0] + 1 else 0
+                counter[1] = 0
+                counter[0] = bucket
+            elapsed = now - bucket * window_seconds
+            estimate = int(counter[2] * (window_seconds - elapsed) / window_seconds + counter[1])
+            counts[name] = estimate
+            if rejected is None and estimate >= limit:
+                rejected = (name, max(1, math.ceil(window_seconds - elapsed)))
+
+        if rejected is not None:
+            return False, rejected[0], rejected[1], counts
+
+        for i in range(len(self.windows)):
+            state[i + 1][1] += 1
+        return True, '', 0, counts
+
+
+class RateLimitMiddleware:
     """
     Simple in-memory rate limiting middleware
     For production, use Redis-based rate limiting
     """
     
-    def __init__(self, app, requests_per_minute: int = 60, requests_per_hour: int = 1000):
-        super().__init__(app)
+    def __init__(
+        self,
+        app: ASGIApp,
+        requests_per_minute: int = 60,
+        requests_per_hour: int = 1000,
+        max_tracked_clients: int = 100000
+    ):
+        self.app = app
         self.requests_per_minute = requests_per_minute
         self.requests_per_hour = requests_per_hour
         
-        # In-memory storage: {ip: {'minute': [(timestamp, count)], 'hour': [(timestamp, count)]}}
-        self.rate_limit_data: Dict[str, Dict] = {}
+        # O(1) sliding-window counters per client, LRU-capped
+        self.limiter = InMemoryRateLimiter(
+            [('minute', 60, requests_per_minute), ('hour', 3600, requests_per_hour)],
+            max_clients=max_tracked_clients
+        )
     
-    def _clean_old_requests(self, client_ip: str):
-        """Remove old request records"""
-        current_time = time.time()
-        
-        if client_ip not in self.rate_limit_data:
-            self.rate_limit_data[client_ip] = {'minute': [], 'hour': []}
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Skip rate limiting for health check
+        if scope["type"] != "http" or scope["path"] == "/api/health":
+            await self.app(scope, receive, send)
             return
         
-        # Clean minute data (older than 60 seconds)
-        self.rate_limit_data[client_ip]['minute'] = [
-            (ts, count) for ts, count in self.rate_limit_data[client_ip]['minute']
-            if current_time - ts < 60
-        ]
-        
-        # Clean hour data (older than 3600 seconds)
-        self.rate_limit_data[client_ip]['hour'] = [
-            (ts, count) for ts, count in self.rate_limit_data[client_ip]['hour']
-            if current_time - ts < 3600
-        ]
-    
-    def _check_rate_limit(self, client_ip: str) -> tuple[bool, str, int]:
-        """
-        Check if client has exceeded rate limit
-        Returns: (is_allowed, limit_type, retry_after_seconds)
-        """
-        self._clean_old_requests(client_ip)
-        
-        data = self.rate_limit_data[client_ip]
-        current_time = time.time()
-        
-        # Count requests in last minute
-        minute_requests = sum(count for ts, count in data['minute'])
-        if minute_requests >= self.requests_per_minute:
-            oldest_minute = min(ts for ts, _ in data['minute']) if data['minute'] else current_time
-            retry_after = int(60 - (current_time - oldest_minute))
-            return False, 'minute', retry_after
-        
-        # Count requests in last hour
-        hour_requests = sum(count for ts, count in data['hour'])
-        if hour_requests >= self.requests_per_hour:
-            oldest_hour = min(ts for ts, _ in data['hour']) if data['hour'] else current_time
-            retry_after = int(3600 - (current_time - oldest_hour))
-            return False, 'hour', retry_after
-        
-        return True, '', 0
-    
-    def _record_request(self, client_ip: str):
-        """Record a new request"""
-        current_time = time.time()
-        data = self.rate_limit_data[client_ip]
-        
-        # Add to minute tracking
-        data['minute'].append((current_time, 1))
-        
-        # Add to hour tracking
-        data['hour'].append((current_time, 1))
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
         # Get client IP
-        client_ip = request.client.host if request.client else "unknown"
-        
-        # Skip rate limiting for health check
-        if request.url.path == "/api/health":
-            return await call_next(request)
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
         
-        # Check rate limit
-        is_allowed, limit_type, retry_after = self._check_rate_limit(client_ip)
+        # Check and record in one step
+        is_allowed, limit_type, retry_after, counts = self.limiter.hit(client_ip)
         
         if not is_allowed:
             logger.warning(
@@ -99,11 +138,11 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                     'client_ip': client_ip,
                     'limit_type': limit_type,
                     'retry_after': retry_after,
-                    'path': request.url.path
+                    'path': scope["path"]
                 }
             )
             
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=429,
                 content={
                     'error': 'RateLimitExceeded',
@@ -117,16 +156,18 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                     'X-RateLimit-Remaining': '0'
                 }
             )
+            await response(scope, receive, send)
+            return
         
-        # Record request
-        self._record_request(client_ip)
-        
-        # Process request
-        response = await call_next(request)
+        minute_requests = counts['minute'] + 1
         
-        # Add rate limit headers
-        minute_requests = sum(count for ts, count in self.rate_limit_data[client_ip]['minute'])
-        response.headers['X-RateLimit-Limit'] = str(self.requests_per_minute)
-        response.headers['X-RateLimit-Remaining'] = str(max(0, self.requests_per_minute - minute_requests))
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Add rate limit headers
+                headers = MutableHeaders(scope=message)
+                headers['X-RateLimit-Limit'] = str(self.requests_per_minute)
+                headers['X-RateLimit-Remaining'] = str(max(0, self.requests_per_minute - minute_requests))
+            await send(message)
         
-        return response
+        # Process request
+        await self.app(scope, receive, send_with_headers)
@@ -1,46 +1,220 @@
-import redis
+import redis.asyncio as aioredis
 import time
 import json
+import uuid
+import zlib
+import asyncio
 import logging
-from typing import Dict, Optional, Tuple
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import Request
+from starlette.datastructures import MutableHeaders
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.middleware.rate_limit import InMemoryRateLimiter
 
 logger = logging.getLogger('valora.rate_limit')
 
+# Reconcile tasks in flight (kept referenced so they are not garbage-collected mid-run)
+_reconcile_tasks: Set[asyncio.Task] = set()
+
+
+# Exact sliding log: one sorted-set member per request and window.
+# KEYS: one key per window.
+# ARGV: now, pending, requested, member, then (window_seconds, limit) per window.
+# pending requests were already admitted locally and are always recorded;
+# the requested ones are checked against the limits and recorded if allowed.
+# Returns {allowed, rejected_window_index (1-based, 0 if allowed), retry_after, count...}
+# Counts include pending requests but not the requested ones.
+SLIDING_LOG_SCRIPT = """
+local now = tonumber(ARGV[1])
+local pending = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local member = ARGV[4]
+local counts = {}
+local rejected = 0
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local window = tonumber(ARGV[3 + i * 2])
+    local limit = tonumber(ARGV[4 + i * 2])
+    redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+    local count = redis.call('ZCARD', key) + pending
+    counts[i] = count
+    if requested > 0 and rejected == 0 and count + requested > limit then
+        rejected = i
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        if oldest[2] then
+            retry_after = math.ceil(tonumber(oldest[2]) + window - now)
+        else
+            retry_after = window
+        end
+    end
+end
+local total = pending
+if rejected == 0 then
+    total = total + requested
+end
+if total > 0 then
+    for i, key in ipairs(KEYS) do
+        local window = tonumber(ARGV[3 + i * 2])
+        for j = 1, total do
+            redis.call('ZADD', key, now, member .. ':' .. j)
+        end
+        redis.call('EXPIRE', key, math.ceil(window))
+    end
+end
+local result = {rejected == 0 and 1 or 0, rejected, math.max(retry_after, 1)}
+for i = 1, #counts do
+    result[#result + 1] = counts[i]
+end
+return result
+"""
+
+# Sliding window counter: two fixed-window counters per window, weighted by
+# how far the current window has progressed. O(1) memory per client.
+# KEYS: (current_bucket, previous_bucket) per window.
+# ARGV: now, pending, requested, then (window_seconds, limit) per window.
+# Same semantics and return shape as above.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local pending = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local windows = #KEYS / 2
+local counts = {}
+local rejected = 0
+local retry_after = 0
+for i = 1, windows do
+    local window = tonumber(ARGV[2 + i * 2])
+    local limit = tonumber(ARGV[3 + i * 2])
+    local current = tonumber(redis.call('GET', KEYS[i * 2 - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[i * 2]) or '0')
+    local elapsed = now % window
+    local estimate = math.floor(previous * (window - elapsed) / window + current) + pending
+    counts[i] = estimate
+    if requested > 0 and rejected == 0 and estimate + requested > limit then
+        rejected = i
+        retry_after = math.ceil(window - elapsed)
+    end
+end
+local total = pending
+if rejected == 0 then
+    total = total + requested
+end
+if total > 0 then
+    for i = 1, windows do
+        local window = tonumber(ARGV[2 + i * 2])
+        redis.call('INCRBY', KEYS[i * 2 - 1], total)
+        redis.call('EXPIRE', KEYS[i * 2 - 1], math.ceil(window * 2))
+    end
+end
+local result = {rejected == 0 and 1 or 0, rejected, math.max(retry_after, 1)}
+for i = 1, #counts do
+    result[#result + 1] = counts[i]
+end
+return result
+"""
+
+RATE_LIMIT_ALGORITHMS = ('sliding_log', 'sliding_window')
+
+
+class _LocalBucket:
+    """
+    Per-worker quota leased from Redis. Requests consume tokens locally
+    without a Redis round-trip; the consumed count is reported back the next
+    time the client is reconciled with Redis.
+    """
+
+    __slots__ = ('tokens', 'pending', 'lease_expires', 'counts')
+
+    def __init__(self):
+        self.tokens = 0
+        self.pending = 0
+        self.lease_expires = 0.0
+        self.counts: Dict[str, int] = {}
+
 
-class RedisRateLimitMiddleware(BaseHTTPMiddleware):
+class RedisRateLimitMiddleware:
     """
     Redis-based distributed rate limiting middleware
     Supports multiple time windows and better scalability
+
+    Each request is checked and recorded atomically by a server-side Lua
+    script in a single round-trip.
+    Two algorithms are available:
+      - sliding_log: exact, stores one sorted-set member per request
+      - sliding_window: weighted fixed-window counters, O(1) memory per client
+
+    With local_burst > 0 each worker leases up to that many requests per
+    client from Redis and admits them without a round-trip, reporting them
+    back to Redis at the latest after sync_interval seconds.
     """
     
     def __init__(
         self, 
-        app, 
+        app: ASGIApp, 
         redis_url: str = "redis://localhost:6379/1",
         requests_per_minute: int = 60,
         requests_per_hour: int = 1000,
         requests_per_day: int = 10000,
-        key_prefix: str = "valora:ratelimit"
+        key_prefix: str = "valora:ratelimit",
+        algorithm: str = "sliding_log",
+        local_burst: int = 0,
+        sync_interval: float = 1.0,
+        max_tracked_clients: int = 100000
     ):
-        super().__init__(app)
+        self.app = app
+        if algorithm not in RATE_LIMIT_ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm '{algorithm}', expected one of {RATE_LIMIT_ALGORITHMS}")
         self.requests_per_minute = requests_per_minute
         self.requests_per_hour = requests_per_hour
         self.requests_per_day = requests_per_day
         self.key_prefix = key_prefix
+        self.algorithm = algorithm
+        self.local_burst = local_burst
+        self.sync_interval = sync_interval
+        self._local_buckets: Dict[str, _LocalBucket] = {}
+        self._last_reconcile = time.monotonic()
+        self._reconciling = False
+        self.windows: List[Tuple[str, int, int]] = [
+            ("minute", 60, requests_per_minute),
+            ("hour", 3600, requests_per_hour),
+            ("day", 86400, requests_per_day)
+        ]
+        # Used whenever Redis is unreachable
+        self._fallback = InMemoryRateLimiter(self.windows, max_clients=max_tracked_clients)
         
-        # Initialize Redis connection
+        # Initialize Redis client; the connection is verified on first use
+        # because there is no running event loop yet
+        self.redis_url = redis_url
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._connected = False
         try:
-            self.redis = redis.from_url(redis_url, decode_responses=True)
-            # Test connection
-            self.redis.ping()
-            logger.info(f"Redis rate limiter connected to {redis_url}")
+            self.redis = aioredis.from_url(redis_url, decode_responses=True)
+            # Scripts are loaded lazily and invoked via EVALSHA
+            self._script = self.redis.register_script(
+                SLIDING_LOG_SCRIPT if algorithm == "sliding_log" else SLIDING_WINDOW_SCRIPT
+            )
         except Exception as e:
-            logger.warning(f"Redis connection failed: {e}. Falling back to in-memory rate limiting")
+            logger.warning(f"Redis client setup failed: {e}. Falling back to in-memory rate limiting")
             self.redis = None
-            self._fallback_storage: Dict[str, Dict] = {}
+    
+    async def _ensure_redis(self) -> bool:
+        """Ping Redis once; switch to in-memory limiting if it is unreachable"""
+        if self._connected or self.redis is None:
+            return self.redis is not None
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._connected or self.redis is None:
+                return self.redis is not None
+            try:
+                await self.redis.ping()
+                self._connected = True
+                logger.info(f"Redis rate limiter connected to {self.redis_url} (algorithm={self.algorithm})")
+            except Exception as e:
+                logger.warning(f"Redis connection failed: {e}. Falling back to in-memory rate limiting")
+                self.redis = None
+        return self.redis is not None
     
     def _get_client_key(self, request: Request) -> str:
         """Generate unique key for client identification"""
@@ -51,131 +225,149 @@ class RedisRateLimitMiddleware(BaseHTTPMiddleware):
         
         # Include user agent for better identification
         user_agent = request.headers.get("User-Agent", "")[:50]  # Truncate UA
-        user_agent_hash = str(hash(user_agent))[:8]
+        # crc32 rather than hash() so every worker derives the same key
+        user_agent_hash = format(zlib.crc32(user_agent.encode()), '08x')
         
         return f"{self.key_prefix}:{client_ip}:{user_agent_hash}"
     
-    def _check_rate_limit_redis(self, client_key: str) -> Tuple[bool, str, int, Dict]:
-        """Check rate limits using Redis with sliding window"""
-        current_time = int(time.time())
-        
-        # Define time windows
-        windows = [
-            ("minute", 60, self.requests_per_minute),
-            ("hour", 3600, self.requests_per_hour),
-            ("day", 86400, self.requests_per_day)
-        ]
-        
-        pipe = self.redis.pipeline()
-        
-        # Check all windows
-        for window_name, window_seconds, limit in windows:
-            key = f"{client_key}:{window_name}"
-            window_start = current_time - window_seconds
-            
-            # Remove old entries and count current requests
-            pipe.zremrangebyscore(key, 0, window_start)
-            pipe.zcard(key)
-            pipe.expire(key, window_seconds)
+    def _script_args(
+        self,
+        client_key: str,
+        current_time: float,
+        pending: int = 0,
+        requested: int = 1
+    ) -> Tuple[List[str], List]:
+        """Build KEYS and ARGV for the configured Lua script"""
+        keys: List[str] = []
+        args: List = [current_time, pending, requested]
+        if self.algorithm == "sliding_log":
+            args.append(f"{current_time:.6f}:{uuid.uuid4().hex[:8]}")
+            for window_name, window_seconds, limit in self.windows:
+                keys.append(f"{client_key}:{window_name}")
+                args.extend([window_seconds, limit])
+        else:
+            for window_name, window_seconds, limit in self.windows:
+                bucket = int(current_time // window_seconds)
+                keys.append(f"{client_key}:{window_name}:{bucket}")
+                keys.append(f"{client_key}:{window_name}:{bucket - 1}")
+                args.extend([window_seconds, limit])
+        return keys, args
+    
+    async def _check_and_record_redis(self, client_key: str, pending: int = 0) -> Tuple[bool, str, int, Dict]:
+        """
+        Atomically check all windows and record the request in one round-trip,
+        along with any pending requests already admitted from a local lease
+        """
+        keys, args = self._script_args(client_key, time.time(), pending)
         
         try:
-            results = pipe.execute()
-            
-            # Process results (every 3rd item is the count)
-            counts = [results[i] for i in range(1, len(results), 3)]
-            
-            # Check if any limit is exceeded
-            for i, (window_name, window_seconds, limit) in enumerate(windows):
-                current_count = counts[i]
-                if current_count >= limit:
-                    retry_after = window_seconds
-                    return False, window_name, retry_after, {
-                        'minute': counts[0] if len(counts) > 0 else 0,
-                        'hour': counts[1] if len(counts) > 1 else 0,
-                        'day': counts[2] if len(counts) > 2 else 0
-                    }
-            
-            return True, "", 0, {
-                'minute': counts[0] if len(counts) > 0 else 0,
-                'hour': counts[1] if len(counts) > 1 else 0,
-                'day': counts[2] if len(counts) > 2 else 0
-            }
-            
+            result = await self._script(keys=keys, args=args)
         except Exception as e:
             logger.error(f"Redis rate limit check failed: {e}")
             return True, "", 0, {}  # Allow request on Redis failure
-    
-    def _record_request_redis(self, client_key: str):
-        """Record request in Redis"""
-        current_time = time.time()
-        
-        # Record in all time windows
-        windows = ["minute", "hour", "day"]
-        pipe = self.redis.pipeline()
         
-        for window in windows:
-            key = f"{client_key}:{window}"
-            pipe.zadd(key, {str(current_time): current_time})
-        
-        try:
-            pipe.execute()
-        except Exception as e:
-            logger.error(f"Failed to record request in Redis: {e}")
-    
-    def _check_rate_limit_fallback(self, client_key: str) -> Tuple[bool, str, int, Dict]:
-        """Fallback to in-memory rate limiting when Redis is unavailable"""
-        current_time = time.time()
-        
-        if client_key not in self._fallback_storage:
-            self._fallback_storage[client_key] = {'minute': [], 'hour': [], 'day': []}
-        
-        data = self._fallback_storage[client_key]
-        
-        # Clean old requests
-        data['minute'] = [t for t in data['minute'] if current_time - t < 60]
-        data['hour'] = [t for t in data['hour'] if current_time - t < 3600]
-        data['day'] = [t for t in data['day'] if current_time - t < 86400]
-        
-        # Check limits
+        allowed, rejected_index, retry_after = int(result[0]), int(result[1]), int(result[2])
         counts = {
-            'minute': len(data['minute']),
-            'hour': len(data['hour']),
-            'day': len(data['day'])
+            window_name: int(count)
+            for (window_name, _, _), count in zip(self.windows, result[3:])
         }
-        
-        if counts['minute'] >= self.requests_per_minute:
-            return False, 'minute', 60, counts
-        if counts['hour'] >= self.requests_per_hour:
-            return False, 'hour', 3600, counts
-        if counts['day'] >= self.requests_per_day:
-            return False, 'day', 86400, counts
-        
-        return True, '', 0, counts
+        if allowed:
+            return True, "", 0, counts
+        return False, self.windows[rejected_index - 1][0], retry_after, counts
     
-    def _record_request_fallback(self, client_key: str):
-        """Record request in fallback storage"""
-        current_time = time.time()
+    async def _check_with_local_bucket(self, client_key: str) -> Tuple[bool, str, int, Dict]:
+        """
+        Admit from the client's local lease when possible, otherwise reconcile
+        with Redis (reporting locally admitted requests) and renew the lease
+        """
+        now = time.monotonic()
+        bucket = self._local_buckets.get(client_key)
+        if bucket is None:
+            bucket = self._local_buckets[client_key] = _LocalBucket()
         
-        if client_key not in self._fallback_storage:
-            self._fallback_storage[client_key] = {'minute': [], 'hour': [], 'day': []}
+        if bucket.tokens > 0 and now < bucket.lease_expires:
+            # Counts before this request, as the Redis and in-memory paths report them
+            counts = {name: count + bucket.pending for name, count in bucket.counts.items()}
+            bucket.tokens -= 1
+            bucket.pending += 1
+            return True, "", 0, counts
         
-        data = self._fallback_storage[client_key]
-        data['minute'].append(current_time)
-        data['hour'].append(current_time)
-        data['day'].append(current_time)
+        pending = bucket.pending
+        bucket.pending = 0
+        is_allowed, limit_type, retry_after, counts = await self._check_and_record_redis(client_key, pending)
+        if not counts:
+            # Redis failed and nothing was recorded; report these with the next sync
+            bucket.pending += pending
+        if is_allowed and counts:
+            # Lease no more than the tightest window has left after this call
+            remaining = min(limit - counts[name] - 1 for name, _, limit in self.windows)
+            bucket.tokens = max(0, min(self.local_burst, remaining))
+            bucket.counts = {name: count + 1 for name, count in counts.items()}
+            bucket.lease_expires = now + self.sync_interval
+        else:
+            bucket.tokens = 0
+        return is_allowed, limit_type, retry_after, counts
+    
+    async def _reconcile_local_buckets(self):
+        """Report requests admitted from expired leases and drop idle buckets"""
+        try:
+            now = time.monotonic()
+            for client_key, bucket in list(self._local_buckets.items()):
+                if now < bucket.lease_expires:
+                    continue
+                if bucket.pending:
+                    # Record only: these requests have already been served
+                    pending = bucket.pending
+                    keys, args = self._script_args(client_key, time.time(), pending, requested=0)
+                    bucket.pending = 0
+                    try:
+                        await self._script(keys=keys, args=args)
+                    except Exception as e:
+                        logger.error(f"Failed to reconcile local rate limit bucket: {e}")
+                        bucket.pending += pending
+                if not bucket.pending and now >= bucket.lease_expires:
+                    self._local_buckets.pop(client_key, None)
+        finally:
+            self._reconciling = False
+    
+    def _maybe_schedule_reconcile(self):
+        now = time.monotonic()
+        if self._reconciling or now - self._last_reconcile < self.sync_interval:
+            return
+        self._last_reconcile = now
+        self._reconciling = True
+        task = asyncio.ensure_future(self._reconcile_local_buckets())
+        _reconcile_tasks.add(task)
+        task.add_done_callback(_reconcile_tasks.discard)
+    
+    def _limit_headers(self, counts: Dict) -> Dict[str, str]:
+        return {
+            'X-RateLimit-Limit-Minute': str(self.requests_per_minute),
+            'X-RateLimit-Limit-Hour': str(self.requests_per_hour),
+            'X-RateLimit-Limit-Day': str(self.requests_per_day),
+            'X-RateLimit-Remaining-Minute': str(max(0, self.requests_per_minute - counts.get('minute', 0))),
+            'X-RateLimit-Remaining-Hour': str(max(0, self.requests_per_hour - counts.get('hour', 0))),
+            'X-RateLimit-Remaining-Day': str(max(0, self.requests_per_day - counts.get('day', 0)))
+        }
     
-    async def dispatch(self, request: Request, call_next) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         # Skip rate limiting for health checks and metrics
-        if request.url.path in ["/api/health", "/metrics", "/docs", "/redoc"]:
-            return await call_next(request)
+        if scope["type"] != "http" or scope["path"] in ["/api/health", "/metrics", "/docs", "/redoc"]:
+            await self.app(scope, receive, send)
+            return
         
+        request = Request(scope)
         client_key = self._get_client_key(request)
         
-        # Check rate limits
-        if self.redis:
-            is_allowed, limit_type, retry_after, counts = self._check_rate_limit_redis(client_key)
+        # Check rate limits (the Redis path records the request in the same call)
+        if await self._ensure_redis():
+            if self.local_burst > 0:
+                is_allowed, limit_type, retry_after, counts = await self._check_with_local_bucket(client_key)
+                self._maybe_schedule_reconcile()
+            else:
+                is_allowed, limit_type, retry_after, counts = await self._check_and_record_redis(client_key)
         else:
-            is_allowed, limit_type, retry_after, counts = self._check_rate_limit_fallback(client_key)
+            is_allowed, limit_type, retry_after, counts = self._fallback.hit(client_key)
         
         if not is_allowed:
             logger.warning(
@@ -189,7 +381,7 @@ class RedisRateLimitMiddleware(BaseHTTPMiddleware):
                 }
             )
             
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=429,
                 content={
                     'error': 'RateLimitExceeded',
@@ -200,35 +392,22 @@ class RedisRateLimitMiddleware(BaseHTTPMiddleware):
                 },
                 headers={
                     'Retry-After': str(retry_after),
-                    'X-RateLimit-Limit-Minute': str(self.requests_per_minute),
-                    'X-RateLimit-Limit-Hour': str(self.requests_per_hour),
-                    'X-RateLimit-Limit-Day': str(self.requests_per_day),
-                    'X-RateLimit-Remaining-Minute': str(max(0, self.requests_per_minute - counts.get('minute', 0))),
-                    'X-RateLimit-Remaining-Hour': str(max(0, self.requests_per_hour - counts.get('hour', 0))),
-                    'X-RateLimit-Remaining-Day': str(max(0, self.requests_per_day - counts.get('day', 0)))
+                    **self._limit_headers(counts)
                 }
             )
+            await response(scope, receive, send)
+            return
         
-        # Record request
-        if self.redis:
-            self._record_request_redis(client_key)
-        else:
-            self._record_request_fallback(client_key)
-        
-        # Process request
-        response = await call_next(request)
+        limit_headers = self._limit_headers(counts)
         
-        # Add rate limit headers to response
-        response.headers.update({
-            'X-RateLimit-Limit-Minute': str(self.requests_per_minute),
-            'X-RateLimit-Limit-Hour': str(self.requests_per_hour),
-            'X-RateLimit-Limit-Day': str(self.requests_per_day),
-            'X-RateLimit-Remaining-Minute': str(max(0, self.requests_per_minute - counts.get('minute', 0))),
-            'X-RateLimit-Remaining-Hour': str(max(0, self.requests_per_hour - counts.get('hour', 0))),
-            'X-RateLimit-Remaining-Day': str(max(0, self.requests_per_day - counts.get('day', 0)))
-        })
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Add rate limit headers to response
+                MutableHeaders(scope=message).update(limit_headers)
+            await send(message)
         
-        return response
+        # Process request
+        await self.app(scope, receive, send_with_headers)
 
 
 class RateLimitConfig:
@@ -239,10 +418,16 @@ class RateLimitConfig:
         requests_per_minute: int = 60,
         requests_per_hour: int = 1000,
         requests_per_day: int = 10000,
-        enable_redis: bool = True
+        enable_redis: bool = True,
+        algorithm: str = "sliding_log",
+        local_burst: int = 0,
+        sync_interval: float = 1.0
     ):
         self.redis_url = redis_url
         self.requests_per_minute = requests_per_minute
         self.requests_per_hour = requests_per_hour
         self.requests_per_day = requests_per_day
-        self.enable_redis = enable_redis
\ No newline at end of file
+        self.enable_redis = enable_redis
+        self.algorithm = algorithm
+        self.local_burst = local_burst
+        self.sync_interval = sync_interval
\ No newline at end of file
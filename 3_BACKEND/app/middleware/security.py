@@ -3,25 +3,22 @@ import re
 import time
 import logging
 from typing import List, Dict, Set, Optional
-from fastapi import Request, Response, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Request
 from starlette.responses import JSONResponse
-from starlette.datastructures import Headers
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 logger = logging.getLogger('valora.security')
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class SecurityHeadersMiddleware:
     """
     Add comprehensive security headers to all responses
     """
     
-    def __init__(self, app, environment: str = "development"):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, environment: str = "development"):
+        self.app = app
         self.environment = environment
-    
-    async def dispatch(self, request: Request, call_next) -> Response:
-        response = await call_next(request)
         
         # Security headers
         security_headers = {
@@ -46,34 +43,50 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
             # HSTS for production
             security_headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
         
-        # Add all security headers
-        for header, value in security_headers.items():
-            response.headers[header] = value
+        self.security_headers = security_headers
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Add all security headers
+                headers = MutableHeaders(scope=message)
+                for header, value in self.security_headers.items():
+                    headers[header] = value
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_with_headers)
 
 
-class RequestSizeLimitMiddleware(BaseHTTPMiddleware):
+class RequestSizeLimitMiddleware:
     """
     Limit request body size to prevent DoS attacks
     """
     
-    def __init__(self, app, max_size_bytes: int = 1024 * 1024):  # 1MB default
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, max_size_bytes: int = 1024 * 1024):  # 1MB default
+        self.app = app
         self.max_size_bytes = max_size_bytes
     
-    async def dispatch(self, request: Request, call_next) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         # Check Content-Length header
-        content_length = request.headers.get('Content-Length')
+        content_length = Headers(scope=scope).get('Content-Length')
         if content_length:
             try:
                 size = int(content_length)
                 if size > self.max_size_bytes:
+                    client = scope.get("client")
                     logger.warning(
                         f"Request size {size} exceeds limit {self.max_size_bytes}",
-                        extra={'client_ip': request.client.host, 'path': request.url.path}
+                        extra={'client_ip': client[0] if client else None, 'path': scope["path"]}
                     )
-                    return JSONResponse(
+                    response = JSONResponse(
                         status_code=413,
                         content={
                             'error': 'PayloadTooLarge',
@@ -81,25 +94,27 @@ class RequestSizeLimitMiddleware(BaseHTTPMiddleware):
                             'max_size_bytes': self.max_size_bytes
                         }
                     )
+                    await response(scope, receive, send)
+                    return
             except ValueError:
                 pass  # Invalid Content-Length header, let it through
         
-        return await call_next(request)
+        await self.app(scope, receive, send)
 
 
-class IPSecurityMiddleware(BaseHTTPMiddleware):
+class IPSecurityMiddleware:
     """
     IP-based security with blocklists and suspicious pattern detection
     """
     
     def __init__(
         self,
-        app,
+        app: ASGIApp,
         blocked_ips: Optional[Set[str]] = None,
         allowed_ips: Optional[Set[str]] = None,
         enable_suspicious_detection: bool = True
     ):
-        super().__init__(app)
+        self.app = app
         self.blocked_ips = blocked_ips or set()
         self.allowed_ips = allowed_ips  # If set, only these IPs are allowed
         self.enable_suspicious_detection = enable_suspicious_detection
@@ -186,13 +201,19 @@ class IPSecurityMiddleware(BaseHTTPMiddleware):
             self.blocked_ips.add(client_ip)
             logger.warning(f"IP {client_ip} added to blocklist due to suspicious activity")
     
-    async def dispatch(self, request: Request, call_next) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request = Request(scope)
         client_ip = self._get_client_ip(request)
+        response = None
         
         # Check if IP is blocked
         if client_ip in self.blocked_ips:
             logger.warning(f"Blocked IP attempted access: {client_ip}")
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=403,
                 content={
                     'error': 'Forbidden',
@@ -201,9 +222,9 @@ class IPSecurityMiddleware(BaseHTTPMiddleware):
             )
         
         # Check if using allowlist
-        if self.allowed_ips and client_ip not in self.allowed_ips:
+        elif self.allowed_ips and client_ip not in self.allowed_ips:
             logger.warning(f"IP not in allowlist: {client_ip}")
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=403,
                 content={
                     'error': 'Forbidden',
@@ -212,9 +233,9 @@ class IPSecurityMiddleware(BaseHTTPMiddleware):
             )
         
         # Check for suspicious patterns
-        if self._is_suspicious_request(request):
+        elif self._is_suspicious_request(request):
             self._track_suspicious_activity(client_ip)
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=400,
                 content={
                     'error': 'BadRequest',
@@ -222,7 +243,11 @@ class IPSecurityMiddleware(BaseHTTPMiddleware):
                 }
             )
         
-        return await call_next(request)
+        if response is not None:
+            await response(scope, receive, send)
+            return
+        
+        await self.app(scope, receive, send)
 
 
 class CORSConfig:
@@ -0,0 +1,81 @@
+"""
+The application's middleware stack
+
+``middleware_stack`` returns the middlewares in the order app.main adds
+them; the last added runs first. Keeping the list here lets
+scripts/bench_middleware.py measure exactly the stack the app serves with.
+"""
+import os
+from typing import Any, Dict, List, Tuple
+
+from fastapi.middleware.cors import CORSMiddleware
+
+from app.middleware.logging_middleware import LoggingMiddleware, PerformanceMonitoringMiddleware
+from app.middleware.redis_rate_limit import RedisRateLimitMiddleware
+from app.middleware.caching import ResponseCachingMiddleware
+from app.middleware.security import (
+    SecurityHeadersMiddleware,
+    RequestSizeLimitMiddleware,
+    IPSecurityMiddleware,
+    CORSConfig,
+    security_manager
+)
+from app.middleware.monitoring import MetricsMiddleware
+
+
+def middleware_stack(environment: str) -> List[Tuple[type, Dict[str, Any]]]:
+    """(middleware class, options) pairs in add_middleware order, configured from the environment"""
+    stack: List[Tuple[type, Dict[str, Any]]] = []
+
+    # Security headers (applied last, so they're added to all responses)
+    stack.append((SecurityHeadersMiddleware, {'environment': environment}))
+
+    # Response caching (before rate limiting to cache efficiently)
+    stack.append((ResponseCachingMiddleware, {
+        'redis_url': os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+        'default_ttl': int(os.getenv('CACHE_DEFAULT_TTL', '300')),
+    }))
+
+    # CORS - environment-specific configuration; wraps the cache so cached
+    # responses get the headers for the requesting origin, not the first one's
+    cors_config = CORSConfig.get_development_config() if environment == 'development' else CORSConfig.get_production_config()
+    stack.append((CORSMiddleware, cors_config))
+
+    # Rate limiting (Redis-based)
+    stack.append((RedisRateLimitMiddleware, {
+        'redis_url': os.getenv('REDIS_RATE_LIMIT_URL', 'redis://localhost:6379/1'),
+        'requests_per_minute': int(os.getenv('RATE_LIMIT_PER_MINUTE', '60')),
+        'requests_per_hour': int(os.getenv('RATE_LIMIT_PER_HOUR', '1000')),
+        'requests_per_day': int(os.getenv('RATE_LIMIT_PER_DAY', '10000')),
+        'algorithm': os.getenv('RATE_LIMIT_ALGORITHM', 'sliding_log'),
+        'local_burst': int(os.getenv('RATE_LIMIT_LOCAL_BURST', '0')),
+        'sync_interval': float(os.getenv('RATE_LIMIT_SYNC_INTERVAL', '1.0')),
+    }))
+
+    # Request size limiting
+    stack.append((RequestSizeLimitMiddleware, {
+        'max_size_bytes': int(os.getenv('MAX_REQUEST_SIZE', str(1024 * 1024)))  # 1MB default
+    }))
+
+    # IP security (if enabled)
+    if os.getenv('ENABLE_IP_SECURITY', 'false').lower() == 'true':
+        stack.append((IPSecurityMiddleware, {
+            'blocked_ips': security_manager.blocked_ips,
+            'allowed_ips': security_manager.allowed_ips,
+        }))
+
+    # Metrics collection
+    stack.append((MetricsMiddleware, {}))
+
+    # Performance monitoring
+    stack.append((PerformanceMonitoringMiddleware, {
+        'slow_request_threshold': float(os.getenv('SLOW_REQUEST_THRESHOLD', '5.0')),
+        'capture_stacks': os.getenv('SLOW_REQUEST_CAPTURE', 'true').lower() in ('1', 'true', 'yes'),
+    }))
+
+    # Request/response logging (should be last, so it captures everything)
+    stack.append((LoggingMiddleware, {
+        'sample_rate': float(os.getenv('ACCESS_LOG_SAMPLE_RATE', '1.0')),
+        'slow_request_ms': float(os.getenv('ACCESS_LOG_SLOW_MS', '1000')),
+    }))
+    return stack
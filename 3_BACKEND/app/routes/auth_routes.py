@@ -5,7 +5,10 @@ import logging
 
 from app.database import get_db
 from app.models.user import User, UserRole
-from app.auth import hash_password, verify_password, create_access_token, get_current_active_user
+from app.auth import (
+    hash_password_async, verify_and_update_password, PasswordHasherBusy,
+    create_access_token, principal_claims, get_current_active_user
+)
 
 router = APIRouter(prefix='/api/auth', tags=['Authentication'])
 logger = logging.getLogger('valora.auth')
@@ -42,6 +45,14 @@ class TokenResponse(BaseModel):
     user: dict
 
 
+def _auth_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
 class UserResponse(BaseModel):
     id: int
     username: str
@@ -68,7 +79,10 @@ async def register(req: RegisterRequest, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_pwd = hash_password(req.password)
+    try:
+        hashed_pwd = await hash_password_async(req.password)
+    except PasswordHasherBusy:
+        raise _auth_busy()
     new_user = User(
         username=req.username,
         email=req.email,
@@ -81,7 +95,7 @@ async def register(req: RegisterRequest, db: Session = Depends(get_db)):
     db.refresh(new_user)
     
     # Create access token
-    access_token = create_access_token(data={"sub": new_user.username})
+    access_token = create_access_token(data=principal_claims(new_user))
     
     logger.info(f"New user registered: {new_user.username}")
     
@@ -97,7 +111,14 @@ async def login(req: LoginRequest, db: Session = Depends(get_db)):
     """Login user and return JWT token"""
     user = db.query(User).filter(User.username == req.username).first()
     
-    if not user or not verify_password(req.password, user.hashed_password):
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await verify_and_update_password(req.password, user.hashed_password)
+        except PasswordHasherBusy:
+            raise _auth_busy()
+    
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -110,7 +131,13 @@ async def login(req: LoginRequest, db: Session = Depends(get_db)):
             detail="User account is inactive"
         )
     
-    access_token = create_access_token(data={"sub": user.username})
+    # Hash settings changed since this password was stored; save the upgraded hash
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
+        logger.info(f"Rehashed password for user: {user.username}")
+    
+    access_token = create_access_token(data=principal_claims(user))
     
     logger.info(f"User logged in: {user.username}")
     
@@ -1,4 +1,4 @@
-import asyncio, logging
+import asyncio, logging, time
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 from app.ai.fetcher import fetch_product_prices
@@ -6,6 +6,7 @@ from app.contracts.submitter import submit_update
 from app.database import SessionLocal
 from app.models import Product, Price
 from app.utils.ws_manager import ws_manager
+from app.middleware.monitoring import metrics_collector
 
 logger = logging.getLogger('valora.price_service')
 
@@ -13,7 +14,11 @@ logger = logging.getLogger('valora.price_service')
 async def compute(product_id: str, margin_percent: float = 3.0):
     db: Session = SessionLocal()
     try:
+        start = time.perf_counter()
         product: Product | None = db.query(Product).filter(Product.product_id == product_id).first()
+        duration = time.perf_counter() - start
+        metrics_collector.record_database_operation('select', 'products', 'success' if product else 'not_found', duration)
+        metrics_collector.record_stage('db_load', duration)
         if not product:
             raise KeyError('product not found')
 
@@ -71,6 +76,8 @@ async def compute(product_id: str, margin_percent: float = 3.0):
             logger.exception('second blockchain submit failed - continuing')
 
         # Persist computed price to DB
+        start = time.perf_counter()
+        persist_result = 'error'
         try:
             price_row = Price(
                 product_id=product_id,
@@ -83,8 +90,13 @@ async def compute(product_id: str, margin_percent: float = 3.0):
             )
             db.add(price_row)
             db.commit()
+            persist_result = 'success'
         except Exception:
             logger.exception('failed to persist price row - continuing')
+        finally:
+            duration = time.perf_counter() - start
+            metrics_collector.record_database_operation('insert', 'prices', persist_result, duration)
+            metrics_collector.record_stage('db_persist', duration)
 
         result = {
             'product_id': product_id,
@@ -102,20 +114,21 @@ async def compute(product_id: str, margin_percent: float = 3.0):
 
         # Push live update to websocket subscribers
         try:
-            await ws_manager.broadcast(product_id, {
-                'type': 'price_update',
-                'product_id': product_id,
-                'display_paise': display,
-                'display_price_readable': result['display_price_readable'],
-                'lowest_paise': lowest,
-                'margin_percent': float(margin_percent),
-                'blockchain': {
-                    'lowest_tx_id': first_tx_id,
-                    'display_tx_id': second_tx_id,
-                    'lowest_confirmed': first_tx_success,
-                    'display_confirmed': second_tx_success,
-                }
-            })
+            with metrics_collector.time_stage('ws_broadcast'):
+                await ws_manager.broadcast(product_id, {
+                    'type': 'price_update',
+                    'product_id': product_id,
+                    'display_paise': display,
+                    'display_price_readable': result['display_price_readable'],
+                    'lowest_paise': lowest,
+                    'margin_percent': float(margin_percent),
+                    'blockchain': {
+                        'lowest_tx_id': first_tx_id,
+                        'display_tx_id': second_tx_id,
+                        'lowest_confirmed': first_tx_success,
+                        'display_confirmed': second_tx_success,
+                    }
+                })
         except Exception:
             logger.debug('websocket broadcast skipped or failed')
 
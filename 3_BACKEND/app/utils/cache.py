@@ -1,13 +1,24 @@
 import json
+import time
+import enum
+import uuid
+import pickle
+import asyncio
+import decimal
+import fnmatch
+import inspect
 import logging
-from typing import Optional, Any
+import datetime
+import threading
+import dataclasses
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Callable, Union
 from functools import wraps
 import hashlib
 
-logger = logging.getLogger('valora.cache')
+from app.middleware.monitoring import metrics_collector
 
-# In-memory cache as fallback
-_memory_cache = {}
+logger = logging.getLogger('valora.cache')
 
 try:
     import redis
@@ -16,17 +27,324 @@ except ImportError:
     REDIS_AVAILABLE = False
     logger.warning("Redis not installed, using in-memory cache")
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    from pydantic import BaseModel
+except ImportError:
+    BaseModel = None
+
+
+def _json_default(obj: Any) -> Any:
+    """Fallback encoder for values the json module cannot serialize natively"""
+    if BaseModel is not None and isinstance(obj, BaseModel):
+        return obj.model_dump(mode='json')
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class Serializer:
+    """Encodes cached values to bytes/str and back"""
+
+    name = 'base'
+
+    def dumps(self, value: Any) -> Union[bytes, str]:
+        raise NotImplementedError
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        raise NotImplementedError
+
+
+class JSONSerializer(Serializer):
+    """Default serializer. Datetimes, Pydantic models etc. are stored in JSON form"""
+
+    name = 'json'
+
+    def dumps(self, value: Any) -> str:
+        return json.dumps(value, default=_json_default)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class ORJSONSerializer(Serializer):
+    """Fast JSON via orjson; natively handles datetimes, dataclasses and UUIDs"""
+
+    name = 'orjson'
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    """Compact binary encoding via msgpack"""
+
+    name = 'msgpack'
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=_json_default, use_bin_type=True)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+class PickleSerializer(Serializer):
+    """
+    Round-trips arbitrary Python objects (datetimes, Pydantic models...) exactly.
+    Only use with a cache that is not writable by untrusted parties.
+    """
+
+    name = 'pickle'
+
+    def dumps(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return pickle.loads(data)
+
+
+SERIALIZERS: Dict[str, Serializer] = {'json': JSONSerializer(), 'pickle': PickleSerializer()}
+if orjson is not None:
+    SERIALIZERS['orjson'] = ORJSONSerializer()
+if msgpack is not None:
+    SERIALIZERS['msgpack'] = MsgpackSerializer()
+
+
+def get_serializer(serializer: Union[str, Serializer, None]) -> Serializer:
+    """Resolve a serializer name or instance, defaulting to JSON"""
+    if serializer is None:
+        return SERIALIZERS['json']
+    if isinstance(serializer, Serializer):
+        return serializer
+    try:
+        return SERIALIZERS[serializer]
+    except KeyError:
+        raise ValueError(f"Unknown cache serializer '{serializer}' (available: {sorted(SERIALIZERS)})")
+
+
+class UncacheableArgument(TypeError):
+    """Raised when an argument has no stable cache-key representation"""
+
+
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def _key_material(value: Any, out: list) -> None:
+    """
+    Append a type-tagged, order-independent encoding of value to out.
+    Values are tagged by type so that e.g. 1, 1.0, "1" and True never collide.
+    """
+    value_type = type(value)
+    if value_type in _SCALAR_TYPES:
+        out.append(f"{value_type.__name__}:{value!r}")
+    elif value_type is bytes:
+        out.append(f"bytes:{value.hex()}")
+    elif isinstance(value, (list, tuple)):
+        out.append(f"{value_type.__name__}[{len(value)}")
+        for item in value:
+            _key_material(item, out)
+        out.append("]")
+    elif isinstance(value, dict):
+        items = []
+        for k, v in value.items():
+            part: list = []
+            _key_material(k, part)
+            _key_material(v, part)
+            items.append("\x1f".join(part))
+        out.append(f"dict{{{len(items)}")
+        out.extend(sorted(items))
+        out.append("}")
+    elif isinstance(value, (set, frozenset)):
+        items = []
+        for item in value:
+            part = []
+            _key_material(item, part)
+            items.append("\x1f".join(part))
+        out.append(f"set{{{len(items)}")
+        out.extend(sorted(items))
+        out.append("}")
+    elif isinstance(value, enum.Enum):
+        out.append(f"enum:{value_type.__qualname__}.{value.name}")
+    elif isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        out.append(f"{value_type.__name__}:{value.isoformat()}")
+    elif isinstance(value, (decimal.Decimal, uuid.UUID)):
+        out.append(f"{value_type.__name__}:{value}")
+    elif BaseModel is not None and isinstance(value, BaseModel):
+        out.append(f"model:{value_type.__qualname__}")
+        _key_material(value.model_dump(), out)
+    elif dataclasses.is_dataclass(value) and not isinstance(value, type):
+        out.append(f"dataclass:{value_type.__qualname__}")
+        _key_material(dataclasses.asdict(value), out)
+    else:
+        raise UncacheableArgument(
+            f"Cannot derive a cache key from {value_type.__qualname__}; pass key_func to @cached"
+        )
+
+
+def make_cache_key(prefix: str, args: tuple, kwargs: dict) -> str:
+    """Derive a stable, collision-resistant cache key from call arguments"""
+    out: list = []
+    _key_material(args, out)
+    _key_material(kwargs, out)
+    digest = hashlib.blake2b("\x1e".join(out).encode(), digest_size=16).hexdigest()
+    return f"{prefix}:{digest}"
+
+
+class MemoryCache:
+    """
+    Bounded in-process LRU cache used when Redis is unavailable.
+    Entries honour their TTL (expired lazily on read and swept periodically),
+    and the cache is capped both by entry count and by serialized byte size.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        sweep_interval: float = 60.0
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+
+        # key -> (expires_at, serialized_value); ordered oldest-used first
+        self._data: "OrderedDict[str, tuple[float, Union[bytes, str]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._last_sweep = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: str) -> None:
+        _, serialized = self._data.pop(key)
+        self._bytes -= len(serialized)
+
+    def _maybe_sweep(self, now: float) -> None:
+        """Drop every expired entry, at most once per sweep interval"""
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        expired = [k for k, (expires_at, _) in self._data.items() if expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        if expired:
+            self.expirations += len(expired)
+            metrics_collector.record_cache_operation('evict', 'expired', len(expired))
+
+    def _evict_to_fit(self) -> None:
+        """Evict least recently used entries until both budgets are met"""
+        evicted = 0
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._data))
+            self._remove(key)
+            evicted += 1
+        if evicted:
+            self.evictions += evicted
+            metrics_collector.record_cache_operation('evict', 'lru', evicted)
+
+    def get(self, key: str) -> Optional[Union[bytes, str]]:
+        """Return the serialized value for key, or None if missing/expired"""
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_sweep(now)
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, serialized = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                metrics_collector.record_cache_operation('evict', 'expired')
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return serialized
+
+    def set(self, key: str, serialized: Union[bytes, str], ttl: int) -> bool:
+        """Store a serialized value; values larger than the byte budget are rejected"""
+        size = len(serialized)
+        if size > self.max_bytes:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_sweep(now)
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (now + ttl, serialized)
+            self._bytes += size
+            self._evict_to_fit()
+        return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear_pattern(self, pattern: str) -> int:
+        """Delete keys matching a glob-style pattern"""
+        with self._lock:
+            keys = [k for k in self._data if fnmatch.fnmatchcase(k, pattern)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
 
 class CacheManager:
     """Unified cache manager supporting Redis and in-memory fallback"""
     
-    def __init__(self, redis_url: Optional[str] = None, default_ttl: int = 300):
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        default_ttl: int = 300,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024
+    ):
         self.default_ttl = default_ttl
         self.redis_client = None
+        self.memory_cache = MemoryCache(max_entries=max_entries, max_bytes=max_bytes)
         
         if REDIS_AVAILABLE and redis_url:
             try:
-                self.redis_client = redis.from_url(redis_url, decode_responses=True)
+                # Binary-safe so non-JSON serializers (pickle/msgpack/orjson) work
+                self.redis_client = redis.from_url(redis_url, decode_responses=False)
                 self.redis_client.ping()
                 logger.info("Connected to Redis cache")
             except Exception as e:
@@ -35,38 +353,54 @@ class CacheManager:
     
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """Generate cache key from function arguments"""
-        key_data = f"{prefix}:{str(args)}:{str(sorted(kwargs.items()))}"
-        return hashlib.md5(key_data.encode()).hexdigest()
+        return make_cache_key(prefix, args, kwargs)
     
-    def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
+    def get(
+        self,
+        key: str,
+        serializer: Union[str, Serializer, None] = None,
+        default: Any = None
+    ) -> Optional[Any]:
+        """Get value from cache, returning default on a miss"""
+        codec = get_serializer(serializer)
         try:
             if self.redis_client:
                 value = self.redis_client.get(key)
-                if value:
-                    return json.loads(value)
             else:
                 # In-memory fallback
-                if key in _memory_cache:
-                    return _memory_cache[key]['value']
+                value = self.memory_cache.get(key)
+            if value:
+                metrics_collector.record_cache_operation('get', 'hit')
+                return codec.loads(value)
+            metrics_collector.record_cache_operation('get', 'miss')
         except Exception as e:
+            metrics_collector.record_cache_operation('get', 'error')
             logger.error(f"Cache get error: {e}")
-        return None
+        return default
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        serializer: Union[str, Serializer, None] = None
+    ) -> bool:
         """Set value in cache with TTL"""
         ttl = ttl or self.default_ttl
+        codec = get_serializer(serializer)
         try:
-            serialized = json.dumps(value)
+            serialized = codec.dumps(value)
             
             if self.redis_client:
                 self.redis_client.setex(key, ttl, serialized)
-            else:
-                # In-memory fallback (simplified, no actual expiration)
-                _memory_cache[key] = {'value': value, 'ttl': ttl}
+            elif not self.memory_cache.set(key, serialized, ttl):
+                metrics_collector.record_cache_operation('set', 'too_large')
+                return False
             
+            metrics_collector.record_cache_operation('set', 'success')
             return True
         except Exception as e:
+            metrics_collector.record_cache_operation('set', 'error')
             logger.error(f"Cache set error: {e}")
             return False
     
@@ -76,16 +410,16 @@ class CacheManager:
             if self.redis_client:
                 self.redis_client.delete(key)
             else:
-                _memory_cache.pop(key, None)
+                self.memory_cache.delete(key)
             return True
         except Exception as e:
             logger.error(f"Cache delete error: {e}")
             return False
     
     def clear_pattern(self, pattern: str) -> int:
-        """Clear all keys matching pattern (Redis only)"""
+        """Clear all keys matching pattern"""
         if not self.redis_client:
-            return 0
+            return self.memory_cache.clear_pattern(pattern)
         
         try:
             keys = self.redis_client.keys(pattern)
@@ -95,71 +429,130 @@ class CacheManager:
         except Exception as e:
             logger.error(f"Cache clear error: {e}")
             return 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache backend and in-memory fallback statistics"""
+        return {
+            'backend': 'redis' if self.redis_client else 'memory',
+            'memory': self.memory_cache.stats()
+        }
 
 
 # Global cache instance
 cache_manager: Optional[CacheManager] = None
 
 
-def init_cache(redis_url: Optional[str] = None, default_ttl: int = 300):
+def init_cache(
+    redis_url: Optional[str] = None,
+    default_ttl: int = 300,
+    max_entries: int = 10000,
+    max_bytes: int = 64 * 1024 * 1024
+):
     """Initialize global cache manager"""
     global cache_manager
-    cache_manager = CacheManager(redis_url, default_ttl)
+    cache_manager = CacheManager(redis_url, default_ttl, max_entries=max_entries, max_bytes=max_bytes)
     return cache_manager
 
 
-def cached(ttl: int = 300, key_prefix: str = "valora"):
-    """Decorator for caching function results"""
+_MISS = object()
+
+
+def cached(
+    ttl: int = 300,
+    key_prefix: str = "valora",
+    key_func: Optional[Callable[..., str]] = None,
+    serializer: Union[str, Serializer, None] = None,
+    single_flight: bool = True
+):
+    """
+    Decorator for caching function results
+
+    Args:
+        ttl: Time to live in seconds
+        key_prefix: Namespace prepended to every key
+        key_func: Optional callable receiving the call arguments and returning
+            a key string; by default keys are derived from typed arguments
+        serializer: 'json' (default), 'orjson', 'msgpack', 'pickle' or a Serializer
+        single_flight: For coroutines, let concurrent callers with the same key
+            share one in-flight computation instead of stampeding the backend
+
+    Callers may pass bypass_cache=True to skip the cache read and refresh the
+    stored value with a fresh result.
+    """
+    codec = get_serializer(serializer)
+
     def decorator(func):
+        prefix = f"{key_prefix}:{func.__module__}.{func.__qualname__}"
+        inflight: Dict[str, asyncio.Future] = {}
+
+        def build_key(args, kwargs) -> Optional[str]:
+            try:
+                if key_func is not None:
+                    return f"{prefix}:{key_func(*args, **kwargs)}"
+                return make_cache_key(prefix, args, kwargs)
+            except UncacheableArgument as e:
+                logger.debug(f"Skipping cache for {func.__qualname__}: {e}")
+                return None
+
+        async def compute_and_store(cache_key: str, args, kwargs):
+            result = await func(*args, **kwargs)
+            cache_manager.set(cache_key, result, ttl, serializer=codec)
+            return result
+
         @wraps(func)
-        async def async_wrapper(*args, **kwargs):
+        async def async_wrapper(*args, bypass_cache: bool = False, **kwargs):
             if not cache_manager:
                 return await func(*args, **kwargs)
             
             # Generate cache key
-            cache_key = cache_manager._generate_key(
-                f"{key_prefix}:{func.__name__}",
-                *args,
-                **kwargs
-            )
+            cache_key = build_key(args, kwargs)
+            if cache_key is None:
+                return await func(*args, **kwargs)
             
             # Try to get from cache
-            cached_value = cache_manager.get(cache_key)
-            if cached_value is not None:
-                logger.debug(f"Cache hit: {cache_key}")
-                return cached_value
+            if not bypass_cache:
+                cached_value = cache_manager.get(cache_key, serializer=codec, default=_MISS)
+                if cached_value is not _MISS:
+                    logger.debug(f"Cache hit: {cache_key}")
+                    return cached_value
             
             # Execute function and cache result
             logger.debug(f"Cache miss: {cache_key}")
-            result = await func(*args, **kwargs)
-            cache_manager.set(cache_key, result, ttl)
+            if not single_flight:
+                return await compute_and_store(cache_key, args, kwargs)
             
-            return result
+            # Join an identical computation that is already running
+            pending = inflight.get(cache_key)
+            if pending is not None:
+                return await asyncio.shield(pending)
+            
+            task = asyncio.ensure_future(compute_and_store(cache_key, args, kwargs))
+            inflight[cache_key] = task
+            task.add_done_callback(lambda _: inflight.pop(cache_key, None))
+            return await asyncio.shield(task)
         
         @wraps(func)
-        def sync_wrapper(*args, **kwargs):
+        def sync_wrapper(*args, bypass_cache: bool = False, **kwargs):
             if not cache_manager:
                 return func(*args, **kwargs)
             
-            cache_key = cache_manager._generate_key(
-                f"{key_prefix}:{func.__name__}",
-                *args,
-                **kwargs
-            )
+            cache_key = build_key(args, kwargs)
+            if cache_key is None:
+                return func(*args, **kwargs)
             
-            cached_value = cache_manager.get(cache_key)
-            if cached_value is not None:
-                logger.debug(f"Cache hit: {cache_key}")
-                return cached_value
+            if not bypass_cache:
+                cached_value = cache_manager.get(cache_key, serializer=codec, default=_MISS)
+                if cached_value is not _MISS:
+                    logger.debug(f"Cache hit: {cache_key}")
+                    return cached_value
             
             logger.debug(f"Cache miss: {cache_key}")
             result = func(*args, **kwargs)
-            cache_manager.set(cache_key, result, ttl)
+            cache_manager.set(cache_key, result, ttl, serializer=codec)
             
             return result
         
         # Return appropriate wrapper based on function type
-        import inspect
         if inspect.iscoroutinefunction(func):
             return async_wrapper
         else:
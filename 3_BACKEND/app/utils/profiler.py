@@ -0,0 +1,265 @@
+"""
+Low-overhead diagnostics for a running process
+
+- SamplingProfiler: samples the Python stacks of every thread at a fixed
+  interval for a bounded duration and renders them as collapsed stacks
+  (flamegraph.pl / speedscope "collapsed" input) or a speedscope JSON file.
+- capture_task_stack: walks the await chain of an asyncio task, used by
+  PerformanceMonitoringMiddleware to record where a slow request is waiting.
+- LoopLagMonitor: measures event loop lag and, in debug mode, logs the stack
+  of whatever is blocking the loop.
+"""
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.middleware.monitoring import EVENT_LOOP_LAG, EVENT_LOOP_BLOCKS
+
+logger = logging.getLogger('valora.profiler')
+
+MAX_PROFILE_SECONDS = 60.0
+MIN_SAMPLE_INTERVAL = 0.001
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a profile is requested while another one is running"""
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def _walk_stack(frame) -> Tuple[str, ...]:
+    """Return the stack of a frame as labels, outermost first"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler based on sys._current_frames()
+
+    Sampling runs on its own thread, so it also sees the event loop while it
+    is blocked. Only one profile runs at a time per process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, duration: float, interval: float = 0.01) -> Dict[str, Any]:
+        """Sample all threads for ``duration`` seconds (blocking)"""
+        duration = min(max(duration, interval), MAX_PROFILE_SECONDS)
+        interval = max(interval, MIN_SAMPLE_INTERVAL)
+
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy('a profile is already running')
+        try:
+            own_thread = threading.get_ident()
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            stacks: Counter = Counter()
+            samples = 0
+
+            started = time.perf_counter()
+            deadline = started + duration
+            next_sample = started
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    thread_name = thread_names.get(thread_id) or str(thread_id)
+                    stacks[(f"thread {thread_name}",) + _walk_stack(frame)] += 1
+                samples += 1
+                next_sample += interval
+                delay = next_sample - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            return {
+                'duration': time.perf_counter() - started,
+                'interval': interval,
+                'samples': samples,
+                'stacks': stacks,
+            }
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def to_collapsed(result: Dict[str, Any]) -> str:
+        """Render as collapsed stacks: ``frame;frame;frame count`` per line"""
+        lines = [
+            f"{';'.join(stack)} {count}"
+            for stack, count in result['stacks'].most_common()
+        ]
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def to_speedscope(result: Dict[str, Any], name: str = 'valora') -> Dict[str, Any]:
+        """Render as a speedscope sampled profile (https://www.speedscope.app)"""
+        frame_index: Dict[str, int] = {}
+        frames: List[Dict[str, Any]] = []
+        samples: List[List[int]] = []
+        weights: List[float] = []
+
+        for stack, count in result['stacks'].items():
+            indices = []
+            for label in stack:
+                index = frame_index.get(label)
+                if index is None:
+                    index = frame_index[label] = len(frames)
+                    frames.append({'name': label})
+                indices.append(index)
+            samples.append(indices)
+            weights.append(count * result['interval'])
+
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights,
+            }],
+            'name': name,
+            'exporter': 'valora',
+        }
+
+
+def capture_task_stack(task: Optional[asyncio.Task]) -> List[str]:
+    """
+    Return the await chain of a task, outermost first
+
+    Task.get_stack() only yields the outermost coroutine frame of a suspended
+    task, so follow cr_await / gi_yieldfrom down to the innermost awaitable.
+    """
+    if task is None:
+        return []
+
+    labels = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, 'cr_frame', None) or getattr(awaitable, 'gi_frame', None)
+        if frame is not None:
+            labels.append(f"{_frame_label(frame.f_code)} line {frame.f_lineno}")
+        next_awaitable = getattr(awaitable, 'cr_await', None)
+        if next_awaitable is None:
+            next_awaitable = getattr(awaitable, 'gi_yieldfrom', None)
+        if next_awaitable is None and frame is None:
+            # A future or other awaitable object without a frame
+            labels.append(repr(awaitable)[:200])
+        awaitable = next_awaitable
+    return labels
+
+
+class LoopLagMonitor:
+    """
+    Event loop lag monitor
+
+    A callback reschedules itself every ``interval`` seconds and records how
+    late it ran in the ``event_loop_lag_seconds`` histogram. Any sync call made
+    on the loop (Redis, SQLAlchemy, algod, bcrypt, ...) shows up as lag.
+
+    With ``block_threshold`` set (debug mode), the callback also runs often
+    enough to act as a heartbeat, and a watchdog thread logs the stack of the
+    loop thread whenever the heartbeat is late by more than the threshold, i.e.
+    the code that is blocking the loop, captured while it blocks.
+    """
+
+    def __init__(self, interval: float = 0.5, block_threshold: Optional[float] = None):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        # Beat at least twice per threshold so a block is noticed promptly
+        self._beat_interval = min(interval, block_threshold / 2) if block_threshold else interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._expected = 0.0
+        self._last_beat = 0.0
+        self._beats = 0
+        self._next_observe = 0.0
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start monitoring the running loop (call from the loop)"""
+        if self._handle is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        now = time.perf_counter()
+        self._last_beat = now
+        self._next_observe = now + self.interval
+        self._expected = now + self._beat_interval
+        self._handle = self._loop.call_later(self._beat_interval, self._tick)
+
+        if self.block_threshold:
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name='loop-block-watchdog', daemon=True)
+            self._watchdog.start()
+            logger.info(f"Event loop block detection enabled (threshold {self.block_threshold * 1000:.0f}ms)")
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._watchdog is not None:
+            self._stop.set()
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    def _tick(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self._expected)
+        # In debug mode beats are more frequent than observations; a late beat is always recorded
+        if now >= self._next_observe or lag >= self.interval:
+            EVENT_LOOP_LAG.observe(lag)
+            self._next_observe = now + self.interval
+        self._last_beat = now
+        self._beats += 1
+        self._expected = now + self._beat_interval
+        self._handle = self._loop.call_later(self._beat_interval, self._tick)
+
+    def _watch(self):
+        reported_beat = -1
+        while not self._stop.wait(self.block_threshold / 4):
+            beat = self._beats
+            blocked_for = time.perf_counter() - self._last_beat - self._beat_interval
+            if blocked_for < self.block_threshold or beat == reported_beat:
+                continue
+            # Report each stall once, with the loop thread's stack at this moment
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = list(_walk_stack(frame)) if frame is not None else []
+            EVENT_LOOP_BLOCKS.inc()
+            logger.warning(
+                f"Event loop blocked for at least {blocked_for * 1000:.0f}ms",
+                extra={
+                    'duration_ms': round(blocked_for * 1000, 2),
+                    'threshold_ms': self.block_threshold * 1000,
+                    'stack': stack,
+                }
+            )
+
+
+# Most recent slow-request captures, newest last
+slow_request_captures: Deque[Dict[str, Any]] = deque(maxlen=50)
+
+sampling_profiler = SamplingProfiler()
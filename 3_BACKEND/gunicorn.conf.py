@@ -0,0 +1,37 @@
+"""
+Gunicorn configuration for production deployments
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Prometheus metrics are aggregated across workers when PROMETHEUS_MULTIPROC_DIR
+is set. It must be set in the environment before gunicorn starts so every
+worker imports prometheus_client in multiprocess mode.
+"""
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+worker_class = 'uvicorn.workers.UvicornWorker'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    """Start from an empty metrics directory so values from a previous run are not reported"""
+    multiproc_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if not multiproc_dir:
+        return
+    if os.path.isdir(multiproc_dir):
+        shutil.rmtree(multiproc_dir)
+    os.makedirs(multiproc_dir, exist_ok=True)
+    server.log.info('Prometheus multiprocess metrics in %s', multiproc_dir)
+
+
+def child_exit(server, worker):
+    """Drop live gauges (active connections, error rate, ...) owned by a dead worker"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,142 @@
+"""
+Benchmark of rupee candidate extraction over captured pages.
+
+Compares, per page:
+  - legacy:     the previous three-pattern implementation (three finditer
+                passes, patterns compiled from literals, Python-side dedup)
+  - str:        extract_rupee_candidates on the decoded page
+  - bytes:      extract_rupee_candidates on the raw UTF-8 body (no decode)
+
+Pages are read from the paths given on the command line (files or
+directories of .html/.htm files) or, by default, from the adapter page cache
+(PAGE_CACHE_DIR), which holds the bodies of real fetched pages. When neither
+has any pages, synthetic product/search pages are generated so the script
+still runs.
+
+Also reports how often the price picked from the candidates
+(pick_price_from_candidates) agrees with the legacy implementation.
+
+Usage: python scripts/bench_rupee_extract.py [paths...] [--repeat N]
+"""
+import os, re, sys, glob, time, zlib, random, argparse
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(ROOT, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.adapters.common import extract_rupee_candidates, pick_price_from_candidates
+from app.adapters.page_cache import PAGE_CACHE_DIR
+
+
+def legacy_extract_rupee_candidates(text):
+    if not text:
+        return []
+    patterns = [
+        r"[₹Rs\.]\s*([0-9]{1,3}(?:[, ]?[0-9]{2,3})+(?:\.[0-9]{1,2})?)",
+        r"₹\s*([0-9][0-9,]*\.?[0-9]*)",
+        r"Rs\.?\s*([0-9][0-9,]*\.?[0-9]*)",
+    ]
+    vals = []
+    for pat in patterns:
+        for m in re.finditer(pat, text):
+            try:
+                vals.append(float(m.group(1).replace(',', '').replace(' ', '')))
+            except Exception:
+                continue
+    uniq = []
+    seen = set()
+    for v in vals:
+        if v not in seen:
+            seen.add(v)
+            uniq.append(v)
+    return [v for v in uniq if 50 <= v <= 2000000]
+
+
+def load_pages(paths):
+    pages = []
+    for path in paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = glob.glob(os.path.join(path, '**', '*.htm*'), recursive=True)
+        for name in files:
+            with open(name, 'rb') as f:
+                pages.append((os.path.basename(name), f.read()))
+    return pages
+
+
+def load_page_cache(directory):
+    pages = []
+    for name in glob.glob(os.path.join(directory, '*.body')):
+        try:
+            with open(name, 'rb') as f:
+                pages.append((os.path.basename(name), zlib.decompress(f.read())))
+        except (OSError, zlib.error):
+            continue
+    return pages
+
+
+def synthetic_pages(count=12):
+    rng = random.Random(42)
+    pages = []
+    for i in range(count):
+        blocks = []
+        for j in range(rng.randint(800, 4000)):
+            price = rng.randint(99, 99999)
+            notation = rng.choice(['₹{:,}', 'Rs. {:,}', '₹ {}', 'Rs {}.00', '{} items'])
+            blocks.append(
+                f'<div class="card c{j}"><a href="/p/{rng.randint(1, 10**6)}">Item {j}</a>'
+                f'<span class="price">{notation.format(price)}</span><p>{"lorem ipsum " * rng.randint(1, 8)}</p></div>'
+            )
+        html = f'<html><head><title>Page {i}</title></head><body>{"".join(blocks)}</body></html>'
+        pages.append((f'synthetic-{i}', html.encode('utf-8')))
+    return pages
+
+
+def timed(func, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(arg)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('paths', nargs='*')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.paths:
+        pages, source = load_pages(args.paths), 'given paths'
+    else:
+        pages, source = load_page_cache(PAGE_CACHE_DIR), f'page cache ({PAGE_CACHE_DIR})'
+    if not pages:
+        pages, source = synthetic_pages(), 'synthetic pages'
+
+    totals = {'legacy': 0.0, 'str': 0.0, 'bytes': 0.0}
+    agree = agree_bytes = 0
+    total_bytes = 0
+    for name, body in pages:
+        text = body.decode('utf-8', errors='replace')
+        total_bytes += len(body)
+        legacy_time, legacy = timed(legacy_extract_rupee_candidates, text, args.repeat)
+        str_time, new = timed(extract_rupee_candidates, text, args.repeat)
+        bytes_time, new_bytes = timed(extract_rupee_candidates, body, args.repeat)
+        totals['legacy'] += legacy_time
+        totals['str'] += str_time
+        totals['bytes'] += bytes_time
+        legacy_pick = pick_price_from_candidates(legacy)
+        agree += pick_price_from_candidates(new) == legacy_pick
+        agree_bytes += pick_price_from_candidates(new_bytes) == legacy_pick
+
+    print(f"{len(pages)} pages from {source}, {total_bytes / 1024 / 1024:.1f} MB, {args.repeat} runs each")
+    print(f"{'variant':<10}{'ms/page':>10}{'MB/s':>10}{'speedup':>10}")
+    for variant, seconds in totals.items():
+        per_page_ms = seconds / len(pages) * 1000
+        throughput = total_bytes / 1024 / 1024 / seconds if seconds else 0.0
+        print(f"{variant:<10}{per_page_ms:>10.2f}{throughput:>10.1f}{totals['legacy'] / seconds:>9.1f}x")
+    print(f"picked price agrees with legacy on {agree}/{len(pages)} pages (str), {agree_bytes}/{len(pages)} (bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The backend is not an installed package; make ``app`` importable for every test
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, '3_BACKEND'))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
@@ -0,0 +1,178 @@
+import json
+import base64
+import asyncio
+import contextlib
+
+from app.adapters import amazon, common, flipkart, myntra, snapdeal, tatacliq
+from app.adapters.common import read_capped, decode_body, extract_rupee_candidates, pick_price_from_candidates, extract_price_from_json, PriceKeyProfile, READ_CHUNK_BYTES
+from app.adapters.replay import ReplayResponse
+
+FILLER = ''.join(f'<div class="card"><a href="/p/{i}">Item {i}</a><p>{"lorem ipsum " * 8}</p></div>' for i in range(2000))
+
+
+def _json_ld(data):
+    return f'<script type="application/ld+json">{json.dumps(data)}</script>'
+
+
+def _response(body, content_type='text/html; charset=utf-8'):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return ReplayResponse({'method': 'GET', 'url': 'https://example.com', 'status': 200,
+                           'headers': {'Content-Type': content_type}, 'body_base64': base64.b64encode(body).decode()})
+
+
+def _read_and_parse(adapter, html):
+    resp = _response(html)
+
+    async def read():
+        return await read_capped(resp, stop_markers=adapter.STOP_MARKERS)
+
+    body = asyncio.run(read())
+    return len(body), adapter._parse_page(decode_body(resp, body))
+
+
+def test_item_list_json_ld_does_not_stop_read():
+    item_list = {'@context': 'https://schema.org', '@type': 'ItemList', 'itemListElement': [
+        {'@type': 'ListItem', 'position': 1, 'item': {'@type': 'Product', 'offers': {'@type': 'Offer', 'price': '999', 'priceCurrency': 'INR'}}}
+    ]}
+    html = f'<html><head>{_json_ld(item_list)}</head><body>{FILLER}<div class="_30jeq3">&#8377;1,999</div></body></html>'
+    read, parsed = _read_and_parse(flipkart, html)
+    assert read > READ_CHUNK_BYTES
+    assert parsed['price'] == 1999
+
+
+def test_priceless_offer_does_not_stop_read():
+    product = {'@type': 'Product', 'name': 'Watch', 'offers': {'@type': 'Offer', 'availability': 'https://schema.org/OutOfStock'}}
+    html = f'<html><head>{_json_ld(product)}</head><body>{FILLER}<span class="payBlkBig">2499</span></body></html>'
+    _, parsed = _read_and_parse(snapdeal, html)
+    assert parsed['price'] == 2499
+
+
+def test_non_inr_offer_does_not_stop_read():
+    product = {'@type': 'Product', 'offers': {'@type': 'Offer', 'price': '39.99', 'priceCurrency': 'USD'}}
+    html = f'<html><head>{_json_ld(product)}</head><body>{FILLER}<h3 class="ProductDescription__priceHolder">&#8377;3299</h3></body></html>'
+    _, parsed = _read_and_parse(tatacliq, html)
+    assert parsed['price'] == 3299
+
+
+def test_json_ld_price_stops_read_early():
+    product = {'@type': 'Product', 'offers': {'@type': 'Offer', 'price': '1499', 'priceCurrency': 'INR'}}
+    html = f'<html><head>{_json_ld(product)}</head><body>{FILLER}</body></html>'
+    read, parsed = _read_and_parse(flipkart, html)
+    assert read < len(html)
+    assert parsed == {'price': 1499.0, 'confidence': 0.9, 'source': 'json_ld'}
+
+
+def test_picked_price_uses_every_candidate_on_long_pages():
+    # 150 distinct prices, listed highest first as on a search page sorted by price
+    html = ''.join(f'<li><span>&#8377;{value:,}</span> <s>Rs. {value + 1000:,}</s></li>' for value in range(249, 99, -1))
+    cands = extract_rupee_candidates(html)
+    assert len(cands) == 300
+    assert extract_rupee_candidates(html.encode('utf-8')) == cands
+    # Median of the lower half of all 300 (100..249); the first 100 alone would give 225
+    assert pick_price_from_candidates(cands) == 175
+
+
+def test_read_capped_stops_at_max_bytes():
+    body = asyncio.run(read_capped(_response(FILLER), max_bytes=100000))
+    assert len(FILLER) > 200000
+    assert body == FILLER.encode('utf-8')[:100000]
+
+
+def test_stop_marker_split_across_chunks():
+    # The start marker straddles the first chunk boundary
+    head = 'x' * (READ_CHUNK_BYTES - 8)
+    html = f'{head}<span class="payBlkBig">2499</span>{FILLER}'
+    body = asyncio.run(read_capped(_response(html), stop_markers=snapdeal.STOP_MARKERS))
+    assert len(body) == 2 * READ_CHUNK_BYTES
+    assert b'<span class="payBlkBig">2499</span>' in body
+
+
+def test_decode_body_charset_fallback():
+    body = 'Café ₹1,499'.encode('utf-8')
+    assert decode_body(_response(body, 'text/html'), body) == 'Café ₹1,499'
+    assert decode_body(_response(body, 'text/html; charset=x-unknown'), body) == 'Café ₹1,499'
+    assert decode_body(_response('Caf\xe9'.encode('latin-1'), 'text/html; charset=iso-8859-1'), b'Caf\xe9') == 'Caf\xe9'
+
+
+def test_amazon_read_waits_for_a_price_offscreen():
+    html = (f'<html><body><span class="a-offscreen">4.5 out of 5 stars</span>{FILLER}'
+            f'<span class="a-price"><span class="a-offscreen">&#8377;1,299</span><span aria-hidden="true">1,299</span></span>'
+            f'{FILLER}</body></html>')
+    read, parsed = _read_and_parse(amazon, html)
+    assert read < len(html)
+    assert parsed == {'price': 1299.0, 'confidence': 0.9}
+
+
+class StreamOnlyResponse:
+    """An API response that can only be streamed, as read_capped does"""
+
+    status = 200
+    headers = {}
+    charset = None
+
+    def __init__(self, body):
+        self.content = _response(body).content
+
+
+class StreamOnlySession:
+    def __init__(self, body):
+        self.body = body
+
+    @contextlib.asynccontextmanager
+    async def get(self, url, **kwargs):
+        yield StreamOnlyResponse(self.body)
+
+
+def test_api_bodies_are_read_capped(monkeypatch):
+    monkeypatch.setattr(common, 'request_scheduler', common.RequestScheduler(host_rate=0, host_limits={}, jitter=0))
+    monkeypatch.setenv('AMAZON_RAPIDAPI_KEY', 'key')
+    monkeypatch.setenv('AMAZON_RAPIDAPI_HOST', 'amazon.example.com')
+    monkeypatch.setenv('WEBSCRAPINGAPI_ECOM_API_KEY', 'key')
+    product = {'product_id': 'p1', 'name': 'Airdopes', 'brand': 'boAt'}
+
+    rapid = asyncio.run(amazon._fetch_via_rapidapi(StreamOnlySession(json.dumps({'data': {'price': 1299}})), product))
+    assert rapid['price'] == 1299
+    scraped = asyncio.run(amazon._fetch_via_webscrapingapi(StreamOnlySession('Price: 1,499 INR'), product))
+    assert scraped['price'] == 1499
+
+
+def _nested(levels, leaf):
+    node = leaf
+    for _ in range(levels):
+        node = {'data': node}
+    return node
+
+
+def test_json_price_walk_handles_deep_nesting():
+    # Far past the recursion limit; only the depth cap decides what is read
+    assert extract_price_from_json(_nested(5000, {'price': 1499}), amazon.PRICE_KEYS, max_depth=10000) == 1499.0
+    assert extract_price_from_json(_nested(3, {'price': 1499}), amazon.PRICE_KEYS, max_depth=3) == 1499.0
+    assert extract_price_from_json(_nested(4, {'price': 1499}), amazon.PRICE_KEYS, max_depth=3) is None
+
+
+def test_json_price_walk_stops_at_node_cap():
+    # The price sits in the fourth container
+    data = _nested(3, {'price': 1499})
+    assert extract_price_from_json(data, amazon.PRICE_KEYS, max_nodes=4) == 1499.0
+    assert extract_price_from_json(data, amazon.PRICE_KEYS, max_nodes=3) is None
+
+
+def test_json_price_key_matching():
+    # Keys match on any contained term, in any case; other keys and flags are ignored
+    data = {'SalePrice': '₹1,299.00', 'rating': 4.5, 'price_visible': True, 'mrp': 1999}
+    assert extract_price_from_json(data, amazon.PRICE_KEYS) == 1299.0
+    # Profiles are per adapter: Myntra's counts its MRP
+    assert extract_price_from_json(data, myntra.PRICE_KEYS) == 1999.0
+    # A price object's value wins over its amount
+    assert extract_price_from_json({'offer': {'price': {'value': 899, 'amount': 999}}}, PriceKeyProfile('price')) == 899.0
+    # Several matches give their upper median
+    assert extract_price_from_json({'items': [{'price': p} for p in (400, 100, 300, 200)]}, flipkart.PRICE_KEYS) == 300.0
+    assert extract_price_from_json({'title': 'Headphones'}, flipkart.PRICE_KEYS) is None
+
+
+def test_price_key_memo_is_bounded(monkeypatch):
+    monkeypatch.setattr(PriceKeyProfile, 'MAX_MEMO', 2)
+    profile = PriceKeyProfile('price')
+    assert [profile.matches(key) for key in ('price', 'name', 'Price', 'id')] == [True, False, True, False]
+    assert profile._memo == {'price': True, 'name': False}
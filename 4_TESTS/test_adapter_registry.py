@@ -0,0 +1,65 @@
+import pytest
+
+from app.adapters import registry
+from app.adapters.registry import AdapterRegistry, AdapterSpec, BUILTIN_ADAPTERS, FASHION_CATEGORIES, FASHION_EXCLUDED_CATEGORIES
+
+
+def _registry():
+    return AdapterRegistry([
+        AdapterSpec('amazon', 'app.adapters.amazon'),
+        AdapterSpec('myntra', 'app.adapters.myntra', categories=FASHION_CATEGORIES, excluded_categories=FASHION_EXCLUDED_CATEGORIES),
+    ])
+
+
+@pytest.mark.parametrize('category', ['Laptops', 'Desktop Computers', 'Smartwatch', 'Smartwatches', 'Smart Watch', 'Kids Smart Watches', 'Fitness Bands', 'GPS Watch', 'Wearable Watches', 'Mobiles'])
+def test_electronics_skip_fashion_adapters(category):
+    routed = _registry().route({'product_id': 'p1', 'category': category, 'urls': {}})
+    assert [spec.name for spec in routed] == ['amazon']
+
+
+@pytest.mark.parametrize('category', ['Women Tops', 'Men T-Shirts', 'Dresses', 'Watches', 'Analog Watch', 'Accessories', 'Jewellery', 'Handbags'])
+def test_fashion_categories_route_to_fashion_adapters(category):
+    routed = _registry().route({'product_id': 'p1', 'category': category, 'urls': {}})
+    assert [spec.name for spec in routed] == ['amazon', 'myntra']
+
+
+def test_builtin_fashion_adapters_exclude_smart_watches():
+    fashion = [spec for spec in BUILTIN_ADAPTERS if spec.categories is not None]
+    assert sorted(spec.name for spec in fashion) == ['ajio', 'myntra']
+    assert not any(spec.supports_category('Smart Watch') for spec in fashion)
+    assert all(spec.supports_category('Men Watches') for spec in fashion)
+
+
+@pytest.fixture
+def no_api_keys(monkeypatch):
+    for var in ('MYNTRA_RAPIDAPI_KEY', 'MYNTRA_RAPIDAPI_HOST'):
+        monkeypatch.delenv(var, raising=False)
+
+
+def _search_registry():
+    return AdapterRegistry([
+        AdapterSpec('amazon', 'app.adapters.amazon'),
+        AdapterSpec('myntra', 'app.adapters.myntra', api_keys=[('MYNTRA_RAPIDAPI_KEY', 'MYNTRA_RAPIDAPI_HOST')]),
+    ])
+
+
+def test_search_only_adapters_skipped_by_default(monkeypatch, no_api_keys):
+    monkeypatch.setattr(registry, 'ADAPTER_SEARCH_WITHOUT_URL', False)
+    reg = _search_registry()
+
+    # Another retailer's URL is known: a name search would not beat it
+    with_url = {'product_id': 'p1', 'urls': {'amazon': 'https://www.amazon.in/dp/B0TEST'}}
+    assert [spec.name for spec in reg.route(with_url)] == ['amazon']
+    assert reg._skip_reason(reg.get('myntra'), with_url, with_url['urls']) == 'search_only'
+    # Without any URL, searching is all there is
+    assert [spec.name for spec in reg.route({'product_id': 'p1', 'urls': {}})] == ['amazon', 'myntra']
+    # An API key makes the search worthwhile again
+    monkeypatch.setenv('MYNTRA_RAPIDAPI_KEY', 'key')
+    monkeypatch.setenv('MYNTRA_RAPIDAPI_HOST', 'host')
+    assert [spec.name for spec in reg.route(with_url)] == ['amazon', 'myntra']
+
+
+def test_search_without_url_routes_search_only_adapters(monkeypatch, no_api_keys):
+    monkeypatch.setattr(registry, 'ADAPTER_SEARCH_WITHOUT_URL', True)
+    with_url = {'product_id': 'p1', 'urls': {'amazon': 'https://www.amazon.in/dp/B0TEST'}}
+    assert [spec.name for spec in _search_registry().route(with_url)] == ['amazon', 'myntra']
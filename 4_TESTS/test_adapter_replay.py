@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import asyncio
+import contextlib
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, '3_BACKEND', 'scripts'))
+
+from app.adapters import adapter_registry
+from app.adapters.replay import Cassette, CassetteMiss, RecordingSession, ReplaySession, replay_environment
+from bench_adapters import CASSETTE_DIR, find_regressions, is_accurate
+
+CASSETTES = Cassette.load_dir(CASSETTE_DIR)
+
+
+class StubResponse:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+
+class StubSession:
+    def __init__(self, body):
+        self.body = body
+        self.requests = []
+
+    @contextlib.asynccontextmanager
+    async def get(self, url, params=None, **kwargs):
+        self.requests.append((url, params))
+        yield StubResponse(200, {'Content-Type': 'application/json; charset=utf-8', 'X-Other': '1'}, self.body)
+
+
+async def _replay(cassette):
+    session = ReplaySession(cassette)
+    with replay_environment(cassette.env):
+        result = await adapter_registry.get(cassette.adapter).load().fetch(session, cassette.product)
+    return result, session.misses
+
+
+@pytest.mark.parametrize('cassette', CASSETTES, ids=[c.name for c in CASSETTES])
+def test_cassette_replays_to_expected_price(cassette):
+    result, misses = asyncio.run(_replay(cassette))
+    assert misses == []
+    assert is_accurate(result, cassette.expected_price, 0.01)
+
+
+def test_recording_round_trip_drops_secrets():
+    body = json.dumps({'results': [{'price': 1299}]}).encode('utf-8')
+    cassette = Cassette('t', 'amazon', {})
+
+    async def record_and_replay():
+        recorder = RecordingSession(StubSession(body), cassette)
+        async with recorder.get('https://api.example.com/v1', params={'q': 'boat', 'api_key': 'secret'}) as resp:
+            recorded = await resp.json(content_type=None)
+        async with ReplaySession(cassette).get('https://api.example.com/v1?q=boat', params={'api_key': 'other'}) as resp:
+            chunks = [chunk async for chunk in resp.content.iter_chunked(4)]
+            return recorded, resp.charset, b''.join(chunks)
+
+    recorded, charset, replayed = asyncio.run(record_and_replay())
+    assert recorded == {'results': [{'price': 1299}]}
+    assert charset == 'utf-8'
+    assert replayed == body
+    assert 'secret' not in json.dumps(cassette.interactions)
+    assert cassette.interactions[0]['headers'] == {'Content-Type': 'application/json; charset=utf-8'}
+
+
+def test_replay_miss_raises():
+    session = ReplaySession(Cassette('t', 'amazon', {}))
+
+    async def get():
+        async with session.get('https://www.amazon.in/dp/B0'):
+            pass
+
+    with pytest.raises(CassetteMiss):
+        asyncio.run(get())
+    assert session.misses == ['GET https://www.amazon.in/dp/B0']
+
+
+def test_replay_environment_restores_api_keys(monkeypatch):
+    monkeypatch.setenv('FLIPKART_RAPIDAPI_KEY', 'live')
+    with replay_environment({'AMAZON_RAPIDAPI_KEY': 'replay'}):
+        assert 'FLIPKART_RAPIDAPI_KEY' not in os.environ
+        assert os.environ['AMAZON_RAPIDAPI_KEY'] == 'replay'
+    assert os.environ['FLIPKART_RAPIDAPI_KEY'] == 'live'
+    assert 'AMAZON_RAPIDAPI_KEY' not in os.environ
+
+
+def test_find_regressions():
+    baseline = {
+        'flipkart': {'cassettes': 3, 'accuracy': 1.0, 'cost': 0.5, 'peak_kb': 1000.0},
+        'ajio': {'cassettes': 1, 'accuracy': 1.0, 'cost': 0.04, 'peak_kb': 300.0},
+    }
+    results = {
+        'flipkart': {'cassettes': 3, 'accuracy': 0.6667, 'cost': 0.7, 'peak_kb': 1300.0},
+        # +50% but below the noise floor
+        'ajio': {'cassettes': 1, 'accuracy': 1.0, 'cost': 0.06, 'peak_kb': 300.0},
+    }
+    regressions = find_regressions(results, baseline)
+    assert len(regressions) == 3
+    assert all(r.startswith('flipkart:') for r in regressions)
+    assert find_regressions(baseline, baseline) == []
+    assert find_regressions({}, baseline)[0].startswith('ajio: no cassettes')
@@ -0,0 +1,161 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.auth import jwt_handler, password
+from app.auth.jwt_handler import create_access_token, principal_claims, get_current_user, get_current_active_user
+from app.database import Base, get_db
+from app.models.user import User, UserRole
+from app.routes import auth_routes
+
+
+class CountingSessions:
+    def __init__(self, factory):
+        self.factory = factory
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        return self.factory()
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[User.__table__])
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(User(username='alice', email='alice@example.com', hashed_password='x', role=UserRole.USER))
+        db.commit()
+    counting = CountingSessions(factory)
+    monkeypatch.setattr(jwt_handler, 'SessionLocal', counting)
+    jwt_handler.invalidate_principal()
+    yield counting
+    jwt_handler.invalidate_principal()
+
+
+def _current(token):
+    credentials = HTTPAuthorizationCredentials(scheme='Bearer', credentials=token)
+    return asyncio.run(get_current_user(credentials))
+
+
+def _change_alice(sessions, change):
+    with sessions.factory() as db:
+        user = db.query(User).filter(User.username == 'alice').one()
+        change(db, user)
+        db.commit()
+
+
+def test_principal_is_served_from_cache(sessions):
+    token = create_access_token({'sub': 'alice'})
+    first, second = _current(token), _current(token)
+    assert sessions.opened == 1
+    assert first.username == second.username == 'alice'
+    assert second.created_at is not None
+
+
+def test_role_change_invalidates_cached_principal(sessions):
+    token = create_access_token({'sub': 'alice'})
+    assert _current(token).role == UserRole.USER
+    _change_alice(sessions, lambda db, user: setattr(user, 'role', UserRole.ADMIN))
+    assert _current(token).role == UserRole.ADMIN
+
+
+def test_deactivation_invalidates_cached_principal(sessions):
+    token = create_access_token({'sub': 'alice'})
+    assert asyncio.run(get_current_active_user(_current(token))).is_active
+    _change_alice(sessions, lambda db, user: setattr(user, 'is_active', False))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(get_current_active_user(_current(token)))
+    assert exc.value.status_code == 403
+
+
+@pytest.mark.parametrize('expire_old_name', [False, True], ids=['loaded', 'expired'])
+def test_rename_invalidates_old_username(sessions, expire_old_name):
+    token = create_access_token({'sub': 'alice'})
+    _current(token)
+
+    def rename(db, user):
+        if expire_old_name:
+            db.expire(user, ['username'])
+        user.username = 'alicia'
+
+    _change_alice(sessions, rename)
+    with pytest.raises(HTTPException) as exc:
+        _current(token)
+    assert exc.value.status_code == 401
+    assert _current(create_access_token({'sub': 'alicia'})).username == 'alicia'
+
+
+def test_delete_invalidates_cached_principal(sessions):
+    token = create_access_token({'sub': 'alice'})
+    _current(token)
+    _change_alice(sessions, lambda db, user: db.delete(user))
+    with pytest.raises(HTTPException) as exc:
+        _current(token)
+    assert exc.value.status_code == 401
+
+
+def test_trusted_claims_skip_the_database(sessions, monkeypatch):
+    monkeypatch.setattr(jwt_handler, 'JWT_TRUST_CLAIMS', True)
+    with sessions.factory() as db:
+        alice = db.query(User).one()
+        token = create_access_token(principal_claims(alice))
+    opened = sessions.opened
+
+    user = _current(token)
+    assert sessions.opened == opened
+    assert (user.id, user.username, user.role, user.is_active) == (alice.id, 'alice', UserRole.USER, True)
+    assert user.to_dict()['created_at'] == alice.to_dict()['created_at']
+
+    # Tokens without the claims still resolve through the database
+    assert _current(create_access_token({'sub': 'alice'})).created_at == alice.created_at
+    assert sessions.opened == opened + 1
+
+
+def _auth_client(sessions):
+    app = FastAPI()
+    app.include_router(auth_routes.router)
+
+    def db():
+        with sessions.factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = db
+    return TestClient(app)
+
+
+def _set_password(sessions, context, plain):
+    _change_alice(sessions, lambda db, user: setattr(user, 'hashed_password', context.hash(plain)))
+
+
+def test_hashing_runs_on_the_bcrypt_pool():
+    name = asyncio.run(password._run_in_pool('hash', lambda: threading.current_thread().name))
+    assert name.startswith('bcrypt')
+
+
+def test_login_rehashes_legacy_rounds(sessions, monkeypatch):
+    monkeypatch.setattr(password, 'pwd_context', CryptContext(schemes=['bcrypt'], deprecated='auto', bcrypt__rounds=5))
+    _set_password(sessions, CryptContext(schemes=['bcrypt'], bcrypt__rounds=4), 'correct horse')
+
+    resp = _auth_client(sessions).post('/api/auth/login', json={'username': 'alice', 'password': 'correct horse'})
+    assert resp.status_code == 200
+    with sessions.factory() as db:
+        stored = db.query(User).one().hashed_password
+    assert stored.startswith('$2b$05$')
+    assert password.pwd_context.verify('correct horse', stored)
+
+
+def test_login_is_rejected_when_hasher_is_busy(sessions, monkeypatch):
+    monkeypatch.setattr(password, '_pending', password.HASH_MAX_PENDING)
+    resp = _auth_client(sessions).post('/api/auth/login', json={'username': 'alice', 'password': 'correct horse'})
+    assert resp.status_code == 503
+    assert resp.headers['retry-after'] == '1'
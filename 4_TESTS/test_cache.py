@@ -0,0 +1,106 @@
+import asyncio
+import datetime
+
+from app.utils import cache
+from app.utils.cache import CacheManager, MemoryCache, cached, make_cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_cache_expires_entries_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    memory = MemoryCache()
+    memory.set('price', b'1499', ttl=10)
+
+    clock.now += 9
+    assert memory.get('price') == b'1499'
+    clock.now += 1
+    assert memory.get('price') is None
+    assert memory.stats()['expirations'] == 1
+
+
+def test_memory_cache_sweeps_expired_entries(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    memory = MemoryCache(sweep_interval=60)
+    memory.set('short', b'1', ttl=5)
+    memory.set('long', b'2', ttl=300)
+
+    clock.now += 61
+    memory.set('new', b'3', ttl=300)
+    assert memory.stats()['entries'] == 2
+    assert memory.get('long') == b'2'
+
+
+def test_memory_cache_evicts_least_recently_used():
+    memory = MemoryCache(max_entries=2)
+    memory.set('a', b'1', ttl=60)
+    memory.set('b', b'2', ttl=60)
+    memory.get('a')
+    memory.set('c', b'3', ttl=60)
+
+    assert memory.get('b') is None
+    assert memory.get('a') == b'1'
+    assert memory.get('c') == b'3'
+    assert memory.stats()['evictions'] == 1
+
+
+def test_memory_cache_evicts_to_byte_budget():
+    memory = MemoryCache(max_bytes=10)
+    memory.set('a', b'12345', ttl=60)
+    memory.set('b', b'12345', ttl=60)
+    memory.set('c', b'123', ttl=60)
+
+    assert memory.get('a') is None
+    assert memory.stats()['bytes'] == 8
+    assert not memory.set('huge', b'x' * 11, ttl=60)
+
+
+def test_cache_key_is_stable_and_typed():
+    day = datetime.date(2026, 1, 1)
+    key = make_cache_key('p', (1, day), {'a': 1, 'b': [1, 2]})
+    assert key == make_cache_key('p', (1, day), {'b': [1, 2], 'a': 1})
+    assert key != make_cache_key('p', (1.0, day), {'a': 1, 'b': [1, 2]})
+    assert key != make_cache_key('p', ('1', day), {'a': 1, 'b': [1, 2]})
+    assert make_cache_key('p', ({1, 2},), {}) == make_cache_key('p', ({2, 1},), {})
+
+
+def test_cached_shares_one_inflight_computation(monkeypatch):
+    monkeypatch.setattr(cache, 'cache_manager', CacheManager())
+    calls = []
+
+    @cached(ttl=60)
+    async def price(product_id):
+        calls.append(product_id)
+        await asyncio.sleep(0.01)
+        return {'price': 1499}
+
+    async def run():
+        concurrent = await asyncio.gather(*(price('p1') for _ in range(5)))
+        return concurrent, await price('p1'), await price('p1', bypass_cache=True)
+
+    concurrent, hit, refreshed = asyncio.run(run())
+    assert concurrent == [{'price': 1499}] * 5
+    assert hit == refreshed == {'price': 1499}
+    assert calls == ['p1', 'p1']
+
+
+def test_cached_skips_uncacheable_arguments(monkeypatch):
+    monkeypatch.setattr(cache, 'cache_manager', CacheManager())
+    calls = []
+
+    @cached(ttl=60)
+    def describe(obj):
+        calls.append(obj)
+        return 'ok'
+
+    marker = object()
+    assert describe(marker) == describe(marker) == 'ok'
+    assert len(calls) == 2
@@ -0,0 +1,165 @@
+import os
+import sys
+import asyncio
+import contextlib
+import subprocess
+
+import pytest
+
+from app.adapters import common
+from app.adapters import circuit_breaker
+from app.adapters.circuit_breaker import adapter_breakers, CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from app.ai import fetcher
+
+
+class StubSession:
+    def __init__(self, status):
+        self.status = status
+
+    @contextlib.asynccontextmanager
+    async def get(self, url, **kwargs):
+        yield type('Resp', (), {'status': self.status, 'headers': {}})()
+
+
+class PageAdapter:
+    """Requests one page and, like the real adapters, returns None when it finds no price"""
+
+    @staticmethod
+    async def fetch(session, product):
+        async with common.scheduled_get(session, 'https://shop.example.com/p/1'):
+            return None
+
+
+@pytest.fixture
+def unthrottled(monkeypatch):
+    monkeypatch.setattr(common, 'request_scheduler', common.RequestScheduler(host_rate=0, host_limits={}, jitter=0))
+
+
+def _run_fetches(name, session, count=12):
+    async def run():
+        for _ in range(count):
+            await fetcher._timed_fetch(name, PageAdapter, session, {'product_id': 'p1'})
+    asyncio.run(run())
+    return adapter_breakers.get(name)
+
+
+def test_empty_results_keep_breaker_closed(unthrottled):
+    breaker = _run_fetches('stub_empty', StubSession(200))
+    assert breaker.state == CLOSED
+    assert breaker.failure_rate() == 0.0
+
+
+def test_refused_requests_open_breaker(unthrottled):
+    breaker = _run_fetches('stub_blocked', StubSession(403))
+    assert breaker.state == OPEN
+
+
+def test_app_import_does_not_load_html_parser(tmp_path):
+    # In a fresh interpreter (other tests load the adapters), away from the repo's logs/
+    backend = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, '3_BACKEND')
+    code = "import sys, app.main; print(sorted(m for m in ('bs4', 'lxml') if m in sys.modules))"
+    out = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env={**os.environ, 'PYTHONPATH': backend},
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == '[]'
+
+
+def test_breaker_opens_probes_and_recovers(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', lambda: now[0])
+    breaker = CircuitBreaker('stub_cycle', min_calls=4, consecutive_failure_threshold=10, cooldown=30)
+
+    for succeeded in (True, False, True, False):
+        breaker.record(succeeded, 0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # A single probe at a time
+    assert not breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    assert breaker.cooldown == 60
+
+    now[0] += 59
+    assert not breaker.allow()
+    now[0] += 1
+    assert breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.cooldown == 30
+    assert breaker.failure_rate() == 0.0
+
+
+def test_breaker_opens_on_consecutive_failures():
+    breaker = CircuitBreaker('stub_consecutive', min_calls=100, consecutive_failure_threshold=3)
+    for _ in range(2):
+        breaker.record(False, 0.1)
+    breaker.record(True, 0.1)
+    for _ in range(2):
+        breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+
+
+def test_scraped_structured_prices_are_not_high_confidence():
+    for confidence in (common.JSON_LD_CONFIDENCE, common.EMBEDDED_STATE_CONFIDENCE):
+        assert not fetcher._is_high_confidence({'price': 1499, 'confidence': confidence})
+
+
+async def _answer(delay, price, confidence):
+    await asyncio.sleep(delay)
+    return {'adapter': f'a{delay}', 'price': price, 'confidence': confidence}
+
+
+def test_collect_stops_at_quorum_of_high_confidence_results():
+    async def run():
+        pending = {asyncio.ensure_future(_answer(delay, 100, conf)) for delay, conf in ((0.01, 0.95), (0.02, 0.5), (0.03, 0.95), (1, 0.95))}
+        results, still_running = await fetcher._collect(pending, quorum=2, soft_deadline=5)
+        for task in still_running:
+            task.cancel()
+        return results, still_running
+
+    results, still_running = asyncio.run(run())
+    assert [r['adapter'] for r in results] == ['a0.01', 'a0.02', 'a0.03']
+    assert len(still_running) == 1
+
+
+def test_collect_settles_for_one_high_confidence_result_after_deadline():
+    async def run():
+        pending = {asyncio.ensure_future(_answer(delay, 100, 0.95)) for delay in (0.01, 1)}
+        pending.add(asyncio.ensure_future(_answer(0.02, None, 0.95)))
+        results, still_running = await fetcher._collect(pending, quorum=2, soft_deadline=0.05)
+        for task in still_running:
+            task.cancel()
+        return results, len(still_running)
+
+    results, still_running = asyncio.run(run())
+    # The price-less answer is kept but does not count towards the quorum
+    assert [r['adapter'] for r in results] == ['a0.01', 'a0.02']
+    assert still_running == 1
+
+
+def test_collect_waits_past_deadline_without_high_confidence_result():
+    async def run():
+        pending = {asyncio.ensure_future(_answer(delay, 100, 0.5)) for delay in (0.01, 0.1)}
+        return await fetcher._collect(pending, quorum=1, soft_deadline=0.02)
+
+    results, still_running = asyncio.run(run())
+    assert len(results) == 2
+    assert still_running == set()
+
+
+def test_collect_skips_failed_adapters():
+    async def fail():
+        raise RuntimeError('adapter down')
+
+    async def run():
+        pending = {asyncio.ensure_future(fail()), asyncio.ensure_future(_answer(0.01, 100, 0.95))}
+        return await fetcher._collect(pending, quorum=0, soft_deadline=0)
+
+    results, still_running = asyncio.run(run())
+    assert [r['adapter'] for r in results] == ['a0.01']
+    assert still_running == set()
@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import redis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from app import database
+from app.middleware.monitoring import HealthChecker
+from app.routes import health_route
+from app.utils import cache
+
+
+class ReachableRedis:
+    """Answers the two commands the Redis probe sends"""
+
+    def ping(self):
+        return True
+
+    def info(self):
+        return {'used_memory': 2 * 1024 * 1024, 'connected_clients': 3, 'uptime_in_seconds': 60}
+
+
+@pytest.fixture
+def checker(monkeypatch):
+    """A HealthChecker whose database and Redis are up and whose blockchain probe is stubbed"""
+    monkeypatch.setattr(database, 'engine', create_engine(
+        'sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool
+    ))
+    monkeypatch.setattr(cache, 'cache_manager', SimpleNamespace(redis_client=ReachableRedis()))
+    checker = HealthChecker(probe_timeout=1.0)
+
+    async def blockchain_up():
+        return {'status': 'healthy'}
+
+    monkeypatch.setattr(checker, 'check_blockchain_health', blockchain_up)
+    return checker
+
+
+def test_liveness_does_not_touch_dependencies(monkeypatch):
+    monkeypatch.setattr(database, 'engine', None)
+    app = FastAPI()
+    app.include_router(health_route.router)
+
+    response = TestClient(app).get('/api/health')
+    assert response.status_code == 200
+    assert response.json() == {'status': 'ok'}
+
+
+def test_ready_when_database_and_redis_answer(checker):
+    health = asyncio.run(checker.get_comprehensive_health())
+
+    assert health['status'] == 'healthy'
+    assert health['services']['database']['status'] == 'healthy'
+    assert health['services']['database']['type'] == 'sqlite'
+    assert health['services']['redis']['status'] == 'healthy'
+    assert health['services']['redis']['memory_usage_mb'] == 2.0
+
+
+def test_not_ready_when_database_is_down(checker, monkeypatch):
+    monkeypatch.setattr(database, 'engine', create_engine('sqlite:////nonexistent/valora/valora.db'))
+    health = asyncio.run(checker.get_comprehensive_health())
+
+    assert health['status'] == 'degraded'
+    assert health['services']['database']['status'] == 'unhealthy'
+    assert health['services']['database']['error']
+    assert health['services']['redis']['status'] == 'healthy'
+
+
+def test_not_ready_when_redis_is_down(checker, monkeypatch):
+    unreachable = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.2)
+    monkeypatch.setattr(cache, 'cache_manager', SimpleNamespace(redis_client=unreachable))
+    health = asyncio.run(checker.get_comprehensive_health())
+
+    assert health['status'] == 'degraded'
+    assert health['services']['redis']['status'] == 'unhealthy'
+
+
+def test_disabled_redis_does_not_degrade(checker, monkeypatch):
+    monkeypatch.setattr(cache, 'cache_manager', None)
+    health = asyncio.run(checker.get_comprehensive_health())
+
+    assert health['status'] == 'healthy'
+    assert health['services']['redis'] == {'status': 'disabled', 'backend': 'memory'}
+
+
+def test_health_is_served_from_the_latest_probe(checker, monkeypatch):
+    async def scenario():
+        await checker.refresh()
+        # Dependencies going down are only reported by the next probe
+        monkeypatch.setattr(cache, 'cache_manager', SimpleNamespace(redis_client=None))
+        monkeypatch.setattr(database, 'engine', None)
+        served = await checker.get_comprehensive_health()
+        refreshed = await checker.refresh()
+        return served, refreshed
+
+    served, refreshed = asyncio.run(scenario())
+    assert served['status'] == 'healthy'
+    assert refreshed['database']['status'] == 'unhealthy'
+    assert refreshed['redis']['status'] == 'disabled'
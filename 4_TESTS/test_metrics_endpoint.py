@@ -0,0 +1,47 @@
+import fakeredis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.caching import ResponseCachingMiddleware
+from app.middleware.monitoring import MetricsMiddleware, REQUEST_COUNT, UNMATCHED_ENDPOINT
+
+
+def _count(endpoint, status_code):
+    return REQUEST_COUNT.labels(method='GET', endpoint=endpoint, status_code=str(status_code), client_type='unknown')._value.get()
+
+
+def _app():
+    app = FastAPI()
+
+    @app.get('/api/things/{tid}')
+    async def thing(tid: str):
+        return {'tid': tid}
+
+    app.add_middleware(ResponseCachingMiddleware, redis_url='redis://127.0.0.1:1/0')
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+
+def test_cache_hits_are_labelled_with_the_route_template():
+    app = _app()
+    client = TestClient(app, headers={'User-Agent': 'pytest'})
+    client.get('/api/things/0')
+    node = app.middleware_stack
+    while not isinstance(node, ResponseCachingMiddleware):
+        node = node.app
+    node.redis = fakeredis.FakeRedis()
+
+    before = _count('/api/things/{tid}', 200)
+    unmatched = _count(UNMATCHED_ENDPOINT, 200)
+    for _ in range(3):
+        client.get('/api/things/1')
+    assert client.get('/api/things/1').headers['x-cache'] == 'HIT'
+    assert _count('/api/things/{tid}', 200) - before == 4
+    assert _count(UNMATCHED_ENDPOINT, 200) == unmatched
+
+
+def test_unknown_paths_stay_unmatched():
+    client = TestClient(_app(), headers={'User-Agent': 'pytest'})
+    before = _count(UNMATCHED_ENDPOINT, 404)
+    client.get('/nope/1')
+    assert _count(UNMATCHED_ENDPOINT, 404) - before == 1
@@ -0,0 +1,123 @@
+import os
+import asyncio
+import contextlib
+
+import pytest
+
+from app.adapters import common, page_cache
+from app.adapters.page_cache import PageCache
+from app.adapters.replay import ReplayResponse
+
+URL = 'https://shop.example.com/p/1'
+PAGE = '<html><span class="price">&#8377;1,499</span></html>'
+
+
+class ScriptedSession:
+    """Serves (status, headers, body) responses in order and records the request headers"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    @contextlib.asynccontextmanager
+    async def get(self, url, headers=None, **kwargs):
+        self.sent.append(headers or {})
+        status, response_headers, body = self.responses.pop(0)
+        yield ReplayResponse({'method': 'GET', 'url': url, 'status': status,
+                              'headers': {'Content-Type': 'text/html; charset=utf-8', **response_headers}, 'body': body})
+
+
+class CountingParser:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        return {'price': 1499, 'length': len(text)}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    store = PageCache(str(tmp_path))
+    monkeypatch.setattr(common, 'page_cache', store)
+    monkeypatch.setattr(common, 'request_scheduler', common.RequestScheduler(host_rate=0, host_limits={}, jitter=0))
+    return store
+
+
+def _fetch(session, parse):
+    return asyncio.run(common.http_get_parsed(session, URL, parse))
+
+
+def test_not_modified_reuses_parsed_value(cache):
+    parse = CountingParser()
+    session = ScriptedSession((200, {'ETag': '"v1"'}, PAGE), (304, {}, ''))
+    first, second = _fetch(session, parse), _fetch(session, parse)
+    assert first == second == {'price': 1499, 'length': len(PAGE)}
+    assert parse.calls == 1
+    assert 'If-None-Match' not in session.sent[0]
+    assert session.sent[1]['If-None-Match'] == '"v1"'
+
+
+def test_unchanged_body_stores_new_validators(cache):
+    parse = CountingParser()
+    session = ScriptedSession(
+        (200, {'ETag': '"v1"'}, PAGE),
+        (200, {'ETag': '"v2"', 'Last-Modified': 'Mon, 19 Oct 2026 09:00:00 GMT'}, PAGE),
+        (304, {}, ''),
+    )
+    for _ in range(3):
+        assert _fetch(session, parse)['price'] == 1499
+    assert parse.calls == 1
+    assert session.sent[2]['If-None-Match'] == '"v2"'
+    assert session.sent[2]['If-Modified-Since'] == 'Mon, 19 Oct 2026 09:00:00 GMT'
+    assert cache.get(URL)['etag'] == '"v2"'
+
+
+def test_changed_body_is_parsed_again(cache):
+    parse = CountingParser()
+    session = ScriptedSession((200, {'ETag': '"v1"'}, PAGE), (200, {'ETag': '"v2"'}, PAGE + '<p>new</p>'))
+    _fetch(session, parse)
+    assert _fetch(session, parse)['length'] == len(PAGE) + len('<p>new</p>')
+    assert parse.calls == 2
+
+
+def test_new_run_reparses_the_stored_page(cache, monkeypatch):
+    parse = CountingParser()
+    session = ScriptedSession((200, {'ETag': '"v1"'}, PAGE), (304, {}, ''), (304, {}, ''))
+    _fetch(session, parse)
+    monkeypatch.setattr(common, '_PARSE_RUN', 'next-deploy')
+    assert _fetch(session, parse)['price'] == 1499
+    assert _fetch(session, parse)['price'] == 1499
+    assert parse.calls == 2
+
+
+def test_missing_body_drops_the_entry(cache):
+    parse = CountingParser()
+    session = ScriptedSession((200, {'ETag': '"v1"'}, PAGE), (304, {}, ''), (200, {'ETag': '"v1"'}, PAGE))
+    _fetch(session, parse)
+    os.remove(cache._paths(cache.key(URL))[1])
+    cache.put(URL, dict(cache.get(URL), parse_run='old'))
+    assert _fetch(session, parse) is None
+    assert cache.get(URL) is None
+    # Fetched in full, without validators
+    assert _fetch(session, parse)['price'] == 1499
+    assert 'If-None-Match' not in session.sent[2]
+
+
+def test_page_cache_evicts_least_recently_used(tmp_path):
+    store = PageCache(str(tmp_path), max_bytes=6000)
+    body = os.urandom(2000)
+    for i in range(3):
+        store.put(f'https://shop.example.com/p/{i}', {'parsed': i}, body)
+        os.utime(store._paths(store.key(f'https://shop.example.com/p/{i}'))[0], (i, i))
+    store.put('https://shop.example.com/p/3', {'parsed': 3}, body)
+
+    assert store.get('https://shop.example.com/p/0') is None
+    assert store.get('https://shop.example.com/p/3')['parsed'] == 3
+    assert store.get_body('https://shop.example.com/p/3') == body
+
+
+def test_default_directory_does_not_depend_on_working_directory():
+    assert os.path.isabs(page_cache.PAGE_CACHE_DIR)
+    if 'PAGE_CACHE_DIR' not in os.environ:
+        assert page_cache.PAGE_CACHE_DIR == os.path.join(page_cache.BACKEND_ROOT, 'cache', 'pages')
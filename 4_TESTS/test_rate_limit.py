@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+from app.middleware import rate_limit
+from app.middleware.rate_limit import InMemoryRateLimiter
+
+
+def _limiter(monkeypatch, clock, **kwargs):
+    monkeypatch.setattr(rate_limit, 'time', SimpleNamespace(monotonic=lambda: clock[0]))
+    return InMemoryRateLimiter(**kwargs)
+
+
+def test_previous_window_counts_decay_across_the_boundary(monkeypatch):
+    clock = [120.0]
+    limiter = _limiter(monkeypatch, clock, windows=[('minute', 60, 2)], sweep_interval=3600)
+
+    assert limiter.hit('client')[0] and limiter.hit('client')[0]
+    assert limiter.hit('client') == (False, 'minute', 60, {'minute': 2})
+
+    # A new window still carries the whole previous count at its start
+    clock[0] = 180.0
+    assert limiter.hit('client') == (False, 'minute', 60, {'minute': 2})
+    # Halfway through, half of it remains
+    clock[0] = 210.0
+    assert limiter.hit('client') == (True, '', 0, {'minute': 1})
+    # After an empty window nothing carries over
+    clock[0] = 300.0
+    assert limiter.hit('client') == (True, '', 0, {'minute': 0})
+
+
+def test_least_recently_seen_client_is_evicted_at_the_cap(monkeypatch):
+    clock = [0.0]
+    limiter = _limiter(monkeypatch, clock, windows=[('minute', 60, 1)], max_clients=2)
+
+    for client_key in ('a', 'b', 'a', 'c'):
+        limiter.hit(client_key)
+
+    assert len(limiter) == 2
+    assert list(limiter._clients) == ['a', 'c']
+    # Evicted clients start over
+    assert not limiter.hit('c')[0]
+    assert limiter.hit('b')[0]
+
+
+def test_sweep_drops_clients_idle_past_the_largest_window(monkeypatch):
+    clock = [0.0]
+    limiter = _limiter(
+        monkeypatch, clock, windows=[('minute', 60, 5), ('hour', 3600, 50)], sweep_interval=10
+    )
+    limiter.hit('idle')
+    clock[0] = 1800.0
+    limiter.hit('recent')
+
+    clock[0] = 3605.0
+    limiter.hit('new')
+    assert list(limiter._clients) == ['recent', 'new']
+
+    # Sweeps only run once per interval
+    clock[0] = 5405.0
+    limiter._last_sweep = 5400.0
+    limiter.hit('new')
+    assert 'recent' in limiter._clients
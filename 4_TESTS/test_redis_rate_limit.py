@@ -0,0 +1,151 @@
+import asyncio
+
+import fakeredis
+
+from app.middleware import redis_rate_limit
+from app.middleware.redis_rate_limit import RedisRateLimitMiddleware, SLIDING_LOG_SCRIPT, SLIDING_WINDOW_SCRIPT
+
+
+def _run_script(limiter, script, now, pending=0, requested=1):
+    keys, args = limiter._script_args('client', now, pending, requested)
+    return [int(value) for value in script(keys=keys, args=args)]
+
+
+def test_sliding_log_script_rejects_past_limit():
+    limiter = RedisRateLimitMiddleware(None, requests_per_minute=3)
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    script = redis.register_script(SLIDING_LOG_SCRIPT)
+
+    allowed = [_run_script(limiter, script, 1000.0 + offset) for offset in (0, 10, 20)]
+    assert [result[:4] for result in allowed] == [[1, 0, 1, 0], [1, 0, 1, 1], [1, 0, 1, 2]]
+    # Rejected by the minute window until the oldest request leaves it
+    assert _run_script(limiter, script, 1030.0) == [0, 1, 30, 3, 3, 3]
+    assert redis.zcard('client:minute') == 3
+    # Once the first request is older than a minute there is room again
+    assert _run_script(limiter, script, 1061.0)[:4] == [1, 0, 1, 2]
+
+
+def test_sliding_log_script_records_pending_requests():
+    limiter = RedisRateLimitMiddleware(None, requests_per_minute=3)
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    script = redis.register_script(SLIDING_LOG_SCRIPT)
+
+    # Already served from a local lease: recorded even past the limit
+    assert _run_script(limiter, script, 1000.0, pending=4, requested=0)[:4] == [1, 0, 1, 4]
+    assert redis.zcard('client:hour') == 4
+    assert _run_script(limiter, script, 1001.0)[:4] == [0, 1, 59, 4]
+
+
+def test_sliding_window_script_weights_previous_window():
+    limiter = RedisRateLimitMiddleware(None, requests_per_minute=3, algorithm='sliding_window')
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    script = redis.register_script(SLIDING_WINDOW_SCRIPT)
+    # Halfway through minute 100, with 4 requests in minute 99
+    redis.set('client:minute:99', 4)
+
+    assert _run_script(limiter, script, 6030.0)[:4] == [1, 0, 1, 2]
+    assert _run_script(limiter, script, 6030.0) == [0, 1, 30, 3, 1, 1]
+    assert redis.get('client:minute:100') == '1'
+    assert int(redis.ttl('client:minute:100')) == 120
+
+
+def _limiter(local_burst=0):
+    limiter = RedisRateLimitMiddleware(None, requests_per_minute=10, local_burst=local_burst, sync_interval=0)
+    limiter.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    limiter._script = limiter.redis.register_script(SLIDING_LOG_SCRIPT)
+    limiter._connected = True
+    return limiter
+
+
+async def _remaining(limiter, count):
+    remaining = []
+    for _ in range(count):
+        if limiter.local_burst:
+            _, _, _, counts = await limiter._check_with_local_bucket('client')
+        else:
+            _, _, _, counts = await limiter._check_and_record_redis('client')
+        remaining.append(limiter._limit_headers(counts)['X-RateLimit-Remaining-Minute'])
+    return remaining
+
+
+def test_local_lease_reports_same_remaining_as_redis():
+    async def run():
+        # A long lease so every request after the first is admitted locally
+        leased = _limiter(local_burst=3)
+        leased.sync_interval = 60
+        return await _remaining(_limiter(), 6), await _remaining(leased, 4)
+
+    direct, leased = asyncio.run(run())
+    assert direct == ['10', '9', '8', '7', '6', '5']
+    assert leased == direct[:4]
+
+
+def test_reconcile_task_is_kept_until_done():
+    async def run():
+        limiter = _limiter(local_burst=3)
+        await limiter._check_with_local_bucket('client')
+        await limiter._check_with_local_bucket('client')
+        limiter._local_buckets['client'].lease_expires = 0
+        limiter._maybe_schedule_reconcile()
+        [task] = redis_rate_limit._reconcile_tasks
+        await task
+        minute = await limiter.redis.zcard('client:minute')
+        return minute, set(redis_rate_limit._reconcile_tasks), limiter._local_buckets
+
+    minute, tasks, buckets = asyncio.run(run())
+    assert minute == 2
+    assert tasks == set()
+    assert buckets == {}
+
+
+async def _redis_down(keys, args):
+    raise ConnectionError('Redis is down')
+
+
+def test_locally_admitted_requests_survive_a_redis_error():
+    async def run():
+        limiter = _limiter(local_burst=3)
+        limiter.sync_interval = 60
+        for _ in range(3):
+            await limiter._check_with_local_bucket('client')
+        bucket = limiter._local_buckets['client']
+        bucket.lease_expires = 0
+
+        script, limiter._script = limiter._script, _redis_down
+        failed = await limiter._check_with_local_bucket('client')
+        pending_after_error = bucket.pending
+
+        limiter._script = script
+        await limiter._check_with_local_bucket('client')
+        return failed, pending_after_error, bucket.pending, await limiter.redis.zcard('client:minute')
+
+    failed, pending_after_error, pending, minute = asyncio.run(run())
+    # Admitted without Redis, and the two lease requests are still owed
+    assert failed == (True, '', 0, {})
+    assert pending_after_error == 2
+    # Reported with the next successful check (the request during the outage is not)
+    assert pending == 0
+    assert minute == 4
+
+
+def test_reconcile_keeps_pending_requests_on_redis_error():
+    async def run():
+        limiter = _limiter(local_burst=3)
+        limiter.sync_interval = 60
+        for _ in range(2):
+            await limiter._check_with_local_bucket('client')
+        limiter._local_buckets['client'].lease_expires = 0
+        script, limiter._script = limiter._script, _redis_down
+        limiter._reconciling = True
+        await limiter._reconcile_local_buckets()
+        kept = limiter._local_buckets['client'].pending
+
+        limiter._script = script
+        limiter._reconciling = True
+        await limiter._reconcile_local_buckets()
+        return kept, limiter._local_buckets, await limiter.redis.zcard('client:minute')
+
+    kept, buckets, minute = asyncio.run(run())
+    assert kept == 1
+    assert buckets == {}
+    assert minute == 2
@@ -0,0 +1,45 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from app.adapters.common import RequestScheduler, HostThrottled
+
+
+class StubSession:
+    def __init__(self):
+        self.sent = 0
+
+    @contextlib.asynccontextmanager
+    async def get(self, url, **kwargs):
+        self.sent += 1
+        yield type('Resp', (), {'status': 200, 'headers': {}})()
+
+
+class CountingScheduler(RequestScheduler):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.quota_calls = 0
+
+    async def consume_quota(self, api):
+        self.quota_calls += 1
+        return self.quota_calls
+
+
+def test_throttled_requests_do_not_use_quota():
+    scheduler = CountingScheduler(host_rate=1.0, host_limits={}, jitter=0, max_wait=0.5)
+    session = StubSession()
+
+    async def call():
+        async with scheduler.get(session, 'https://api.example.com/search', quota='example_api'):
+            pass
+
+    async def run():
+        await call()
+        # The next slot is a second away, beyond max_wait
+        with pytest.raises(HostThrottled):
+            await call()
+
+    asyncio.run(run())
+    assert session.sent == 1
+    assert scheduler.quota_calls == 1
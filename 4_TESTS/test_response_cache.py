@@ -0,0 +1,60 @@
+import asyncio
+
+import fakeredis
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.middleware import caching
+from app.middleware.caching import ResponseCachingMiddleware
+from app.middleware.stack import middleware_stack
+
+
+async def categories(request):
+    return JSONResponse({'categories': ['audio', 'wearables']})
+
+
+def _app(monkeypatch, server):
+    """A bare app with the caching and CORS middlewares in the order app.main adds them"""
+    monkeypatch.setattr(caching.redis, 'from_url', lambda url, **kwargs: server)
+    app = Starlette(routes=[Route('/api/categories', categories)])
+    for middleware, options in middleware_stack('development'):
+        if middleware in (ResponseCachingMiddleware, CORSMiddleware):
+            app.add_middleware(middleware, **options)
+    return app
+
+
+def test_cached_response_carries_cors_headers_of_each_origin(monkeypatch):
+    server = fakeredis.FakeRedis()
+    client = TestClient(_app(monkeypatch, server))
+
+    first = client.get('/api/categories', headers={'Origin': 'http://localhost:3000'})
+    second = client.get('/api/categories', headers={'Origin': 'http://localhost:5173'})
+
+    assert first.headers['x-cache'] == 'MISS'
+    assert second.headers['x-cache'] == 'HIT'
+    assert second.json() == first.json()
+    assert second.headers['access-control-allow-origin'] == 'http://localhost:5173'
+    [key] = server.keys()
+    cache = ResponseCachingMiddleware(None)
+    stored = asyncio.run(cache._get_cached_response(key.decode()))
+    assert not [name for name in stored['headers'] if name.lower().startswith(('access-control-', 'vary'))]
+
+
+def test_responses_setting_cookies_are_not_cached(monkeypatch):
+    async def login(request):
+        response = JSONResponse({'ok': True})
+        response.set_cookie('session', 'abc')
+        return response
+
+    server = fakeredis.FakeRedis()
+    monkeypatch.setattr(caching.redis, 'from_url', lambda url, **kwargs: server)
+    app = Starlette(routes=[Route('/api/session', login)])
+    app.add_middleware(ResponseCachingMiddleware)
+    client = TestClient(app)
+
+    client.get('/api/session')
+    assert client.get('/api/session').headers['x-cache'] == 'SKIP'
+    assert server.keys() == []